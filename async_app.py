@@ -0,0 +1,386 @@
+import asyncio
+from contextlib import asynccontextmanager
+from quart import Quart, request, jsonify, render_template, Response
+import app as sync_app  # Shares the configuration, workspaces, catalog and caches of the Flask app
+import connections
+import utils as ut
+import streaming
+import columnar
+import guardrails
+
+# ASGI variant of app.py on Quart, serving the same routes. Queries run on async drivers
+# (async SQLAlchemy with aiosqlite/aiomysql/asyncpg, Motor for MongoDB), so a worker keeps
+# many slow queries in flight instead of blocking a thread on each one. Translation and the
+# caches are the Flask app's own; CSV loading runs on a thread.
+#
+#   hypercorn async_app:app        (or: python async_app.py)
+
+app = Quart(__name__)
+app.json.default = sync_app.json_default
+
+
+async def current_workspace():
+    """The workspace of the current request (see app.workspace_for)."""
+    body = await request.get_json(silent=True) if request.method == 'POST' else None
+    return sync_app.workspace_for(body, request.args, request.headers)
+
+
+@app.errorhandler(sync_app.WorkspaceNameError)
+async def workspace_name_error(e):
+    return jsonify({"error": str(e)})
+
+
+async def workspace_snapshot(workspace):
+    """The workspace's snapshot, restoring it from the catalog on a thread the first time."""
+    if workspace.restored:
+        return workspace.snapshot()
+    return await asyncio.to_thread(sync_app.restore_catalog, workspace)
+
+
+async def guarded(running, awaitable):
+    """
+    Awaits a query under running's deadline. cancel() (from any thread) cancels the task awaiting it;
+    either way the error is reported as guardrails.QueryCancelled.
+    """
+    task = asyncio.ensure_future(awaitable)
+    loop = asyncio.get_running_loop()
+    running.on_cancel = lambda: loop.call_soon_threadsafe(task.cancel)
+    try:
+        async with asyncio.timeout(running.timeout):
+            return await task
+    except (asyncio.CancelledError, TimeoutError) as e:
+        if running.should_stop():
+            raise running.interrupted() from e
+        raise
+    finally:
+        running.on_cancel = None
+
+
+@asynccontextmanager
+async def sql_guard(connection, running):
+    """
+    guardrails.sql_guard for an AsyncConnection: running's deadline set on the server (guardrails.deadline_statements)
+    and, on SQLite, the progress handler that stops the statement once running is cancelled or out of time.
+    Cancelling the task awaiting an aiosqlite query alone doesn't stop it: it runs on aiosqlite's thread.
+    """
+    set_deadline, reset_deadline = guardrails.deadline_statements(connection.dialect, connection.info, running.remaining_ms())
+    if set_deadline:
+        await connection.exec_driver_sql(set_deadline)
+    sqlite_connection = None
+    if connection.dialect.name == 'sqlite':
+        sqlite_connection = (await connection.get_raw_connection()).driver_connection
+        await sqlite_connection.set_progress_handler(lambda: 1 if running.should_stop() else 0, guardrails.SQLITE_PROGRESS_STEPS)
+    try:
+        yield
+    except Exception as e:
+        if running.should_stop():
+            raise running.interrupted() from e
+        raise
+    finally:
+        try:
+            # An invalidated connection (a cancelled task's, a MySQL stream stopped part way) is closed, not reused
+            if sqlite_connection is not None and not connection.invalidated:
+                await sqlite_connection.set_progress_handler(None, 0)
+            if reset_deadline and not connection.invalidated:
+                await connection.exec_driver_sql(reset_deadline)
+        except Exception as e:  # e.g. the connection was lost with the query; the pool drops it
+            print(f"Error resetting the connection of query {running.request_id}: {e}")
+
+
+async def execute_sql_query(sql_query, as_columns=False, request_id=None, timeout=None):
+    """
+    Executes a given SQL query on the async engine and fetches the result.
+    :param sql_query: The SQL query string to execute.
+    :param as_columns: Return the result column-wise, as app.execute_sql_query.
+    :param request_id: Id under which the query can be cancelled with /cancel.
+    :param timeout: Seconds after which the query is stopped.
+    :return: Result rows as a list of dictionaries.
+    """
+    db_url = sync_app.db_url
+    cache_key = ("SQL", db_url, sql_query, "columns" if as_columns else "rows")
+    if sync_app.result_cache_options["enabled"]:
+        cached = sync_app.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    generation = sync_app.result_cache.generation()
+    try:
+        engine = connections.get_async_engine(db_url, **sync_app.sql_pool_options)
+
+        async def run(running):
+            # The database stops the query itself; cancelling the task alone would leave it running
+            async with engine.connect() as connection, sql_guard(connection, running):
+                result = await connection.execute(*sync_app.sql_statement(sql_query))
+                if as_columns:
+                    return columnar.columns_from_rows(result.keys(), result)
+                return [dict(zip(result.keys(), row)) for row in result]
+
+        with guardrails.track(request_id or guardrails.new_request_id(), timeout) as running:
+            rows = await guarded(running, run(running))
+
+        # Handle empty result set
+        if not as_columns and not rows:
+            rows = {"message": "No results found"}
+
+        if sync_app.result_cache_options["enabled"]:
+            sync_app.result_cache.put(cache_key, rows, ut.tables_in_sql(sql_query), generation)
+        return rows
+    except Exception as e:
+        print(f"Error executing query: {e}")
+        return {"error": str(e)}
+
+
+async def execute_mongo_query(translated_query, collection_name, final_pipeline, request_id=None, timeout=None):
+    """
+    Executes a MongoDB aggregation pipeline through Motor, with maxTimeMS set from timeout.
+    :return: Result documents as a list.
+    """
+    mongo_uri, mongo_db_name = sync_app.mongo_uri, sync_app.mongo_db_name
+    try:
+        if not collection_name or not final_pipeline:
+            raise ValueError("Translated query must include 'collection' and 'pipeline'.")
+
+        cache_key = ("NoSQL", mongo_uri, mongo_db_name, translated_query)
+        if sync_app.result_cache_options["enabled"]:
+            cached = sync_app.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        generation = sync_app.result_cache.generation()
+
+        client = connections.get_motor_client(mongo_uri, **sync_app.mongo_pool_options)
+        with guardrails.track(request_id or guardrails.new_request_id(), timeout) as running:
+            options = {"comment": f"request:{running.request_id}"}
+            if running.timeout:
+                options["maxTimeMS"] = running.remaining_ms()
+            cursor = client[mongo_db_name][collection_name].aggregate(final_pipeline, **options)
+            result = await guarded(running, cursor.to_list(length=None))
+        if sync_app.result_cache_options["enabled"]:
+            sync_app.result_cache.put(cache_key, result, [collection_name.lower()], generation)
+        return result
+    except Exception as e:
+        print(f"Error executing MongoDB query: {e}")
+        return {"error": str(e)}
+
+
+async def stream_sql_query(sql_query, fmt, max_rows, request_id=None, timeout=None):
+    """
+    Streams the rows of a SQL query from a server-side cursor (AsyncConnection.stream), as app.stream_sql_query.
+    A MySQL stream stopped part way drops its connection rather than reading the rest of the rows on close().
+    """
+    batch_size = sync_app.stream_options["batch_size"]
+    engine = connections.get_async_engine(sync_app.db_url, **sync_app.sql_pool_options)
+    with guardrails.track(request_id or guardrails.new_request_id(), timeout) as running:
+        async with engine.connect() as connection, sql_guard(connection, running):
+            result = await connection.stream(*sync_app.sql_statement(sql_query))
+            exhausted = False
+            try:
+                keys = list(result.keys())
+
+                async def batches():
+                    nonlocal exhausted
+                    async for partition in result.partitions(batch_size):
+                        if running.should_stop():
+                            raise running.interrupted()
+                        yield [dict(zip(keys, row)) for row in partition]
+                    exhausted = True
+
+                async for chunk in streaming.encode_rows_async(batches(), fmt, max_rows):
+                    yield chunk
+            finally:
+                if not exhausted and connection.dialect.name in ('mysql', 'mariadb'):
+                    await connection.invalidate()
+                await result.close()
+
+
+async def stream_mongo_query(collection_name, final_pipeline, fmt, max_rows, request_id=None, timeout=None):
+    """
+    Streams the documents of a MongoDB aggregation through a Motor cursor, as app.stream_mongo_query, with
+    maxTimeMS set from timeout. /cancel stops the stream at the next batch.
+    """
+    if not collection_name or not final_pipeline:
+        raise ValueError("Translated query must include 'collection' and 'pipeline'.")
+    batch_size = sync_app.stream_options["batch_size"]
+    client = connections.get_motor_client(sync_app.mongo_uri, **sync_app.mongo_pool_options)
+    with guardrails.track(request_id or guardrails.new_request_id(), timeout) as running:
+        options = {"comment": f"request:{running.request_id}"}
+        if running.timeout:
+            options["maxTimeMS"] = running.remaining_ms()
+        cursor = client[sync_app.mongo_db_name][collection_name].aggregate(final_pipeline, batchSize=batch_size, **options)
+
+        async def batches():
+            while batch := await cursor.to_list(length=batch_size):
+                if running.should_stop():
+                    raise running.interrupted()
+                yield batch
+
+        try:
+            async for chunk in streaming.encode_rows_async(batches(), fmt, max_rows):
+                yield chunk
+        finally:
+            await cursor.close()
+
+
+async def stream_response(translated_query, records, fmt):
+    """Async version of app.stream_response."""
+    yield streaming.encode_record({"translated_query": translated_query}, fmt)
+    try:
+        async for chunk in records:
+            yield chunk
+    except Exception as e:
+        print(f"Error streaming query results: {e}")
+        yield streaming.encode_record({"error": str(e)}, fmt)
+
+
+@app.route('/')
+async def home():
+    return await render_template('index.html')
+
+
+@app.route('/load_datasets', methods=['POST'])
+async def load_datasets():
+    workspace = await current_workspace()
+    await workspace_snapshot(workspace)
+    body = await request.get_json()
+    # Loading is bulk CPU and driver work; keep it off the event loop
+    response = await asyncio.to_thread(sync_app.load_workspace_datasets, workspace, body['database_type'],
+                                       body['dataset_paths'], body.get('force_reload', False))
+    return jsonify(response)
+
+
+@app.route('/process_query', methods=['POST'])
+async def process_query():
+    snapshot = await workspace_snapshot(await current_workspace())
+    body = await request.get_json()
+    database_type = body['database_type']
+    input_user_query = body['query']
+    if 'sample' in input_user_query:
+        return jsonify(sync_app.sample_queries(snapshot, database_type, input_user_query))
+
+    try:
+        request_id, timeout, max_rows = sync_app.query_guardrails(body, request.headers)
+        fmt = streaming.stream_format(body, request.headers.get('Accept'))
+        if fmt:
+            # Streams have their own row cap (stream_options) instead of the safety limit
+            translated_query, collection_name, final_pipeline = sync_app.translate_query(input_user_query, database_type, snapshot)
+            max_rows = streaming.row_limit(body, sync_app.stream_options["max_rows"])
+            timeout = sync_app.request_timeout(body, sync_app.stream_options["timeout_seconds"])
+            if database_type == "SQL":
+                records = stream_sql_query(translated_query, fmt, max_rows, request_id, timeout)
+            else:
+                records = stream_mongo_query(collection_name, final_pipeline, fmt, max_rows, request_id, timeout)
+            # Quart cancels the generator when the client disconnects, which closes the cursor
+            response = Response(stream_response(translated_query, records, fmt), mimetype=streaming.STREAM_FORMATS[fmt])
+            response.timeout = None  # large results may take longer than Quart's default body timeout
+            return response
+        # Translation is pure Python and usually a translation cache hit, so it stays on the loop
+        translated_query, collection_name, final_pipeline = sync_app.translate_query(input_user_query, database_type, snapshot, max_rows)
+        result_format = columnar.result_format(body)
+        if result_format:
+            if database_type == "SQL":
+                result = await execute_sql_query(translated_query, as_columns=True, request_id=request_id, timeout=timeout)
+            else:
+                result = await execute_mongo_query(translated_query, collection_name, final_pipeline, request_id, timeout)
+                if "error" not in result:
+                    result = columnar.columns_from_documents(result)
+            if result_format == "columnar" or "error" in result:
+                return jsonify(sync_app.query_response(translated_query, result, request_id, max_rows))
+            encoded = columnar.encode_binary(result, result_format, {"translated_query": translated_query})
+            return Response(encoded, mimetype=columnar.RESULT_FORMATS[result_format])
+        if database_type == "SQL":
+            result = await execute_sql_query(translated_query, request_id=request_id, timeout=timeout)
+        elif database_type == "NoSQL":
+            result = await execute_mongo_query(translated_query, collection_name, final_pipeline, request_id, timeout)
+    except ValueError as e:
+        # the query could not be translated (e.g. no known pattern or column names in it), or a bad option
+        return jsonify({"error": str(e)})
+    return jsonify(sync_app.query_response(translated_query, result, request_id, max_rows))
+
+
+async def run_query_batch(snapshot, database_type, queries, request_id, timeout, max_rows):
+    """
+    app.run_query_batch for the async app: each distinct query becomes a task as soon as it is translated,
+    with at most batch_options["execute_workers"] of them running at a time on the async pool.
+    """
+    semaphore = asyncio.Semaphore(sync_app.batch_options["execute_workers"])
+    tasks = {}
+    items = []
+
+    async def execute(translated, query_id, batch):
+        async with semaphore:
+            if batch.cancelled.is_set():
+                return {"error": f"Query {query_id} was cancelled"}
+            if database_type == "SQL":
+                return await execute_sql_query(translated[0], request_id=query_id, timeout=timeout)
+            return await execute_mongo_query(*translated, query_id, timeout)
+
+    with guardrails.track(request_id) as batch:
+        # Queries still waiting for the semaphore see batch.cancelled; running ones are cancelled by their id
+        batch.on_cancel = lambda: [guardrails.cancel(query_id) for task, query_id in list(tasks.values())]
+        for index, input_user_query in enumerate(queries):
+            if 'sample' in input_user_query:
+                items.append(sync_app.sample_queries(snapshot, database_type, input_user_query))
+                continue
+            try:
+                translated = sync_app.translate_query(input_user_query, database_type, snapshot, max_rows)
+            except ValueError as e:
+                items.append({"error": str(e)})
+                continue
+            if translated[0] not in tasks:
+                query_id = f"{request_id}.{index}"
+                tasks[translated[0]] = (asyncio.ensure_future(execute(translated, query_id, batch)), query_id)
+                await asyncio.sleep(0)  # let the query start before translating the next one
+            items.append(translated[0])
+        await asyncio.gather(*(task for task, query_id in tasks.values()))
+
+    return [item if isinstance(item, dict) else sync_app.query_response(item, tasks[item][0].result(), tasks[item][1], max_rows)
+            for item in items]
+
+
+@app.route('/process_queries', methods=['POST'])
+async def process_queries():
+    snapshot = await workspace_snapshot(await current_workspace())
+    body = await request.get_json()
+    database_type = body['database_type']
+    if database_type not in ("SQL", "NoSQL"):
+        return jsonify({"error": f"Unknown database type: {database_type}"})
+    try:
+        queries = sync_app.batch_queries(body)
+        request_id, timeout, max_rows = sync_app.query_guardrails(body, request.headers)
+    except ValueError as e:
+        return jsonify({"error": str(e)})
+    results = await run_query_batch(snapshot, database_type, queries, request_id, timeout, max_rows)
+    return jsonify({"request_id": request_id, "results": results, "errors": sum("error" in result for result in results)})
+
+
+@app.route('/cancel', methods=['POST'])
+async def cancel_query():
+    request_id = str((await request.get_json())['request_id'])
+    return jsonify({"request_id": request_id, "cancelled": guardrails.cancel(request_id)})
+
+
+@app.route('/running_queries', methods=['GET'])
+async def running_queries():
+    return jsonify({"running": guardrails.running_queries()})
+
+
+@app.route('/cache_stats', methods=['GET'])
+async def cache_stats():
+    return jsonify({"translation_cache": sync_app.translation_cache.stats(), "result_cache": sync_app.result_cache.stats(), "statement_cache": sync_app.statement_cache.stats(), "sample_pools": sync_app.sample_pools.stats()})
+
+
+@app.route('/column_stats', methods=['GET'])
+async def column_stats():
+    return jsonify(sync_app.column_summaries(await workspace_snapshot(await current_workspace())))
+
+
+@app.route('/pool_stats', methods=['GET'])
+async def pool_stats():
+    return jsonify({"sql": connections.get_pool_stats()})
+
+
+@app.after_serving
+async def close_connections():
+    await connections.dispose_async_engines()
+
+
+if __name__ == '__main__':
+    app.run(debug=True)
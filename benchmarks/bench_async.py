@@ -0,0 +1,174 @@
+"""
+Load test of /process_query on the Flask app (app.py, threaded WSGI server) against the
+async app (async_app.py, Quart on hypercorn).
+
+Each server runs in its own process on a generated sales table of --rows rows, in SQLite
+(aiosqlite for the async app) or mongomock (mongomock_motor for the async app). The
+result cache is switched off so every request reaches the database. Clients send
+--requests queries at each concurrency level and the script reports requests/sec and
+p50/p99 latency.
+
+Run from the project root:
+
+    python benchmarks/bench_async.py [--database SQL|NoSQL] [--rows 200000] [--concurrency 1,8,32]
+                                     [--requests 400] [--targets sync,async]
+
+The async target needs quart, hypercorn and aiosqlite (or motor and mongomock_motor for NoSQL).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_NAME = 'bench_sales.csv'
+DEFAULT_QUERY = 'total totalamount by customerid'
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('SaleID,CustomerID,ProductID,Quantity,TotalAmount\n')
+        for i in range(1, rows + 1):
+            f.write(f'{i},{rng.randint(1, 500)},{rng.randint(1, 50)},{rng.randint(1, 9)},{rng.uniform(5, 2000):.2f}\n')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(args):
+    """Server process: loads the table and serves app.py or async_app.py on args.port."""
+    sys.path.insert(0, ROOT)
+    os.chdir(args.workdir)
+    import connections
+    import app as sync_app
+    if args.database == 'NoSQL':
+        import mongomock
+        # One in-memory store: the table is loaded through pymongo, and the async app queries it through Motor
+        store = mongomock.MongoClient()
+        connections.mongo_client_factory = lambda *client_args, **client_kwargs: store
+        if args.serve == 'async':
+            import mongomock_motor
+            connections.motor_client_factory = lambda *client_args, **client_kwargs: mongomock_motor.AsyncMongoMockClient(mock_mongo_client=store)
+    sync_app.db_url = f"sqlite:///{os.path.join(args.workdir, 'bench.db')}"
+    sync_app.catalog = sync_app.Catalog(os.path.join(args.workdir, 'catalog.db'))
+    sync_app.result_cache_options["enabled"] = False
+    # mongomock keeps its data in this process, so NoSQL is always loaded again
+    sync_app.load_workspace_datasets(sync_app.workspaces.get(), args.database, [CSV_NAME], force_reload=args.database == 'NoSQL')
+
+    if args.serve == 'sync':
+        from werkzeug.serving import make_server
+        make_server('127.0.0.1', args.port, sync_app.app, threaded=True).serve_forever()
+    else:
+        import asyncio
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+        import async_app
+        config = Config()
+        config.bind = [f'127.0.0.1:{args.port}']
+        config.accesslog = None
+        asyncio.run(hypercorn_serve(async_app.app, config))
+
+
+def start_server(target, args, workdir):
+    port = free_port()
+    log = open(os.path.join(workdir, f'{target}.log'), 'w')
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', target, '--port', str(port),
+                                '--workdir', workdir, '--database', args.database], stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    log.close()
+    with open(log.name) as f:
+        print(f"{target}: server did not start:\n" + ''.join(f.readlines()[-5:]))
+    return None, None
+
+
+def send_query(port, body):
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request('POST', '/process_query', body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        # An empty result ("No results found" or []) means the server is querying the wrong data
+        result = json.loads(response.read()).get('query_result') if response.status == 200 else None
+        ok = isinstance(result, list) and len(result) > 0
+    except Exception:
+        ok = False
+    finally:
+        conn.close()
+    return time.perf_counter() - started, ok
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_load(port, args, concurrency):
+    body = json.dumps({'database_type': args.database, 'query': args.query})
+    send_query(port, body)  # warm up pools and the translation cache
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: send_query(port, body), range(args.requests)))
+    elapsed = time.perf_counter() - started
+    latencies = [latency for latency, ok in results]
+    return {
+        'requests_per_sec': round(len(results) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'errors': sum(not ok for latency, ok in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', choices=['SQL', 'NoSQL'], default='SQL')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--targets', default='sync,async')
+    parser.add_argument('--query', default=DEFAULT_QUERY)
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_csv(os.path.join(workdir, CSV_NAME), args.rows)
+        for target in args.targets.split(','):
+            process, port = start_server(target, args, workdir)
+            if process is None:
+                continue
+            try:
+                for concurrency in [int(c) for c in args.concurrency.split(',')]:
+                    stats = run_load(port, args, concurrency)
+                    print(f"{target:>5} {args.database:<5} concurrency {concurrency:>3}: {stats['requests_per_sec']:8.1f} req/s, "
+                          f"p50 {stats['p50_ms']:8.1f} ms, p99 {stats['p99_ms']:8.1f} ms, errors {stats['errors']}")
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
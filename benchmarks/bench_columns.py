@@ -0,0 +1,83 @@
+"""
+Micro-benchmark for finding the columns mentioned in a query.
+
+Compares the linear scan (`col in text or col.replace('_',' ') in text` for every column)
+with the ColumnIndex matcher for schemas of increasing width, and checks both give the
+same columns in the same order.
+
+Run from the project root:
+
+    python benchmarks/bench_columns.py [--repeat 2000] [--widths 10,100,500]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from column_index import ColumnIndex  # noqa: E402
+
+
+WORDS = ['sale', 'order', 'customer', 'product', 'store', 'region', 'price', 'amount', 'total',
+         'quantity', 'date', 'city', 'name', 'category', 'discount', 'tax', 'stock', 'id']
+
+
+def make_schema(width, seed=0):
+    rng = random.Random(seed)
+    columns = []
+    while len(columns) < width:
+        parts = rng.sample(WORDS, rng.randint(1, 3))
+        column = rng.choice(['', '_']).join(parts) + (str(len(columns)) if rng.random() < 0.5 else '')
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def make_queries(columns, count=50, seed=1):
+    rng = random.Random(seed)
+    templates = ['total {} by {}', 'show {}, {} where {} > 10 limit 5', 'average {} by {} sorted by {} descending',
+                 'list {} where {} between 1 and 9', 'count {} by {} having total {} greater than 100']
+    queries = []
+    for _ in range(count):
+        template = rng.choice(templates)
+        picked = [rng.choice(columns).replace('_', rng.choice(['_', ' '])) for _ in range(template.count('{}'))]
+        queries.append(template.format(*picked))
+    return queries
+
+
+def linear_mentioned(columns, text):
+    return [col for col in columns if col in text or col.replace('_', ' ') in text]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--widths', default='10,100,500')
+    args = parser.parse_args()
+
+    for width in [int(w) for w in args.widths.split(',')]:
+        columns = make_schema(width)
+        queries = make_queries(columns)
+        build_ms = timeit.timeit(lambda: ColumnIndex(columns), number=1) * 1000
+        index = ColumnIndex(columns)
+
+        mismatches = sum(linear_mentioned(columns, q) != index.mentioned(q) for q in queries)
+
+        def run_linear():
+            for q in queries:
+                linear_mentioned(columns, q)
+
+        def run_index():
+            for q in queries:
+                index.mentioned(q)
+
+        number = max(1, args.repeat // len(queries))
+        linear = timeit.timeit(run_linear, number=number) / (number * len(queries)) * 1e6
+        indexed = timeit.timeit(run_index, number=number) / (number * len(queries)) * 1e6
+        print(f"{width:>5} columns: linear {linear:8.2f} us/query, index {indexed:8.2f} us/query "
+              f"({linear / indexed:5.1f}x), index build {build_ms:.1f} ms, mismatches {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark for base-pattern detection and the other NL parsing regexes.
+
+Compares the old per-call approach (build the pattern dict and re.search through it
+on every call) with the compiled registry and combined dispatcher in utils.
+
+Run from the project root:
+
+    python benchmarks/bench_patterns.py [--repeat 2000]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils as ut  # noqa: E402
+
+
+QUERIES = [
+    "total totalamount by customerid",
+    "find total totalamount by customerid where quantity > 2",
+    "average price by category",
+    "min price by category limit 3",
+    "max stockquantity by category sorted by category descending",
+    "count saleid by productid",
+    "show total totalamount",
+    "list average price",
+    "give min price",
+    "show max quantity",
+    "show count of saleid",
+    "List all sales",
+    "show saleid, totalamount where totalamount is greater than 500",
+    "show name, city where city is EastAmanda",
+    "list all sales where saledate between 2023-01-01 and 2023-12-31",
+    "show top 5 totalamount by quantity",
+    "show bottom 3 price by stockquantity",
+    "show productname, price where price > 100 sorted by price descending limit 5 offset 2",
+    "total totalamount by productid having total totalamount greater than 1000",
+    "what is this",
+]
+
+
+def legacy_detect_base_pattern(nl_query):
+    """The pre-registry implementation: rebuilds the dict and searches pattern by pattern."""
+    patterns = dict(ut.BASE_PATTERN_SOURCES)
+    for pattern_name, pattern_regex in patterns.items():
+        match = re.search(pattern_regex, nl_query, re.IGNORECASE)
+        if match:
+            return pattern_name, match.groups()
+    return None, None
+
+
+def legacy_detect_limit_sort_order_pattern(nl_query):
+    pattern_list = {name: pattern.pattern for name, pattern in ut.LIMIT_SORT_ORDER_PATTERNS.items()}
+    result_dict = {}
+    for pattern_name, pattern in pattern_list.items():
+        match = re.search(pattern, nl_query, re.IGNORECASE)
+        if match:
+            result_dict[pattern_name] = match.groups()
+    return result_dict
+
+
+def legacy_parse(nl_query):
+    legacy_detect_base_pattern(nl_query)
+    re.search(ut.WHERE_PATTERN.pattern, nl_query, re.IGNORECASE)
+    legacy_detect_limit_sort_order_pattern(nl_query)
+
+
+def registry_parse(nl_query):
+    ut.detect_base_pattern(nl_query)
+    ut.detect_where_pattern(nl_query)
+    ut.detect_limit_sort_order_pattern(nl_query)
+
+
+def check_equivalence():
+    for query in QUERIES:
+        assert legacy_detect_base_pattern(query) == ut.detect_base_pattern(query), query
+        assert legacy_detect_limit_sort_order_pattern(query) == ut.detect_limit_sort_order_pattern(query), query
+
+
+def per_query_us(func, repeat):
+    total = timeit.timeit(lambda: [func(query) for query in QUERIES], number=repeat)
+    return total / (repeat * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    check_equivalence()
+    rows = [
+        ("detect_base_pattern", legacy_detect_base_pattern, ut.detect_base_pattern),
+        ("detect_limit_sort_order_pattern", legacy_detect_limit_sort_order_pattern, ut.detect_limit_sort_order_pattern),
+        ("base + where + limit/sort/offset", legacy_parse, registry_parse),
+    ]
+    print(f"{'stage':<34}{'before (us/query)':>20}{'after (us/query)':>20}{'speedup':>10}")
+    for name, before, after in rows:
+        before_us = per_query_us(before, args.repeat)
+        after_us = per_query_us(after, args.repeat)
+        print(f"{name:<34}{before_us:>20.2f}{after_us:>20.2f}{before_us / after_us:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
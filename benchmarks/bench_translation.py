@@ -0,0 +1,432 @@
+"""
+Translation benchmark over a generated corpus of natural language queries.
+
+Builds a reproducible corpus (fixed --seed) from the sales/products/customers CSV schemas
+and the School DB schema in 1-DDL_DML-script+(School+DB).sql, covering every base pattern
+combined with where / between / having conditions, order by / limit / offset and joins.
+Times each translation stage for the SQL and MongoDB backends and writes the results as
+JSON, so two runs (before and after a change) can be compared.
+
+Stages:
+    base                parse_base_pattern (detect_base_pattern and the select part)
+    where               parse_where_part (where and having conditions)
+    order_limit_offset  parse_limit_sort_order
+    join                plan_join + render_join_steps (generate_join_part)
+    collection          resolve_collection
+    parse               parse_query, all of the above
+    generate_sql        generate_sql on a parsed query
+    generate_mongo      generate_mongo_pipeline on a parsed query
+    translate_sql       translate_to_sql, end to end
+    translate_mongo     translate_to_mongo, end to end
+
+Run from the project root:
+
+    python benchmarks/bench_translation.py [--queries 3000] [--repeat 5] [--output bench_translation.json]
+    python benchmarks/bench_translation.py --compare baseline.json [--threshold 1.25]
+    python benchmarks/bench_translation.py --dump-corpus corpus.jsonl
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import utils as ut  # noqa: E402
+
+
+RETAIL_CSVS = ['sales.csv', 'products.csv', 'customers.csv']
+SCHOOL_DDL = '1-DDL_DML-script+(School+DB).sql'
+
+CREATE_TABLE_PATTERN = re.compile(r'CREATE TABLE IF NOT EXISTS (\w+)\s*\((.*?)\n\);', re.IGNORECASE | re.DOTALL)
+COLUMN_DEFINITION_PATTERN = re.compile(r'^\s*,?\s*(\w+)\s+(\w+)', re.MULTILINE)
+INSERT_PATTERN = re.compile(r'INSERT INTO (\w+)\s*(?:\(([^)]*)\))?\s*VALUES(.*?);', re.IGNORECASE | re.DOTALL)
+INSERT_ROW_PATTERN = re.compile(r"^\s*\((.*)\)\s*,?\s*$", re.MULTILINE)
+INSERT_VALUE_PATTERN = re.compile(r"TO_DATE\([^)]*\)|'((?:[^']|'')*)'|(-?\d+(?:\.\d+)?)", re.IGNORECASE)
+NUMERIC_SQL_TYPES = ('INT', 'INTEGER', 'SMALLINT', 'BIGINT', 'FLOAT', 'REAL', 'DOUBLE', 'NUMERIC', 'DECIMAL')
+SQL_KEYWORDS = ('CONSTRAINT', 'PRIMARY', 'FOREIGN', 'UNIQUE', 'CHECK')
+
+# Wording variants the base patterns accept, so the corpus exercises every alternative
+AGG_WORDS = {
+    'total': ['total', 'sum of', 'sum'],
+    'average': ['average', 'avg of', 'mean of'],
+    'min': ['min', 'minimum', 'lowest'],
+    'max': ['max', 'maximum', 'largest'],
+    'count': ['count', 'number of'],
+}
+GROUP_WORDS = ['by', 'grouped by', 'for each', 'per']
+VERBS = ['show', 'list', 'find', 'give', 'select', 'provide']
+COMPARISONS = ['>', '<', '>=', 'is greater than', 'is less than', 'is at least', 'is at most',
+               'is greater than or equal to', 'is not equal to', 'equals']
+
+PATTERNS = ['total_group_by', 'average_group_by', 'min_group_by', 'max_group_by', 'count_group_by',
+            'Top_n_by', 'Bottom_n_by', 'total', 'average', 'min', 'max', 'count', 'Select']
+MODIFIERS = ['none', 'where_number', 'where_text', 'where_and', 'between_number', 'between_date',
+             'having', 'order_by', 'limit', 'offset', 'order_limit_offset', 'join']
+
+STAGES = {
+    'base': 'shared', 'where': 'shared', 'order_limit_offset': 'shared', 'join': 'shared',
+    'collection': 'shared', 'parse': 'shared', 'generate_sql': 'sql', 'generate_mongo': 'mongo',
+    'translate_sql': 'sql', 'translate_mongo': 'mongo',
+}
+
+
+class Schema:
+    """The datasets of one benchmark schema, shaped like the metadata /load_datasets keeps."""
+
+    def __init__(self, name, tables):
+        # tables: {path: {'column_names', 'attributes', 'measures', 'dates', 'values': {column: [values]}}}
+        self.name = name
+        self.tables = tables
+        self.paths = list(tables)
+        self.column_details = {path: {key: table[key] for key in ('column_names', 'attributes', 'measures')}
+                               for path, table in tables.items()}
+        self.column_names = list(dict.fromkeys(col for table in tables.values() for col in table['column_names']))
+        self.attributes = list(dict.fromkeys(col for table in tables.values() for col in table['attributes']))
+        self.measures = list(dict.fromkeys(col for table in tables.values() for col in table['measures']))
+        self.column_index = ut.column_index_for(tuple(self.column_names))
+        # Pairs of tables sharing a column, the only joins the translator can plan
+        self.join_pairs = [(left, right) for left, right in itertools.combinations(self.paths, 2)
+                           if set(tables[left]['column_names']) & set(tables[right]['column_names'])]
+
+
+def csv_schema(name, paths):
+    """Schema of CSV files, with columns classified the way load_csv_to_sql does it."""
+    tables = {}
+    for path in paths:
+        df = pd.read_csv(os.path.join(ROOT, path))
+        df.columns = df.columns.str.replace(' ', '_').str.lower()
+        table = {'column_names': list(df.columns), 'attributes': [], 'measures': [], 'dates': [], 'values': {}}
+        for col in df.columns:
+            if pd.api.types.is_numeric_dtype(df[col]) and 'id' != col[-2:]:
+                table['measures'].append(col)
+            else:
+                table['attributes'].append(col)
+                values = [str(value) for value in df[col].dropna().unique()[:50]]
+                table['values'][col] = values
+                if values and ut.DATE_PATTERN.fullmatch(values[0]):
+                    table['dates'].append(col)
+        tables[path] = table
+    return Schema(name, tables)
+
+
+def ddl_schema(name, ddl_path):
+    """Schema of the tables created in a SQL script; text values for where conditions come from its INSERTs."""
+    with open(ddl_path, encoding='utf-8') as f:
+        script = f.read().replace('\r', '')
+    script = re.sub(r'/\*.*?\*/', '', script, flags=re.DOTALL)
+    script = re.sub(r'--[^\n]*', '', script)
+
+    tables = {}
+    for table_name, body in CREATE_TABLE_PATTERN.findall(script):
+        table = {'column_names': [], 'attributes': [], 'measures': [], 'dates': [], 'values': {}}
+        for col, sql_type in COLUMN_DEFINITION_PATTERN.findall(body):
+            if col.upper() in SQL_KEYWORDS:
+                continue
+            col = col.lower()
+            table['column_names'].append(col)
+            if sql_type.upper() in NUMERIC_SQL_TYPES and 'id' != col[-2:]:
+                table['measures'].append(col)
+            else:
+                table['attributes'].append(col)
+                if sql_type.upper() == 'DATE':
+                    table['dates'].append(col)
+        tables[table_name.lower()] = table
+
+    for table_name, column_list, rows in INSERT_PATTERN.findall(script):
+        table = tables.get(table_name.lower())
+        if table is None:
+            continue
+        columns = [col.strip().lower() for col in column_list.split(',')] if column_list else table['column_names']
+        for row in INSERT_ROW_PATTERN.findall(rows) or [rows.strip().strip('()')]:
+            for col, match in zip(columns, INSERT_VALUE_PATTERN.finditer(row)):
+                text = match.group(1)
+                if text is not None and col in table['attributes'] and col not in table['dates']:
+                    values = table['values'].setdefault(col, [])
+                    if len(values) < 50 and text.replace("''", "'") not in values:
+                        values.append(text.replace("''", "'"))
+    return Schema(name, {f'{table_name}.csv': table for table_name, table in tables.items()})
+
+
+class QueryBuilder:
+    """Builds one natural language query for a (base pattern, modifier) pair on a schema."""
+
+    def __init__(self, schema, rng):
+        self.schema = schema
+        self.rng = rng
+
+    def pick_table(self, need_measure=True, need_values=False):
+        candidates = [path for path, table in self.schema.tables.items()
+                      if (table['measures'] or not need_measure) and (table['values'] or not need_values)]
+        return self.schema.tables[self.rng.choice(candidates)] if candidates else None
+
+    def column_text(self, col):
+        # Column names are recognised with '_' or spaces, so use both
+        return col.replace('_', ' ') if '_' in col and self.rng.random() < 0.3 else col
+
+    def base(self, pattern, table, other=None):
+        rng = self.rng
+        other = other or table
+        measure = rng.choice(table['measures'])
+        attribute = rng.choice(other['attributes'])
+        column = rng.choice(table['column_names'])
+        if pattern.endswith('_group_by'):
+            agg = pattern.replace('_group_by', '')
+            target = self.column_text(column if agg == 'count' else measure)
+            return f"{rng.choice(AGG_WORDS[agg])} {target} {rng.choice(GROUP_WORDS)} {self.column_text(attribute)}"
+        if pattern in ('Top_n_by', 'Bottom_n_by'):
+            word = rng.choice(['top', 'first']) if pattern == 'Top_n_by' else rng.choice(['bottom', 'last'])
+            return f"{rng.choice(VERBS)} {word} {rng.randint(1, 20)} {self.column_text(column)} by {self.column_text(measure)}"
+        if pattern == 'count':
+            return f"{rng.choice(VERBS)} {rng.choice(AGG_WORDS['count'])} {self.column_text(column)}"
+        if pattern in AGG_WORDS:
+            return f"{rng.choice(VERBS)} {rng.choice(AGG_WORDS[pattern])} {self.column_text(measure)}"
+        columns = rng.sample(table['column_names'], min(len(table['column_names']), rng.randint(1, 3)))
+        if other is not table:
+            columns.append(rng.choice(other['column_names']))
+        return f"{rng.choice(VERBS)} {', '.join(self.column_text(col) for col in columns)}"
+
+    def number_condition(self, table):
+        return f"{self.column_text(self.rng.choice(table['measures']))} {self.rng.choice(COMPARISONS)} {self.rng.randint(1, 1000)}"
+
+    def text_condition(self, table):
+        col = self.rng.choice(list(table['values']))
+        return f"{self.column_text(col)} is {self.rng.choice(table['values'][col])}"
+
+    def build(self, pattern, modifier):
+        """Returns the query text, or None when the schema can't express the pair (e.g. no date column)."""
+        rng = self.rng
+        if modifier == 'join':
+            if not self.schema.join_pairs:
+                return None
+            left, right = (self.schema.tables[path] for path in rng.choice(self.schema.join_pairs))
+            if not left['measures']:
+                left, right = right, left
+            if not left['measures'] or not right['attributes']:
+                return None
+            return self.base(pattern, left, right)
+
+        table = self.pick_table(need_values=modifier in ('where_text', 'where_and'))
+        if table is None:
+            return None
+        query = self.base(pattern, table)
+        is_group_by = pattern.endswith('_group_by')
+        if modifier == 'where_number':
+            query += f" where {self.number_condition(table)}"
+        elif modifier == 'where_text':
+            query += f" where {self.text_condition(table)}"
+        elif modifier == 'where_and':
+            query += f" where {self.text_condition(table)} and {self.number_condition(table)}"
+        elif modifier == 'between_number':
+            low = rng.randint(1, 500)
+            query += f" where {self.column_text(rng.choice(table['measures']))} between {low} and {low + rng.randint(1, 500)}"
+        elif modifier == 'between_date':
+            if not table['dates']:
+                return None
+            year = rng.randint(2005, 2024)
+            query += f" where {self.column_text(rng.choice(table['dates']))} between {year}-01-01 and {year}-12-31"
+        elif modifier == 'having':
+            if not is_group_by:
+                return None
+            agg = rng.choice(['total', 'average', 'min', 'max'])
+            query += f" having {agg} {self.column_text(rng.choice(table['measures']))} greater than {rng.randint(1, 1000)}"
+        elif modifier == 'order_by':
+            query += f" sorted by {self.column_text(rng.choice(table['column_names']))}{rng.choice(['', ' descending'])}"
+        elif modifier == 'limit':
+            query += f" {rng.choice(['limit', 'limit to', 'limited to'])} {rng.randint(1, 50)}"
+        elif modifier == 'offset':
+            query += f" {rng.choice(['offset', 'skip'])} {rng.randint(1, 50)}"
+        elif modifier == 'order_limit_offset':
+            query += (f" order by {self.column_text(rng.choice(table['column_names']))} descending"
+                      f" limit {rng.randint(1, 50)} offset {rng.randint(1, 50)}")
+        return query
+
+
+def build_corpus(schemas, size, seed):
+    """
+    size queries, spread evenly over the schemas and cycling through every (base pattern, modifier)
+    pair, so each pattern/feature combination appears about equally often.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    per_schema = -(-size // len(schemas))
+    for schema in schemas:
+        builder = QueryBuilder(schema, rng)
+        pairs = itertools.cycle(itertools.product(PATTERNS, MODIFIERS))
+        misses = 0
+        generated = 0
+        while generated < per_schema and len(corpus) < size and misses < len(PATTERNS) * len(MODIFIERS):
+            pattern, modifier = next(pairs)
+            query = builder.build(pattern, modifier)
+            if query is None:
+                misses += 1
+                continue
+            misses = 0
+            generated += 1
+            corpus.append({'schema': schema.name, 'pattern': pattern, 'modifier': modifier, 'query': query})
+    return corpus
+
+
+def stage_functions(schema):
+    s = schema
+    return {
+        'base': lambda q: ut.parse_base_pattern(q, s.attributes, s.measures, s.column_names, s.column_index),
+        'where': lambda q: ut.parse_where_part(q, s.column_names, s.column_index),
+        'order_limit_offset': lambda q: ut.parse_limit_sort_order(q, s.column_names, s.column_index),
+        'join': lambda q: ut.render_join_steps(ut.plan_join(q, s.paths, s.column_names, s.column_details, s.column_index)),
+        'collection': lambda q: ut.resolve_collection(q, s.paths, s.column_names, s.column_details, s.column_index),
+        'parse': lambda q: ut.parse_query(q, s.paths, s.attributes, s.measures, s.column_names, s.column_details, s.column_index),
+        'translate_sql': lambda q: ut.translate_to_sql(q, s.paths, s.attributes, s.measures, s.column_names, s.column_details, column_index=s.column_index),
+        'translate_mongo': lambda q: ut.translate_to_mongo(q, s.paths, s.attributes, s.measures, s.column_names, s.column_details, column_index=s.column_index),
+    }
+
+
+def time_calls(func, inputs, repeat):
+    """Per-call latencies in nanoseconds over repeat rounds (after one warm-up round), and the calls that raised."""
+    for value in inputs:
+        try:
+            func(value)
+        except Exception:
+            pass
+    timings = []
+    errors = 0
+    clock = time.perf_counter_ns
+    for _ in range(repeat):
+        for value in inputs:
+            started = clock()
+            try:
+                func(value)
+            except Exception:
+                errors += 1
+            timings.append(clock() - started)
+    return timings, errors // repeat
+
+
+def summarize(timings, errors):
+    timings = sorted(timings)
+    count = len(timings)
+    if not count:
+        return {'calls': 0, 'errors': errors}
+
+    def percentile(p):
+        return round(timings[min(count - 1, int(p * count))] / 1000, 3)
+
+    return {'calls': count, 'errors': errors, 'mean_us': round(sum(timings) / count / 1000, 3),
+            'p50_us': percentile(0.50), 'p95_us': percentile(0.95), 'p99_us': percentile(0.99),
+            'max_us': round(timings[-1] / 1000, 3)}
+
+
+def run_schema(schema, entries, repeat):
+    queries = [entry['query'] for entry in entries]
+    functions = stage_functions(schema)
+    stages = {}
+    for name, func in functions.items():
+        stages[name] = dict(summarize(*time_calls(func, queries, repeat)), backend=STAGES[name])
+
+    # The generators only get the queries that parsed without an error, like in the app
+    parsed = [functions['parse'](query) for query in queries]
+    parsed = [parsed_query for parsed_query in parsed if not parsed_query.error and parsed_query.joins]
+    for name, func in (('generate_sql', ut.generate_sql), ('generate_mongo', ut.generate_mongo_pipeline)):
+        stages[name] = dict(summarize(*time_calls(func, parsed, repeat)), backend=STAGES[name])
+
+    by_pattern = {}
+    for pattern in PATTERNS:
+        pattern_queries = [entry['query'] for entry in entries if entry['pattern'] == pattern]
+        if pattern_queries:
+            by_pattern[pattern] = {name: summarize(*time_calls(functions[name], pattern_queries, 1))['p50_us']
+                                   for name in ('translate_sql', 'translate_mongo')}
+    return {'queries': len(queries), 'translated': len(parsed), 'stages': stages, 'by_pattern_p50_us': by_pattern}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Prints the p50 ratio of every stage against a baseline run. Returns the stages slower by more than threshold."""
+    regressions = []
+    print(f"\n{'schema/stage':<32}{'baseline p50':>14}{'current p50':>14}{'ratio':>8}")
+    for schema_name, schema_results in results['schemas'].items():
+        baseline_stages = baseline.get('schemas', {}).get(schema_name, {}).get('stages', {})
+        for stage, current in schema_results['stages'].items():
+            before = baseline_stages.get(stage, {}).get('p50_us')
+            after = current.get('p50_us')
+            if not before or after is None:
+                continue
+            ratio = after / before
+            flag = '  <-- slower' if ratio > threshold else ''
+            print(f"{schema_name + '/' + stage:<32}{before:>14.2f}{after:>14.2f}{ratio:>7.2f}x{flag}")
+            if ratio > threshold:
+                regressions.append(f'{schema_name}/{stage}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=3000, help='corpus size, spread over the schemas')
+    parser.add_argument('--repeat', type=int, default=5, help='timed rounds over the corpus per stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--schemas', default='retail,school')
+    parser.add_argument('--output', default='bench_translation.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='p50 ratio counted as a regression')
+    parser.add_argument('--dump-corpus', help='also write the generated queries to this JSON lines file')
+    args = parser.parse_args()
+
+    available = {
+        'retail': lambda: csv_schema('retail', RETAIL_CSVS),
+        'school': lambda: ddl_schema('school', os.path.join(ROOT, SCHOOL_DDL)),
+    }
+    schemas = [available[name]() for name in args.schemas.split(',')]
+    corpus = build_corpus(schemas, args.queries, args.seed)
+    if args.dump_corpus:
+        with open(args.dump_corpus, 'w', encoding='utf-8') as f:
+            for entry in corpus:
+                f.write(json.dumps(entry) + '\n')
+
+    results = {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(),
+                 'python': platform.python_version(), 'platform': platform.platform(),
+                 'queries': len(corpus), 'repeat': args.repeat, 'seed': args.seed},
+        'corpus': {'by_pattern': dict(Counter(entry['pattern'] for entry in corpus)),
+                   'by_modifier': dict(Counter(entry['modifier'] for entry in corpus))},
+        'schemas': {},
+    }
+    for schema in schemas:
+        entries = [entry for entry in corpus if entry['schema'] == schema.name]
+        results['schemas'][schema.name] = run_schema(schema, entries, args.repeat)
+
+    print(f"{len(corpus)} queries, {args.repeat} rounds")
+    print(f"{'schema/stage':<32}{'backend':>8}{'mean us':>10}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'errors':>8}")
+    for schema_name, schema_results in results['schemas'].items():
+        for stage, summary in schema_results['stages'].items():
+            print(f"{schema_name + '/' + stage:<32}{summary['backend']:>8}{summary.get('mean_us', 0):>10.2f}"
+                  f"{summary.get('p50_us', 0):>10.2f}{summary.get('p95_us', 0):>10.2f}{summary.get('p99_us', 0):>10.2f}{summary['errors']:>8}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than {args.threshold}x the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
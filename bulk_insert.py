@@ -0,0 +1,196 @@
+import csv
+import io
+import os
+import tempfile
+import time
+
+
+# Insert strategies for DataFrame.to_sql. Each one is a pandas `method` callable
+# (or one of pandas' own method names) keyed by the name used in sql_load_options.
+#
+#   default     pandas' own insert: one SQLAlchemy executemany per batch
+#   multi       multi-row INSERT ... VALUES (...), (...) statements
+#   executemany one DBAPI executemany per batch, skipping SQLAlchemy's statement handling
+#   copy        PostgreSQL COPY ... FROM STDIN (psycopg2)
+#   load_data   MySQL LOAD DATA LOCAL INFILE (needs local_infile on both client and server)
+#   auto        the fastest of the above that the connection supports
+
+# Bind parameters allowed in one statement, which caps the rows per multi-row INSERT
+MULTI_ROW_MAX_PARAMS = {"sqlite": 999, "postgresql": 65535}
+DEFAULT_MULTI_ROW_MAX_PARAMS = 65535
+
+# Rows per load, and the insert method used, for every table loaded so far
+_load_stats = {}
+# Method picked by 'auto' for each database URL
+_auto_methods = {}
+
+
+def _table_name(conn, pd_table):
+    quote = conn.dialect.identifier_preparer.quote
+    if pd_table.schema:
+        return f"{quote(pd_table.schema)}.{quote(pd_table.name)}"
+    return quote(pd_table.name)
+
+
+def insert_executemany(pd_table, conn, keys, data_iter):
+    """One DBAPI executemany for the whole batch."""
+    quote = conn.dialect.identifier_preparer.quote
+    placeholder = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+    columns = ", ".join(quote(key) for key in keys)
+    placeholders = ", ".join([placeholder] * len(keys))
+    rows = list(data_iter)
+    if rows:
+        conn.exec_driver_sql(f"INSERT INTO {_table_name(conn, pd_table)} ({columns}) VALUES ({placeholders})", rows)
+    return len(rows)
+
+
+def insert_copy_postgres(pd_table, conn, keys, data_iter):
+    """PostgreSQL COPY FROM STDIN with the batch written as CSV (empty unquoted fields are NULL)."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(data_iter)
+    buffer.seek(0)
+    quote = conn.dialect.identifier_preparer.quote
+    columns = ", ".join(quote(key) for key in keys)
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {_table_name(conn, pd_table)} ({columns}) FROM STDIN WITH CSV", buffer)
+        return cursor.rowcount
+
+
+def _mysql_field(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        value = int(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def insert_load_data_mysql(pd_table, conn, keys, data_iter):
+    """MySQL LOAD DATA LOCAL INFILE from a temporary file holding the batch."""
+    quote = conn.dialect.identifier_preparer.quote
+    columns = ", ".join(quote(key) for key in keys)
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            for row in data_iter:
+                f.write(",".join(_mysql_field(value) for value in row))
+                f.write("\n")
+        # Quoted fields with doubled quotes and no escape character; unquoted NULL is NULL
+        statement = (f"LOAD DATA LOCAL INFILE '{path.replace(chr(92), '/')}' INTO TABLE {_table_name(conn, pd_table)} "
+                     f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' ENCLOSED BY '\"' ESCAPED BY '' "
+                     f"LINES TERMINATED BY '\\n' ({columns})")
+        # Raw cursor: no parameters, so the driver doesn't try to %-format the statement
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(statement)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+    finally:
+        os.remove(path)
+
+
+INSERT_METHODS = {
+    "default": None,
+    "multi": "multi",
+    "executemany": insert_executemany,
+    "copy": insert_copy_postgres,
+    "load_data": insert_load_data_mysql,
+}
+
+
+def _mysql_local_infile_enabled(conn):
+    """LOAD DATA LOCAL needs the client (connect_args={'local_infile': True}) and the server to allow it."""
+    if not getattr(conn.connection.dbapi_connection, "_local_infile", False):
+        return False
+    try:
+        # On a connection of its own: on the loader's connection the SELECT would begin a transaction, and
+        # to_sql then leaves committing to the caller, so the rows written after it would be rolled back
+        with conn.engine.connect() as probe:
+            return bool(probe.exec_driver_sql("SELECT @@GLOBAL.local_infile").scalar())
+    except Exception:
+        return False
+
+
+def _fallback_method(conn):
+    """Best method that works without native bulk loading. pymysql turns executemany into multi-row INSERTs itself."""
+    if conn.dialect.name in ("mysql", "mariadb", "sqlite"):
+        return "executemany"
+    return "multi"
+
+
+def choose_insert_method(conn):
+    """Picks the fastest insert method the connection's database and driver support. Cached per database URL."""
+    url = conn.engine.url.render_as_string(hide_password=True)
+    name = _auto_methods.get(url)
+    if name is None:
+        dialect = conn.dialect.name
+        if dialect == "postgresql" and conn.dialect.driver == "psycopg2":
+            name = "copy"
+        elif dialect in ("mysql", "mariadb") and _mysql_local_infile_enabled(conn):
+            name = "load_data"
+        else:
+            name = _fallback_method(conn)
+        _auto_methods[url] = name
+    return name
+
+
+def write_dataframe(df, table_name, conn, if_exists="append", method="auto", batch_size=None):
+    """
+    Writes df to table_name through conn with the given insert method ('auto' picks one).
+
+    Parameters:
+    - df (pandas.DataFrame): Rows to write.
+    - table_name (str): Target table, created if it doesn't exist.
+    - conn (sqlalchemy.engine.Connection): Connection to write through.
+    - if_exists (str): 'fail', 'replace' or 'append', as for DataFrame.to_sql.
+    - method (str): One of INSERT_METHODS or 'auto'.
+    - batch_size (int): Rows per insert batch. Native bulk methods send the whole DataFrame at once.
+
+    Returns:
+    - (str, float): the insert method used and the seconds spent writing.
+    """
+    name = choose_insert_method(conn) if method == "auto" else method
+    if name not in INSERT_METHODS:
+        raise ValueError(f"Unknown insert method: {name}")
+
+    chunksize = batch_size
+    if name == "multi":
+        max_params = MULTI_ROW_MAX_PARAMS.get(conn.dialect.name, DEFAULT_MULTI_ROW_MAX_PARAMS)
+        chunksize = min(batch_size or len(df) or 1, max(1, max_params // max(1, len(df.columns))))
+    elif name in ("copy", "load_data"):
+        chunksize = None
+
+    started = time.perf_counter()
+    try:
+        df.to_sql(table_name, conn, if_exists=if_exists, index=False, chunksize=chunksize, method=INSERT_METHODS[name])
+    except Exception as e:
+        if method != "auto" or name not in ("copy", "load_data"):
+            raise
+        # The native path isn't usable here after all (e.g. server refused it), don't try it again
+        fallback = _fallback_method(conn)
+        print(f"Bulk insert with {name} failed ({e}), falling back to {fallback}.")
+        if conn.in_transaction():
+            conn.rollback()
+        _auto_methods[conn.engine.url.render_as_string(hide_password=True)] = fallback
+        return write_dataframe(df, table_name, conn, "append" if if_exists == "fail" else if_exists, fallback, batch_size)
+    return name, time.perf_counter() - started
+
+
+def record_load(table_name, rows, seconds, insert_seconds, method):
+    """Stores the throughput of a finished load so it can be reported, and returns it."""
+    stats = {
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "insert_seconds": round(insert_seconds, 4),
+        "rows_per_sec": round(rows / seconds) if seconds else None,
+        "insert_method": method,
+    }
+    _load_stats[table_name] = stats
+    return stats
+
+
+def get_load_stats(table_names=None):
+    """Throughput of the last load of each table (or of the given tables)."""
+    if table_names is None:
+        return dict(_load_stats)
+    return {name: _load_stats[name] for name in table_names if name in _load_stats}
@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import sqlalchemy
+
+
+class TranslationCache:
+    """
+    Bounded LRU cache with an optional time-to-live, used to remember NL -> SQL / MongoDB translations.
+
+    Keys are built by the caller, e.g. (normalized query, database_type, schema fingerprint).
+    Cached values are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss or an expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every entry, e.g. after the schema changed."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class StatementCache(TranslationCache):
+    """
+    sqlalchemy text() constructs by SQL text. Parameterized queries of the same shape share one template, so
+    its text is only scanned for bind parameters once and SQLAlchemy finds its compiled form for every run.
+    """
+
+    def statement(self, sql_text):
+        statement = self.get(sql_text)
+        if statement is None:
+            statement = sqlalchemy.text(sql_text)
+            self.put(sql_text, statement)
+        return statement
+
+
+class ResultCache:
+    """
+    Cache of executed query results, bounded by the approximate size of the results in bytes.
+
+    Every entry records the tables (or collections) it was read from, so reloading one
+    dataset only drops the results that depend on it. Least recently used entries are
+    evicted first once max_bytes is exceeded.
+
+    Callers take generation() before running a query and pass it to put: a result read
+    while one of its tables was reloaded is dropped instead of cached.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._keys_by_table = {}
+        self._bytes = 0
+        # Incremented by every invalidation; the generation each table (None: every table) was last invalidated at
+        self._generation = 0
+        self._invalidated_at = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.rejected = 0
+        self.stale = 0
+
+    @staticmethod
+    def _result_size(value):
+        """Size of the result once serialized, used as its cost in the cache."""
+        return len(json.dumps(value, default=str))
+
+    def _remove(self, key):
+        value, size, tables, stored_at = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table]
+
+    def get(self, key):
+        """Returns the cached result for key, or None on a miss or an expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, tables, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self):
+        """Taken before running a query and passed to put with its result."""
+        with self._lock:
+            return self._generation
+
+    def put(self, key, value, tables, generation=None):
+        """
+        Stores a result read from the given tables. Results larger than max_bytes are not cached, nor
+        results whose query started (at generation) before one of their tables was invalidated.
+        """
+        size = self._result_size(value)
+        tables = frozenset(tables)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if generation is not None and any(self._invalidated_at.get(table, 0) > generation for table in (None, *tables)):
+                self.stale += 1
+                return
+            if size > self.max_bytes:
+                self.rejected += 1
+                return
+            self._entries[key] = (value, size, tables, time.monotonic())
+            self._bytes += size
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_tables(self, tables):
+        """Drops every result that was read from any of the given tables."""
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                self._invalidated_at[table] = self._generation
+                for key in list(self._keys_by_table.get(table, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._invalidated_at = {None: self._generation}
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_table.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "rejected": self.rejected,
+                "stale": self.stale,
+                "tables": sorted(self._keys_by_table),
+            }
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from sketches import ColumnSketch
+
+
+# Persistent catalog of loaded datasets, kept in a local SQLite file. For every
+# (CSV path, database type, target database) it stores the column classification,
+# the column sketches, the sample rows and a fingerprint of the CSV file, so a
+# restarted app can restore its metadata without reading the CSV files again, and
+# /load_datasets can skip files that haven't changed since they were loaded.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    path TEXT NOT NULL,
+    database_type TEXT NOT NULL,
+    target TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha1 TEXT NOT NULL,
+    details TEXT NOT NULL,
+    sample TEXT NOT NULL,
+    loaded_at REAL NOT NULL,
+    PRIMARY KEY (path, database_type, target)
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def file_fingerprint(path, with_hash=True):
+    """
+    Returns {'size', 'mtime', 'sha1'} for a file. The sha1 is read in 1 MB blocks;
+    pass with_hash=False for the cheap size/mtime part only.
+    """
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime, "sha1": None}
+    if with_hash:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        fingerprint["sha1"] = digest.hexdigest()
+    return fingerprint
+
+
+def grown_file_fingerprint(path, loaded_size):
+    """
+    Reads path once and returns (sha1 of its first loaded_size bytes, fingerprint of the whole file,
+    whether a line break separates the first loaded_size bytes from the rest).
+    """
+    prefix = hashlib.sha1()
+    digest = hashlib.sha1()
+    size = 0
+    last_loaded = first_new = b""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            start, size = size, size + len(block)
+            if start < loaded_size <= size:
+                prefix.update(block[:loaded_size - start])
+                last_loaded = block[loaded_size - start - 1:loaded_size - start]
+            elif size < loaded_size:
+                prefix.update(block)
+            if start <= loaded_size < size:
+                first_new = block[loaded_size - start:loaded_size - start + 1]
+            digest.update(block)
+    fingerprint = {"size": size, "mtime": os.stat(path).st_mtime, "sha1": digest.hexdigest()}
+    return prefix.hexdigest(), fingerprint, last_loaded in (b"\n", b"\r") or first_new in (b"\n", b"\r")
+
+
+def _encode_details(details):
+    encoded = dict(details)
+    encoded["unique_elements"] = {col: sketch.to_dict() for col, sketch in details["unique_elements"].items()}
+    return json.dumps(encoded, default=str)
+
+
+def _decode_details(text):
+    details = json.loads(text)
+    details["unique_elements"] = {col: ColumnSketch.from_dict(data) for col, data in details["unique_elements"].items()}
+    return details
+
+
+class Catalog:
+    """
+    Dataset metadata stored in a SQLite file. Each call opens its own short-lived
+    connection, so the catalog can be used from the /load_datasets worker threads.
+    The file and its tables are created on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not self._initialized:
+                with self._lock:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def lookup(self, path, database_type, target):
+        """
+        Returns (details, sample) stored for path if the file is unchanged since it was
+        loaded into target, else None. Size and mtime are checked first; the file is only
+        hashed when the mtime changed but the size didn't.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT size, mtime, sha1, details, sample FROM datasets WHERE path=? AND database_type=? AND target=?",
+                (path, database_type, target)).fetchone()
+        if row is None:
+            return None
+        size, mtime, sha1, details, sample = row
+        current = file_fingerprint(path, with_hash=False)
+        if current["size"] != size:
+            return None
+        if current["mtime"] != mtime:
+            if file_fingerprint(path)["sha1"] != sha1:
+                return None
+            # Same content, only touched: remember the new mtime so the next check is cheap again
+            with self._connect() as conn:
+                conn.execute("UPDATE datasets SET mtime=? WHERE path=? AND database_type=? AND target=?",
+                             (current["mtime"], path, database_type, target))
+        return _decode_details(details), json.loads(sample)
+
+    def lookup_appended(self, path, database_type, target):
+        """
+        For a file that grew since it was loaded into target, checks that it only had rows appended:
+        the bytes that were loaded are unchanged and end on a line break. Returns (details, sample,
+        offset, fingerprint): the stored metadata, the byte offset where the new rows start and the
+        fingerprint of the file now. Returns None otherwise.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT size, sha1, details, sample FROM datasets WHERE path=? AND database_type=? AND target=?",
+                (path, database_type, target)).fetchone()
+        if row is None:
+            return None
+        size, sha1, details, sample = row
+        if size == 0 or os.path.getsize(path) <= size:
+            return None
+        prefix_sha1, fingerprint, on_line_break = grown_file_fingerprint(path, size)
+        if prefix_sha1 != sha1 or not on_line_break:
+            return None
+        return _decode_details(details), json.loads(sample), size, fingerprint
+
+    def store(self, path, database_type, target, fingerprint, details, sample):
+        """Records a freshly loaded file with the fingerprint it had when loading started."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO datasets (path, database_type, target, size, mtime, sha1, details, sample, loaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, database_type, target, fingerprint["size"], fingerprint["mtime"], fingerprint["sha1"],
+                 _encode_details(details), json.dumps(sample, default=str), time.time()))
+
+    def entries(self, paths, database_type, target):
+        """Stored (details, sample) for each of paths that is in the catalog, without checking the files."""
+        found = {}
+        with self._connect() as conn:
+            for path in paths:
+                row = conn.execute("SELECT details, sample FROM datasets WHERE path=? AND database_type=? AND target=?",
+                                   (path, database_type, target)).fetchone()
+                if row is not None:
+                    found[path] = (_decode_details(row[0]), json.loads(row[1]))
+        return found
+
+    def set_state(self, key, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def get_state(self, key, default=None):
+        if not os.path.exists(self.path):
+            return default
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM state WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
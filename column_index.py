@@ -0,0 +1,111 @@
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass
+class ColumnMention:
+    """One occurrence of a column name in a piece of text. spaced is True when it was written with spaces for '_'."""
+    column: str
+    start: int
+    end: int
+    spaced: bool = False
+
+
+# Below this many columns the per-column substring checks run in C and beat a
+# character-by-character walk in Python (see benchmarks/bench_columns.py)
+LINEAR_SCAN_MAX_COLUMNS = 24
+
+
+class ColumnIndex:
+    """
+    Aho-Corasick matcher over the loaded column names and their '_'-as-space spellings.
+
+    Finding every column mentioned in a text takes one pass over the text, whatever the
+    number of columns, instead of one substring search per column. Matching keeps the
+    substring semantics of `col in text or col.replace('_',' ') in text`.
+    Build it once per schema (app.py does so on /load_datasets) and share it; it is read-only.
+    """
+
+    def __init__(self, column_names):
+        self.column_names = list(dict.fromkeys(column_names))
+        self.columns = frozenset(self.column_names)
+
+        goto = [{}]
+        outputs = [[]]
+        for column in self.column_names:
+            spellings = {column: False}
+            spellings.setdefault(column.replace('_', ' '), True)
+            for spelling, spaced in spellings.items():
+                state = 0
+                for ch in spelling:
+                    next_state = goto[state].get(ch)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][ch] = next_state
+                        goto.append({})
+                        outputs.append([])
+                    state = next_state
+                outputs[state].append((column, len(spelling), spaced))
+
+        # Breadth-first pass: failure links, merged outputs, and a full transition
+        # table so matching never has to walk failure links
+        fail = [0] * len(goto)
+        transitions = [dict(goto[0])]
+        transitions.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = transitions[fail[state]]
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            table = dict(fallback)
+            for ch, child in goto[state].items():
+                table[ch] = child
+                fail[child] = fallback.get(ch, 0)
+                queue.append(child)
+            transitions[state] = table
+
+        self._transitions = transitions
+        self._outputs = [tuple(out) for out in outputs]
+        # An empty column name is a substring of every text
+        self._always = [column for column, length, spaced in outputs[0]]
+
+    def find(self, text):
+        """Returns every column mention in text, with positions, ordered by where the mention ends."""
+        mentions = [ColumnMention(column, 0, 0) for column in self._always]
+        transitions = self._transitions
+        outputs = self._outputs
+        state = 0
+        for end, ch in enumerate(text, 1):
+            state = transitions[state].get(ch, 0)
+            if outputs[state]:
+                for column, length, spaced in outputs[state]:
+                    mentions.append(ColumnMention(column, end - length, end, spaced))
+        return mentions
+
+    def mentioned(self, text, columns=None, spaced=True):
+        """
+        Returns the columns mentioned in text, in the order of columns (schema order by default).
+        With spaced=False only the exact column name counts, not its '_'-as-space spelling.
+        Columns that are not in the index are checked with a plain substring search.
+        """
+        if columns is None:
+            columns = self.column_names
+        if len(self.column_names) <= LINEAR_SCAN_MAX_COLUMNS:
+            if spaced:
+                return [col for col in columns if col in text or col.replace('_', ' ') in text]
+            return [col for col in columns if col in text]
+
+        found = set(self._always)
+        transitions = self._transitions
+        outputs = self._outputs
+        state = 0
+        for ch in text:
+            state = transitions[state].get(ch, 0)
+            if outputs[state]:
+                for column, length, is_spaced in outputs[state]:
+                    if spaced or not is_spaced:
+                        found.add(column)
+        indexed = self.columns
+        return [col for col in columns
+                if col in found
+                or (col not in indexed and (col in text or (spaced and col.replace('_', ' ') in text)))]
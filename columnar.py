@@ -0,0 +1,68 @@
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional, only the arrow and parquet formats need it
+    pa = pq = None
+
+
+# Column-oriented /process_query results ("format" in the request) instead of one dict per row:
+#
+#   columnar  JSON {"columns": [names], "data": [[values of column 1], ...], "rows": n}
+#   arrow     Apache Arrow IPC stream, e.g. pyarrow.ipc.open_stream(body).read_pandas()
+#   parquet   Parquet file, e.g. pandas.read_parquet(io.BytesIO(body))
+#
+# The arrow and parquet formats need pyarrow; the translated query is kept in the schema metadata.
+
+RESULT_FORMATS = {
+    "columnar": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+BINARY_FORMATS = ("arrow", "parquet")
+
+
+def result_format(body):
+    """The columnar format a request asks for with its "format" field, or None for the default rows format."""
+    fmt = (body or {}).get('format')
+    if not fmt or fmt == 'rows':
+        return None
+    if fmt not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {fmt}. Use one of rows, {', '.join(RESULT_FORMATS)}")
+    if fmt in BINARY_FORMATS and pa is None:
+        raise ValueError(f"The {fmt} result format needs pyarrow, which is not installed")
+    return fmt
+
+
+def columns_from_rows(keys, rows):
+    """Column-wise copy of cursor rows (tuples), without building a dict per row."""
+    keys = list(keys)
+    data = [list(column) for column in zip(*rows)] or [[] for _ in keys]
+    return {"columns": keys, "data": data, "rows": len(data[0]) if data else 0}
+
+
+def columns_from_documents(documents):
+    """Column-wise copy of MongoDB documents; fields missing from a document are None."""
+    keys = list(dict.fromkeys(key for document in documents for key in document))
+    return {"columns": keys, "data": [[document.get(key) for document in documents] for key in keys], "rows": len(documents)}
+
+
+def _arrow_array(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed types in one column (SQLite allows it, so do MongoDB fields): send them as text
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+def encode_binary(result, fmt, metadata=None):
+    """Arrow IPC stream or Parquet bytes for a columnar result, with metadata (str -> str) on the schema."""
+    table = pa.Table.from_arrays([_arrow_array(values) for values in result["data"]], names=result["columns"])
+    if metadata:
+        table = table.replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    if fmt == "arrow":
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
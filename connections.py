@@ -0,0 +1,287 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from pymongo import MongoClient
+
+
+# One engine per db_url for the whole process. Both the CSV loader and the
+# query executor go through get_engine so they share the same pool.
+_engines = {}
+_pool_stats = {}
+_engines_lock = threading.Lock()
+# Pool events fire on whichever thread checks a connection in or out, so the counters are updated under a lock
+_stats_lock = threading.Lock()
+# AsyncEngines used by the async app (async_app.py), keyed by their async URL
+_async_engines = {}
+
+# Async DBAPI driver used for each database by get_async_engine
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "mysql": "aiomysql", "mariadb": "aiomysql", "postgresql": "asyncpg"}
+
+
+def _new_pool_stats():
+    return {
+        "connects": 0,
+        "checkouts": 0,
+        "checkins": 0,
+        "invalidated": 0,
+        "wait_count": 0,
+        "wait_total_ms": 0.0,
+        "wait_max_ms": 0.0,
+    }
+
+
+def _count(stats, name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def _register_pool_events(engine, stats):
+    """Counts pool connects, checkouts and checkins for the given engine."""
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        _count(stats, "connects")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _count(stats, "checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        _count(stats, "checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        _count(stats, "invalidated")
+
+
+def get_engine(db_url, pool_size=5, max_overflow=10, pool_pre_ping=True, pool_recycle=1800, connect_args=None):
+    """
+    Returns the process-wide SQLAlchemy engine for db_url, creating it on first use.
+
+    Parameters:
+    - db_url (str): Database URL in SQLAlchemy format.
+    - pool_size (int): Number of connections kept open in the pool.
+    - max_overflow (int): Extra connections allowed above pool_size under load.
+    - pool_pre_ping (bool): Test connections on checkout and replace stale ones.
+    - pool_recycle (int): Seconds after which a pooled connection is reopened. -1 disables it.
+    - connect_args (dict): Extra driver arguments, e.g. {"local_infile": True} for MySQL LOAD DATA LOCAL.
+
+    The pool settings only apply when the engine is first created; later calls
+    with the same db_url return the existing engine.
+
+    Returns:
+    - sqlalchemy.engine.Engine
+    """
+    engine = _engines.get(db_url)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(db_url)
+        if engine is None:
+            try:
+                engine = create_engine(db_url, pool_size=pool_size, max_overflow=max_overflow,
+                                       pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle,
+                                       connect_args=connect_args or {})
+            except TypeError:
+                # Pools such as SingletonThreadPool (sqlite :memory:) don't take size arguments
+                engine = create_engine(db_url, pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle,
+                                       connect_args=connect_args or {})
+            stats = _new_pool_stats()
+            _register_pool_events(engine, stats)
+            _pool_stats[db_url] = stats
+            _engines[db_url] = engine
+    return engine
+
+
+def connect(db_url, **pool_options):
+    """
+    Checks out a connection from the shared engine for db_url and records how
+    long the checkout waited on the pool.
+
+    Returns:
+    - sqlalchemy.engine.Connection, to be used as a context manager.
+    """
+    engine = get_engine(db_url, **pool_options)
+    started = time.perf_counter()
+    connection = engine.connect()
+    waited_ms = (time.perf_counter() - started) * 1000
+    stats = _pool_stats[db_url]
+    with _stats_lock:
+        stats["wait_count"] += 1
+        stats["wait_total_ms"] += waited_ms
+        stats["wait_max_ms"] = max(stats["wait_max_ms"], waited_ms)
+    return connection
+
+
+@contextmanager
+def reuse(connection):
+    """
+    Runs one statement on a connection the caller already checked out and keeps open for more,
+    e.g. for a /process_queries batch. Ends the statement's transaction afterwards, so the next
+    statement starts clean even if this one failed.
+    """
+    try:
+        yield connection
+    finally:
+        connection.rollback()
+
+
+def async_url(db_url):
+    """The db_url with its driver swapped for the async one in ASYNC_DRIVERS (e.g. mysql+pymysql -> mysql+aiomysql)."""
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend} databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def get_async_engine(db_url, pool_size=5, max_overflow=10, pool_pre_ping=True, pool_recycle=1800, connect_args=None):
+    """
+    Returns the process-wide SQLAlchemy AsyncEngine for db_url, creating it on first use.
+    Takes the same (sync) db_url and pool settings as get_engine; the driver is swapped
+    for its async counterpart (aiosqlite, aiomysql, asyncpg), which has to be installed.
+
+    Returns:
+    - sqlalchemy.ext.asyncio.AsyncEngine
+    """
+    key = async_url(db_url)
+    engine = _async_engines.get(key)
+    if engine is not None:
+        return engine
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    with _engines_lock:
+        engine = _async_engines.get(key)
+        if engine is None:
+            try:
+                engine = create_async_engine(key, pool_size=pool_size, max_overflow=max_overflow,
+                                             pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle,
+                                             connect_args=connect_args or {})
+            except TypeError:
+                engine = create_async_engine(key, pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle,
+                                             connect_args=connect_args or {})
+            stats = _new_pool_stats()
+            _register_pool_events(engine.sync_engine, stats)
+            _pool_stats[key] = stats
+            _async_engines[key] = engine
+    return engine
+
+
+async def dispose_async_engines():
+    """Closes every pooled async connection and forgets the async engines. Awaited on async app shutdown."""
+    with _engines_lock:
+        engines = list(_async_engines.items())
+        _async_engines.clear()
+    for key, engine in engines:
+        await engine.dispose()
+        _pool_stats.pop(key, None)
+
+
+def get_pool_stats():
+    """Returns checkout/wait metrics and the current pool status for every engine."""
+    report = {}
+    engines = list(_engines.items()) + [(key, engine.sync_engine) for key, engine in list(_async_engines.items())]
+    for db_url, engine in engines:
+        with _stats_lock:
+            stats = dict(_pool_stats[db_url])
+        pool = engine.pool
+        stats["wait_avg_ms"] = stats["wait_total_ms"] / stats["wait_count"] if stats["wait_count"] else 0.0
+        stats["checked_out"] = pool.checkedout() if hasattr(pool, "checkedout") else None
+        stats["pool_size"] = pool.size() if hasattr(pool, "size") else None
+        stats["overflow"] = pool.overflow() if hasattr(pool, "overflow") else None
+        stats["status"] = pool.status()
+        report[engine.url.render_as_string(hide_password=True)] = stats
+    return report
+
+
+def dispose_engines():
+    """Closes every pooled connection and forgets the engines."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _pool_stats.clear()
+
+
+# One MongoClient per mongo_uri. MongoClient keeps its own connection pool and
+# monitor threads, so it should be created once and shared. Tests can point
+# mongo_client_factory at mongomock.MongoClient or another local stand-in.
+mongo_client_factory = MongoClient
+_mongo_clients = {}
+_mongo_clients_lock = threading.Lock()
+
+
+def get_mongo_client(mongo_uri, max_pool_size=100, min_pool_size=0):
+    """
+    Returns the process-wide MongoClient for mongo_uri, creating it on first use.
+
+    Parameters:
+    - mongo_uri (str): MongoDB connection URI.
+    - max_pool_size (int): Maximum number of sockets the client keeps per server.
+    - min_pool_size (int): Number of sockets kept open even when idle.
+
+    Returns:
+    - pymongo.MongoClient (or whatever mongo_client_factory builds)
+    """
+    client = _mongo_clients.get(mongo_uri)
+    if client is not None:
+        return client
+
+    with _mongo_clients_lock:
+        client = _mongo_clients.get(mongo_uri)
+        if client is None:
+            client = mongo_client_factory(mongo_uri, maxPoolSize=max_pool_size, minPoolSize=min_pool_size)
+            _mongo_clients[mongo_uri] = client
+    return client
+
+
+# One Motor client per mongo_uri for the async app. None means motor's AsyncIOMotorClient;
+# tests can point motor_client_factory at a stand-in such as mongomock_motor.AsyncMongoMockClient.
+motor_client_factory = None
+_motor_clients = {}
+
+
+def get_motor_client(mongo_uri, max_pool_size=100, min_pool_size=0):
+    """
+    Returns the process-wide Motor (asyncio MongoDB) client for mongo_uri, creating it on first use.
+    Same pool settings as get_mongo_client. Motor has to be installed unless motor_client_factory is set.
+    """
+    client = _motor_clients.get(mongo_uri)
+    if client is not None:
+        return client
+
+    factory = motor_client_factory
+    if factory is None:
+        from motor.motor_asyncio import AsyncIOMotorClient as factory
+    with _mongo_clients_lock:
+        client = _motor_clients.get(mongo_uri)
+        if client is None:
+            client = factory(mongo_uri, maxPoolSize=max_pool_size, minPoolSize=min_pool_size)
+            _motor_clients[mongo_uri] = client
+    return client
+
+
+def close_mongo_clients():
+    """Closes every shared MongoClient and Motor client. Safe to call more than once."""
+    with _mongo_clients_lock:
+        for clients in (_mongo_clients, _motor_clients):
+            for client in clients.values():
+                try:
+                    client.close()
+                except Exception as e:
+                    print(f"Error closing MongoDB client: {e}")
+            clients.clear()
+
+
+def close_all():
+    """Releases all pooled SQL and MongoDB connections, used on app teardown."""
+    dispose_engines()
+    close_mongo_clients()
+
+
+atexit.register(close_all)
@@ -0,0 +1,218 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+# Per-query guardrails used by the executors in app.py: a deadline enforced by the database
+# itself, and cancellation of a running query by its request id (POST /cancel).
+#
+#   SQLite      progress handler that interrupts the statement (sqlite3 interrupt() on cancel)
+#   MySQL       SET SESSION max_execution_time (MariaDB: max_statement_time) when it changes,
+#               KILL QUERY on cancel
+#   PostgreSQL  SET LOCAL statement_timeout, pg_cancel_backend on cancel
+#   MongoDB     maxTimeMS, killOp of the operations tagged with the request id on cancel
+
+# SQLite calls the progress handler every this many virtual machine instructions
+SQLITE_PROGRESS_STEPS = 10000
+
+
+class QueryCancelled(Exception):
+    """A query was cancelled or ran past its deadline."""
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+class RunningQuery:
+    """A query being executed: its deadline, whether it was cancelled and how to interrupt it on the server."""
+
+    def __init__(self, request_id, timeout=None):
+        self.request_id = request_id
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.cancelled = threading.Event()
+        self.on_cancel = None
+
+    def remaining_ms(self):
+        """Milliseconds left before the deadline (at least 1), or None without one."""
+        if self.deadline is None:
+            return None
+        return max(1, int((self.deadline - time.monotonic()) * 1000))
+
+    def should_stop(self):
+        return self.cancelled.is_set() or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    def interrupted(self):
+        """The error to report for a query stopped by cancel() or its deadline."""
+        if self.cancelled.is_set():
+            return QueryCancelled(f"Query {self.request_id} was cancelled")
+        return QueryCancelled(f"Query {self.request_id} exceeded its time limit of {self.timeout} seconds")
+
+
+_running = {}
+_running_lock = threading.Lock()
+
+
+@contextmanager
+def track(request_id, timeout=None):
+    """Registers a query under request_id for the duration of the block, so cancel() can find it."""
+    running = RunningQuery(request_id, timeout)
+    with _running_lock:
+        _running[request_id] = running
+    try:
+        yield running
+    finally:
+        with _running_lock:
+            if _running.get(request_id) is running:
+                del _running[request_id]
+
+
+def cancel(request_id):
+    """Cancels the query running under request_id. Returns False if there is none."""
+    with _running_lock:
+        running = _running.get(request_id)
+    if running is None:
+        return False
+    running.cancelled.set()
+    on_cancel = running.on_cancel
+    if on_cancel is not None:
+        try:
+            on_cancel()
+        except Exception as e:
+            print(f"Error cancelling query {request_id}: {e}")
+    return True
+
+
+def running_queries():
+    """Request id and seconds running of every query in flight."""
+    now = time.monotonic()
+    with _running_lock:
+        return [{"request_id": request_id, "seconds": round(now - running.started, 3)} for request_id, running in _running.items()]
+
+
+def _is_mariadb(dialect):
+    return dialect.name == 'mariadb' or (dialect.name == 'mysql' and getattr(dialect, 'is_mariadb', False))
+
+
+def session_deadline(dialect, remaining_ms):
+    """
+    The statement that limits the next statements on a connection to remaining_ms on the server, and the one
+    that lifts the limit again before the connection goes back to the pool (None where the limit ends with the
+    transaction), as (set, reset); None for databases without such a setting. Setting it on the session rather
+    than in the statement text keeps the text, and so the cached statement (see app.statement_cache), the same.
+    MySQL and MariaDB limits are rounded up to whole seconds, so queries with the same timeout set the same limit.
+    """
+    seconds = -(-remaining_ms // 1000)
+    if _is_mariadb(dialect):
+        return f"SET SESSION max_statement_time = {seconds}", "SET SESSION max_statement_time = DEFAULT"
+    if dialect.name == 'mysql':
+        return f"SET SESSION max_execution_time = {seconds * 1000}", "SET SESSION max_execution_time = DEFAULT"
+    if dialect.name == 'postgresql':
+        return f"SET LOCAL statement_timeout = {remaining_ms}", None
+    return None
+
+
+def deadline_statements(dialect, info, remaining_ms):
+    """
+    The statements to run on a connection before and after a query with remaining_ms left (None: no deadline),
+    as (before, after), either None. MySQL's max_execution_time only limits read-only SELECTs, so it stays on
+    the session between queries: info (Connection.info, dropped with the database connection) remembers it, and
+    it is only sent again when it changes, or lifted before a query without a deadline. MariaDB's
+    max_statement_time also stops writes, e.g. a dataset load on the same pool, so it is lifted after each query.
+    """
+    if dialect.name == 'mysql' and not _is_mariadb(dialect):
+        kept = info.get('max_execution_time')
+        wanted = session_deadline(dialect, remaining_ms)[0] if remaining_ms is not None else None
+        if wanted == kept:
+            return None, None
+        if wanted is None:
+            del info['max_execution_time']
+            return "SET SESSION max_execution_time = DEFAULT", None
+        info['max_execution_time'] = wanted
+        return wanted, None
+    if remaining_ms is None:
+        return None, None
+    return session_deadline(dialect, remaining_ms) or (None, None)
+
+
+def _session_id(connection, statement):
+    """The server's id for the session of connection, looked up once per database connection."""
+    if statement not in connection.info:
+        connection.info[statement] = connection.exec_driver_sql(statement).scalar()
+    return connection.info[statement]
+
+
+def _run_on_new_connection(engine, statement):
+    with engine.connect() as connection:
+        connection.exec_driver_sql(statement)
+
+
+@contextmanager
+def sql_guard(connection, running):
+    """
+    Applies running's deadline to the statements run on a SQLAlchemy connection inside the block and lets
+    cancel() interrupt them. Errors raised because the query was stopped come out as QueryCancelled.
+    """
+    dialect = connection.dialect
+    cleanups = []
+    if dialect.name != 'sqlite':
+        set_deadline, reset_deadline = deadline_statements(dialect, connection.info, running.remaining_ms())
+        if set_deadline:
+            connection.exec_driver_sql(set_deadline)
+        if reset_deadline:
+            # An invalidated connection (e.g. a MySQL stream stopped part way) is closed, not reused
+            cleanups.append(lambda: connection.invalidated or connection.exec_driver_sql(reset_deadline))
+    if dialect.name == 'sqlite':
+        dbapi_connection = connection.connection.dbapi_connection
+        dbapi_connection.set_progress_handler(lambda: 1 if running.should_stop() else 0, SQLITE_PROGRESS_STEPS)
+        cleanups.append(lambda: dbapi_connection.set_progress_handler(None, 0))
+        running.on_cancel = dbapi_connection.interrupt
+    elif dialect.name in ('mysql', 'mariadb'):
+        thread_id = _session_id(connection, "SELECT CONNECTION_ID()")
+        running.on_cancel = lambda: _run_on_new_connection(connection.engine, f"KILL QUERY {int(thread_id)}")
+    elif dialect.name == 'postgresql':
+        pid = _session_id(connection, "SELECT pg_backend_pid()")
+        running.on_cancel = lambda: _run_on_new_connection(connection.engine, f"SELECT pg_cancel_backend({int(pid)})")
+
+    try:
+        yield
+    except Exception as e:
+        if running.should_stop():
+            raise running.interrupted() from e
+        raise
+    finally:
+        running.on_cancel = None
+        for cleanup in cleanups:
+            try:
+                cleanup()
+            except Exception as e:  # e.g. the connection was lost with the query; the pool drops it
+                print(f"Error resetting the connection of query {running.request_id}: {e}")
+
+
+def _kill_mongo_operations(client, comment):
+    for operation in client.admin.aggregate([{"$currentOp": {}}, {"$match": {"command.comment": comment}}]):
+        client.admin.command("killOp", op=operation["opid"])
+
+
+@contextmanager
+def mongo_guard(client, running):
+    """
+    Yields the extra aggregate() options for running: maxTimeMS for its deadline and a comment that
+    cancel() uses to find and kill the operation.
+    """
+    comment = f"request:{running.request_id}"
+    options = {"comment": comment}
+    if running.timeout:
+        options["maxTimeMS"] = running.remaining_ms()
+    running.on_cancel = lambda: _kill_mongo_operations(client, comment)
+    try:
+        yield options
+    except Exception as e:
+        if running.should_stop():
+            raise running.interrupted() from e
+        raise
+    finally:
+        running.on_cancel = None
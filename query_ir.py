@@ -0,0 +1,82 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+# Intermediate representation of a parsed natural language query. utils.parse_query
+# builds it once and the SQL and MongoDB generators only read from it. SQLStatement at
+# the end is what the SQL generator returns.
+
+
+@dataclass
+class Measure:
+    """An aggregate in the select list, e.g. Sum(totalamount). column is '*' for a plain count."""
+    func: str
+    column: str
+
+
+@dataclass
+class Predicate:
+    """
+    One where or having condition.
+
+    op is one of '=', '!=', '<', '<=', '>', '>=', 'like', 'between' (value is then a (low, high) tuple)
+    or 'in' (value is then a tuple of values).
+    agg is set for conditions on an aggregate, e.g. Sum(totalamount) > 1000.
+    When no operator could be recognised op is None and raw holds the condition text as typed.
+    column_type is the type the column was loaded with (see utils.column_type), None if unknown.
+    """
+    column: str
+    op: Optional[str]
+    value: object = None
+    agg: Optional[str] = None
+    raw: Optional[str] = None
+    column_type: Optional[str] = None
+
+    @property
+    def value_type(self) -> Optional[str]:
+        """The type the value is compared as: a number for conditions on an aggregate, else the column's type."""
+        return 'number' if self.agg else self.column_type
+
+
+@dataclass
+class JoinStep:
+    """A table in the from clause. The first step has no join condition."""
+    table: str
+    left_table: Optional[str] = None
+    column: Optional[str] = None
+
+
+@dataclass
+class ParsedQuery:
+    base_op: Optional[str]
+    measures: List[Measure] = field(default_factory=list)
+    group_keys: List[str] = field(default_factory=list)
+    select_columns: List[str] = field(default_factory=list)
+    predicates: List[Predicate] = field(default_factory=list)
+    having: List[Predicate] = field(default_factory=list)
+    order_by: List[str] = field(default_factory=list)
+    order_direction: str = ''
+    limit: Optional[int] = None
+    offset: Optional[int] = None
+    joins: List[JoinStep] = field(default_factory=list)
+    collection: str = 'No collection Found'
+    error: Optional[str] = None
+
+    @property
+    def tables(self) -> Tuple[str, ...]:
+        return tuple(step.table for step in self.joins)
+
+
+class SQLStatement(str):
+    """
+    A generated SQL query. As a string it is the query with its values inlined, which is what is shown
+    and what caches key on. template is the same query with bind parameters (:p0, :p1, ...) in place of
+    the where / having values, and params maps them to their values; this is what gets executed, so
+    queries that only differ in their values share one statement.
+    """
+
+    def __new__(cls, text, template=None, params=None):
+        statement = super().__new__(cls, text)
+        statement.template = text if template is None else template
+        statement.params = params or {}
+        return statement
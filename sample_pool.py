@@ -0,0 +1,137 @@
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import utils as ut
+
+
+# Pre-generated sample queries. A table's samples only depend on its column details, which only change
+# on /load_datasets, so they are generated once per version of the table (its entry in
+# Snapshot.table_fingerprints), in the background after the load, de-duplicated and optionally checked
+# against the database. A "sample queries" request then picks from these pools instead of generating
+# anything. Reloading one table only rebuilds that table's pool; the others keep their fingerprints.
+#
+# Join samples (SQL) and find() samples (MongoDB) are still generated per request, lazily, by
+# utils.output_sample_queries / output_sample_queries_mongo, as is everything while a pool is being built.
+
+
+def build_pool(database_type, path, details):
+    """Every distinct sample query of each type for one table, as {sample type: tuple of queries}."""
+    if not details['attributes'] or not details['measures']:
+        return {}  # samples are only generated for tables with atleast 1 attribute and 1 measure
+    table_name = path.replace('.csv', '')
+    pool = {}
+    for sample_type in (ut.SAMPLE_QUERY_TYPES if database_type == "SQL" else ut.MONGO_SAMPLE_QUERY_TYPES):
+        if database_type == "SQL":
+            samples = ut.iter_sample_queries(sample_type, details['column_names'], details['attributes'], details['measures'], details['unique_elements'], table_name)
+        else:
+            samples = map(ut.render_sample_mongo_query, ut.iter_sample_mongo_queries(sample_type, details['attributes'], details['measures'], details['unique_elements'], table_name))
+        pool[sample_type] = tuple(dict.fromkeys(samples))
+    return pool
+
+
+def pick_samples(pools, count):
+    """
+    Up to count distinct queries from pools (non-empty sequences of queries), each from a pool chosen at
+    random. The cost depends on count only, not on the size or number of the pools.
+    """
+    samples = {}
+    if pools:
+        for _ in range(count * 10):  # bounded, for pools with fewer than count distinct queries in total
+            pool = random.choice(pools)
+            samples[random.choice(pool)] = None
+            if len(samples) >= count:
+                break
+    return list(samples)
+
+
+class SamplePools:
+    """
+    Sample query pools by (database type, table fingerprint), built on a background thread and kept for
+    the max_tables most recently used tables.
+    """
+
+    def __init__(self, max_tables=256, workers=1):
+        self.max_tables = max_tables
+        self._pools = OrderedDict()
+        self._building = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sample-pool')
+        self.hits = 0
+        self.misses = 0
+        self.built = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def refresh(self, snapshot, database_type, validate=None):
+        """
+        Queues a build for each table in snapshot that has no pool for its current version. validate, if
+        given, takes a list of queries and returns the ones the database accepts; the others are dropped.
+        :return: the futures of the builds queued (tables already built or being built are skipped).
+        """
+        futures = []
+        with self._lock:
+            for path, details in snapshot.column_details.items():
+                key = (database_type, snapshot.table_fingerprints.get(path))
+                if key in self._pools or key in self._building:
+                    continue
+                self._building.add(key)
+                futures.append(self._executor.submit(self._build, key, database_type, path, details, validate))
+        return futures
+
+    def _build(self, key, database_type, path, details, validate):
+        try:
+            pool = build_pool(database_type, path, details)
+            rejected = 0
+            if validate is not None:
+                # One call for the whole table, so the validator can check everything over one connection
+                samples = [sample for samples in pool.values() for sample in samples]
+                accepted = set(validate(samples)) if samples else set()
+                rejected = len(set(samples) - accepted)
+                pool = {sample_type: tuple(sample for sample in samples if sample in accepted) for sample_type, samples in pool.items()}
+            with self._lock:
+                self.rejected += rejected
+                self._pools[key] = pool
+                self._pools.move_to_end(key)
+                while len(self._pools) > self.max_tables:
+                    self._pools.popitem(last=False)
+                self.built += 1
+        except Exception as e:
+            print(f"Error building the sample queries of {path}: {e}")
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                self._building.discard(key)
+
+    def draw(self, snapshot, database_type, sample_types, count):
+        """
+        Up to count distinct sample queries of the given types from the tables in snapshot.
+        :return: the queries, or None if a table's pool isn't built yet (call refresh()).
+        """
+        pools = []
+        with self._lock:
+            for path in snapshot.column_details:
+                key = (database_type, snapshot.table_fingerprints.get(path))
+                pool = self._pools.get(key)
+                if pool is None:
+                    self.misses += 1
+                    return None
+                self._pools.move_to_end(key)
+                pools.extend(pool[sample_type] for sample_type in sample_types if pool.get(sample_type))
+            self.hits += 1
+        return pick_samples(pools, count)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tables": len(self._pools),
+                "samples": sum(len(samples) for pool in self._pools.values() for samples in pool.values()),
+                "building": len(self._building),
+                "built": self.built,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,233 @@
+import base64
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+
+# Per-column summaries kept instead of the full list of unique values. Memory per
+# column is bounded: 2**precision bytes of HyperLogLog registers plus max_values
+# heavy-hitter counters, whatever the number of rows or distinct values.
+
+# Text values recorded as dates: ISO 8601 dates, optionally with a time
+ISO_DATE_PATTERN = r'\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?'
+
+
+def _leading_zeros64(values):
+    """Number of leading zero bits of each uint64 in values."""
+    values = values.copy()
+    zeros = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_clear = values < np.uint64(1 << (64 - shift))
+        zeros[top_clear] += shift
+        values[top_clear] <<= np.uint64(shift)
+    zeros[values == 0] += 1
+    return zeros
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count estimate with 2**precision registers (about 1.04 / sqrt(2**precision) error)."""
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Adds 64-bit hashes (a uint64 numpy array) of the values seen."""
+        if len(hashes) == 0:
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes << np.uint64(self.precision)
+        rank = np.minimum(_leading_zeros64(rest), 64 - self.precision) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_dict(self):
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data):
+        hll = cls(data["precision"])
+        hll.registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return hll
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty:
+            # Small-range correction (linear counting)
+            return int(round(m * np.log(m / empty)))
+        return int(round(raw))
+
+
+def value_type(values, uniques):
+    """
+    Type of a chunk's non-null values as read from the CSV file: 'boolean', 'integer', 'float', 'date' (text
+    that is all valid ISO 8601 dates, or datetimes) or 'string'. uniques are the distinct values, checked for dates.
+    """
+    if pd.api.types.is_bool_dtype(values):
+        return 'boolean'
+    if pd.api.types.is_integer_dtype(values):
+        return 'integer'
+    if pd.api.types.is_float_dtype(values):
+        return 'float'
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'date'
+    if pd.api.types.is_string_dtype(values) and pd.Series(uniques, dtype=object).str.fullmatch(ISO_DATE_PATTERN).all():
+        try:
+            pd.to_datetime(pd.Series(uniques, dtype=object), format='ISO8601')
+        except ValueError:  # e.g. 2024-02-30: stored as text, so typed as text
+            return 'string'
+        return 'date'
+    return 'string'
+
+
+def merged_value_type(previous, current):
+    """The type of a column whose earlier chunks had type previous and whose next chunk has type current."""
+    if previous is None or previous == current:
+        return current
+    if {previous, current} == {'integer', 'float'}:
+        return 'float'
+    return 'string'
+
+
+class ColumnSketch(Sequence):
+    """
+    Bounded summary of one column: HyperLogLog distinct count, the max_values most frequent values
+    (space-saving counters), null count, and min/max when the values are ordered.
+
+    It behaves as the list of those frequent values (most frequent first), so code that used the
+    full unique-values list (random.sample, slicing) keeps working. Columns with at most max_values
+    distinct values keep all of them, and their distinct count is exact.
+
+    value_type is the type of the column's values (see value_type()), None until a value was seen.
+    """
+
+    def __init__(self, max_values=100, precision=12):
+        self.max_values = max_values
+        self.hll = HyperLogLog(precision)
+        self.counts = {}
+        self.overflowed = False
+        self.rows = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.ordered = True
+        self.value_type = None
+        self._values = None
+
+    def update(self, series):
+        """Adds a chunk of the column (a pandas Series)."""
+        self._values = None
+        # Sketches from catalogs older than value_type stay untyped: the rows they summarize weren't typed
+        typed = self.value_type is not None or self.rows == self.nulls
+        self.rows += len(series)
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        if non_null.empty:
+            return
+
+        # Factorize once: the distinct values feed the HyperLogLog and min/max, the codes give the counts
+        codes, uniques = pd.factorize(non_null)
+        if typed and self.value_type != 'string':  # once text, always text
+            self.value_type = merged_value_type(self.value_type, value_type(non_null, uniques))
+        self.hll.add_hashes(pd.util.hash_array(np.asarray(uniques), categorize=False))
+        self._update_counts(uniques, np.bincount(codes))
+        self._update_range(uniques)
+
+    def _update_counts(self, uniques, chunk_counts):
+        # Merge the chunk's exact counts into the space-saving counters. Only the chunk's
+        # max_values most frequent values are merged; the rest only reach the HyperLogLog.
+        counts = self.counts
+        if len(chunk_counts) > self.max_values:
+            self.overflowed = True
+            top = np.argpartition(-chunk_counts, self.max_values)[:self.max_values]
+            uniques, chunk_counts = uniques[top], chunk_counts[top]
+        for value, count in zip(uniques.tolist(), chunk_counts.tolist()):
+            if value in counts:
+                counts[value] += count
+            elif len(counts) < self.max_values:
+                counts[value] = count
+            else:
+                # Space-saving: the new value replaces the least frequent one and inherits its count as error bound
+                self.overflowed = True
+                smallest = min(counts, key=counts.get)
+                counts[value] = counts.pop(smallest) + count
+
+    def _update_range(self, uniques):
+        if not self.ordered:
+            return
+        try:
+            low, high = uniques.min(), uniques.max()
+            if self.min is not None:
+                low, high = min(self.min, low), max(self.max, high)
+        except TypeError:
+            # Mixed types (e.g. numbers and text) have no order
+            self.ordered = False
+            self.min = self.max = None
+            return
+        self.min, self.max = getattr(low, 'item', lambda: low)(), getattr(high, 'item', lambda: high)()
+
+    @property
+    def distinct(self):
+        """Number of distinct non-null values: exact while every value fits in the counters, estimated after."""
+        if not self.overflowed:
+            return len(self.counts)
+        return max(self.hll.estimate(), len(self.counts))
+
+    def values(self):
+        if self._values is None:
+            self._values = sorted(self.counts, key=self.counts.get, reverse=True)
+        return self._values
+
+    def __getitem__(self, index):
+        return self.values()[index]
+
+    def __len__(self):
+        return len(self.counts)
+
+    def summary(self):
+        return {
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "distinct": self.distinct,
+            "distinct_exact": not self.overflowed,
+            "min": self.min if self.ordered else None,
+            "max": self.max if self.ordered else None,
+            "type": self.value_type,
+            "top_values": self.values()[:10],
+        }
+
+    def to_dict(self):
+        """JSON-friendly form, e.g. for the catalog."""
+        return {
+            "max_values": self.max_values,
+            "hll": self.hll.to_dict(),
+            "counts": [[value, count] for value, count in self.counts.items()],
+            "overflowed": self.overflowed,
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "min": self.min,
+            "max": self.max,
+            "ordered": self.ordered,
+            "value_type": self.value_type,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["max_values"])
+        sketch.hll = HyperLogLog.from_dict(data["hll"])
+        sketch.counts = {value: count for value, count in data["counts"]}
+        sketch.overflowed = data["overflowed"]
+        sketch.rows = data["rows"]
+        sketch.nulls = data["nulls"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.ordered = data["ordered"]
+        sketch.value_type = data.get("value_type")  # not recorded in older catalogs
+        return sketch
@@ -0,0 +1,109 @@
+import datetime
+import json
+
+
+# Streamed /process_query responses. Instead of one JSON document the response is a sequence of
+# JSON records: first {"translated_query": ...}, then one record per result row, and last a
+# summary {"rows": n, "truncated": bool} (or {"error": ...} if the query fails part way).
+#
+#   ndjson    one record per line (application/x-ndjson)
+#   json-seq  RFC 7464 JSON text sequence: each record starts with an RS character (application/json-seq)
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "json-seq": "application/json-seq"}
+
+
+def _json_default(value):
+    # Dates (e.g. MongoDB date fields) as ISO 8601, as in the JSON responses
+    return value.isoformat() if isinstance(value, datetime.date) else str(value)
+
+
+# json.dumps with default= builds a new encoder per call, which adds up at one call per row
+_encoder = json.JSONEncoder(default=_json_default)
+
+
+def stream_format(body, accept=''):
+    """
+    The streaming format a request asks for: its "stream" field ("ndjson", "json-seq" or true for
+    ndjson) or a streaming media type in its Accept header. None for a normal JSON response.
+    """
+    fmt = (body or {}).get('stream')
+    if fmt is True:
+        return 'ndjson'
+    if fmt:
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f"Unknown stream format: {fmt}. Use one of {', '.join(STREAM_FORMATS)}")
+        return fmt
+    for name, mimetype in STREAM_FORMATS.items():
+        if mimetype in (accept or ''):
+            return name
+    return None
+
+
+def row_limit(body, max_rows):
+    """
+    Rows to stream: the request's "max_rows" if given, never more than the configured max_rows.
+    Raises ValueError if it is given but isn't a positive whole number.
+    """
+    requested = (body or {}).get('max_rows')
+    if requested is None:
+        return max_rows
+    if isinstance(requested, str) and requested.strip().isdecimal():
+        rows = int(requested)
+    else:
+        rows = requested if isinstance(requested, int) and not isinstance(requested, bool) else 0
+    if rows < 1:
+        raise ValueError(f'"max_rows" must be a positive whole number, got {requested!r}')
+    return min(rows, max_rows)
+
+
+def encode_record(record, fmt):
+    text = _encoder.encode(record)
+    if fmt == 'json-seq':
+        return '\x1e' + text + '\n'
+    return text + '\n'
+
+
+def encode_rows(batches, fmt, max_rows):
+    """
+    Encodes rows arriving in batches (lists of dicts) as one string per batch, followed by the summary
+    record. Stops reading batches once max_rows rows have been sent.
+    """
+    batches = iter(batches)
+    rows = 0
+    truncated = False
+    for batch in batches:
+        if rows + len(batch) > max_rows:
+            batch = batch[:max_rows - rows]
+            truncated = True
+        if batch:
+            yield ''.join(encode_record(row, fmt) for row in batch)
+            rows += len(batch)
+        if truncated:
+            break
+        if rows == max_rows:
+            # Only report truncation if there really is another row
+            truncated = any(len(batch) for batch in batches)
+            break
+    yield encode_record({"rows": rows, "truncated": truncated}, fmt)
+
+
+async def encode_rows_async(batches, fmt, max_rows):
+    """encode_rows for an async iterator of batches (async_app.py)."""
+    rows = 0
+    truncated = False
+    async for batch in batches:
+        if rows + len(batch) > max_rows:
+            batch = batch[:max_rows - rows]
+            truncated = True
+        if batch:
+            yield ''.join(encode_record(row, fmt) for row in batch)
+            rows += len(batch)
+        if truncated:
+            break
+        if rows == max_rows:
+            async for batch in batches:
+                if batch:
+                    truncated = True
+                    break
+            break
+    yield encode_record({"rows": rows, "truncated": truncated}, fmt)
@@ -0,0 +1,181 @@
+"""
+Tests for the bounded column summaries (sketches.py), the column matcher (column_index.py)
+and the result cache (cache.py).
+
+Run from the project root:
+
+    python -m pytest tests
+"""
+import json
+import os
+import random
+import string
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import column_index  # noqa: E402
+from cache import ResultCache  # noqa: E402
+from column_index import ColumnIndex, LINEAR_SCAN_MAX_COLUMNS  # noqa: E402
+from sketches import ColumnSketch, HyperLogLog  # noqa: E402
+
+
+def hll_of(values, precision=12):
+    hll = HyperLogLog(precision)
+    hll.add_hashes(pd.util.hash_array(np.asarray(values), categorize=False))
+    return hll
+
+
+@pytest.mark.parametrize("distinct", [100, 5000, 200000])
+def test_hll_estimate_within_error_bound(distinct):
+    # 2**12 registers: about 1.6% standard error, so 5% is a bound of more than three standard errors
+    estimate = hll_of(np.arange(distinct)).estimate()
+    assert abs(estimate - distinct) <= 0.05 * distinct
+
+
+def test_hll_repeated_values_do_not_count():
+    values = np.tile(np.arange(1000), 50)
+    assert abs(hll_of(values).estimate() - 1000) <= 50
+
+
+def test_hll_merge_equals_hll_of_union():
+    left = hll_of(np.arange(0, 60000))
+    right = hll_of(np.arange(40000, 100000))
+    left.merge(right)
+    assert np.array_equal(left.registers, hll_of(np.arange(100000)).registers)
+    assert abs(left.estimate() - 100000) <= 5000
+
+
+def test_hll_round_trip():
+    hll = hll_of(np.arange(3000))
+    restored = HyperLogLog.from_dict(json.loads(json.dumps(hll.to_dict())))
+    assert restored.precision == hll.precision
+    assert np.array_equal(restored.registers, hll.registers)
+
+
+def test_sketch_counts_exact_below_max_values():
+    sketch = ColumnSketch(max_values=10)
+    sketch.update(pd.Series(['a', 'b', 'a', None, 'c', 'a']))
+    sketch.update(pd.Series(['b', 'a']))
+    assert sketch.counts == {'a': 4, 'b': 2, 'c': 1}
+    assert list(sketch) == ['a', 'b', 'c']
+    assert sketch.distinct == 3 and not sketch.overflowed
+    assert (sketch.rows, sketch.nulls) == (8, 1)
+
+
+def test_sketch_space_saving_keeps_heavy_hitters():
+    rng = random.Random(7)
+    heavy = {f'h{i}': 500 - 50 * i for i in range(5)}
+    values = [value for value, count in heavy.items() for _ in range(count)]
+    values += [f'rare{rng.randrange(5000)}' for _ in range(3000)]
+    rng.shuffle(values)
+    sketch = ColumnSketch(max_values=20)
+    for start in range(0, len(values), 700):
+        sketch.update(pd.Series(values[start:start + 700]))
+
+    assert sketch.overflowed and len(sketch) == 20
+    assert set(sketch[:5]) == set(heavy)
+    for value, count in heavy.items():
+        # Space-saving counts never undercount a value it kept
+        assert sketch.counts[value] >= count
+    assert abs(sketch.distinct - len(set(values))) <= 0.05 * len(set(values))
+
+
+@pytest.mark.parametrize("chunks, value_type, low, high", [
+    ([[3, 1, 2], [10, 4]], 'integer', 1, 10),
+    ([[1.5, 2.0], [3, -1]], 'float', -1.0, 3.0),
+    ([['2024-01-02', '2023-05-06'], ['2025-12-31']], 'date', '2023-05-06', '2025-12-31'),
+    ([['A01', 'B02'], ['007']], 'string', '007', 'B02'),
+])
+def test_sketch_range_and_type_round_trip(chunks, value_type, low, high):
+    sketch = ColumnSketch(max_values=3)
+    for chunk in chunks:
+        sketch.update(pd.Series(chunk))
+    restored = ColumnSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    for loaded in (sketch, restored):
+        assert loaded.value_type == value_type
+        assert (loaded.min, loaded.max) == (low, high)
+    assert restored.counts == sketch.counts
+    assert restored.summary() == sketch.summary()
+
+
+def random_columns(count, rng):
+    columns = set()
+    while len(columns) < count:
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 6))) for _ in range(rng.randint(1, 3))]
+        columns.add('_'.join(words))
+    return sorted(columns)
+
+
+def linear_scan(columns, text, spaced=True):
+    if spaced:
+        return [col for col in columns if col in text or col.replace('_', ' ') in text]
+    return [col for col in columns if col in text]
+
+
+@pytest.mark.parametrize("width", [3, LINEAR_SCAN_MAX_COLUMNS, LINEAR_SCAN_MAX_COLUMNS + 1, 300])
+@pytest.mark.parametrize("force_automaton", [False, True])
+def test_column_index_matches_linear_scan(width, force_automaton, monkeypatch):
+    if force_automaton:
+        # Also check the automaton on schemas small enough for the linear scan
+        monkeypatch.setattr(column_index, 'LINEAR_SCAN_MAX_COLUMNS', 0)
+    rng = random.Random(width)
+    columns = random_columns(width, rng)
+    index = ColumnIndex(columns)
+    for _ in range(200):
+        picked = rng.sample(columns, min(3, width))
+        parts = [col.replace('_', ' ') if rng.random() < 0.5 else col for col in picked]
+        text = f"total {parts[0]} by {' and '.join(parts[1:])} where {rng.choice(columns)[:4]} > 10"
+        for spaced in (True, False):
+            assert index.mentioned(text, spaced=spaced) == linear_scan(columns, text, spaced)
+        subset = rng.sample(columns, min(5, width)) + ['not_indexed']
+        assert index.mentioned(text + ' not indexed', subset) == linear_scan(subset, text + ' not indexed')
+
+
+def test_result_cache_evicts_least_recently_used_by_bytes():
+    value = [{"row": "x" * 100}]
+    size = ResultCache._result_size(value)
+    cache = ResultCache(max_bytes=int(size * 2.5))
+    cache.put('a', value, ['t'])
+    cache.put('b', value, ['t'])
+    assert cache.get('a') == value  # 'b' is now the least recently used
+    cache.put('c', value, ['t'])
+    assert cache.get('b') is None
+    assert cache.get('a') == value and cache.get('c') == value
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 2 * size <= stats["max_bytes"]
+
+
+def test_result_cache_rejects_results_larger_than_max_bytes():
+    cache = ResultCache(max_bytes=50)
+    cache.put('big', ["y" * 100], ['t'])
+    assert cache.get('big') is None
+    assert cache.stats()["rejected"] == 1 and cache.stats()["bytes"] == 0
+
+
+def test_result_cache_invalidates_only_the_given_tables():
+    cache = ResultCache()
+    cache.put('sales only', [1], ['sales'])
+    cache.put('join', [2], ['sales', 'products'])
+    cache.put('products only', [3], ['products'])
+    cache.invalidate_tables(['sales'])
+    assert cache.get('sales only') is None and cache.get('join') is None
+    assert cache.get('products only') == [3]
+    assert cache.stats()["tables"] == ['products']
+
+
+def test_result_cache_drops_results_of_queries_that_overlapped_an_invalidation():
+    cache = ResultCache()
+    started = cache.generation()
+    cache.invalidate_tables(['sales'])
+    cache.put('stale', [1], ['sales'], started)
+    cache.put('other table', [2], ['products'], started)
+    assert cache.get('stale') is None and cache.get('other table') == [2]
+    started = cache.generation()
+    cache.clear()
+    cache.put('after clear', [3], ['products'], started)
+    assert cache.get('after clear') is None
+    assert cache.stats()["stale"] == 2
@@ -1,12 +1,34 @@
 import pandas as pd
+import io
 import random
-from sqlalchemy import create_engine
-import copy
+import itertools
 import re
-from pymongo import MongoClient
+import hashlib
+import json
+import time
+from datetime import datetime
+from functools import lru_cache
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+import connections
+import bulk_insert
+from query_ir import ParsedQuery, Measure, Predicate, JoinStep, SQLStatement
+from column_index import ColumnIndex
+from sketches import ColumnSketch, value_type, merged_value_type
 
 
-def load_csv_to_sql(csv_path, db_url, table_name, if_exists='replace'):
+# Most frequent values kept per attribute column for sample queries (see sketches.ColumnSketch)
+SAMPLE_VALUES_PER_COLUMN = 100
+
+
+def column_sketch(series):
+    """Summary of one attribute column; stands in for the list of its unique values."""
+    sketch=ColumnSketch(SAMPLE_VALUES_PER_COLUMN)
+    sketch.update(series)
+    return sketch
+
+
+def load_csv_to_sql(csv_path, db_url, table_name, if_exists='replace', pool_options=None, chunksize=None, batch_size=None, insert_method='auto'):
     """
     Loads a CSV file into an SQL database.
 
@@ -17,10 +39,23 @@ def load_csv_to_sql(csv_path, db_url, table_name, if_exists='replace'):
     - table_name (str): Name of the table where data should be stored.
     - if_exists (str): What to do if the table already exists. Options: 'fail', 'replace', 'append'.
                        Default is 'replace'.
+    - pool_options (dict): Optional pool settings passed to connections.get_engine.
+    - chunksize (int): If set, stream the file in chunks of this many rows instead of reading it whole.
+                       Column classification and unique values are built up chunk by chunk and each
+                       chunk is appended to the table, so memory stays flat whatever the file size.
+    - batch_size (int): Rows per INSERT batch when writing to the table. Default writes everything at once.
+    - insert_method (str): How rows are inserted, one of bulk_insert.INSERT_METHODS. The default 'auto'
+                           picks the fastest one the database supports. Throughput is recorded in
+                           bulk_insert.get_load_stats().
 
     Returns:
-    - None
+    - column names, attributes, measures, a ColumnSketch (bounded unique values) per attribute and the DataFrame
+      (only the first rows of the file when streaming), or None on error.
     """
+    if chunksize:
+        return load_csv_to_sql_chunked(csv_path, db_url, table_name, if_exists, pool_options, chunksize, batch_size, insert_method)
+
+    started=time.perf_counter()
     # Load CSV into a DataFrame
     try:
         df = pd.read_csv(csv_path)
@@ -36,12 +71,12 @@ def load_csv_to_sql(csv_path, db_url, table_name, if_exists='replace'):
         for col in df.columns:
             if pd.api.types.is_datetime64_any_dtype(df[col]):
                 attributes.append(col)  # Date if datetime type
-                unique_elements[col]=df[col].unique().tolist()
+                unique_elements[col]=column_sketch(df[col])
             elif pd.api.types.is_numeric_dtype(df[col]) and 'id' != col[-2:]:
                 measures.append(col)  # Continuous if numeric with many unique values
             else:
                 attributes.append(col)
-                unique_elements[col]=df[col].unique().tolist()
+                unique_elements[col]=column_sketch(df[col])
         
         
     
@@ -53,17 +88,246 @@ def load_csv_to_sql(csv_path, db_url, table_name, if_exists='replace'):
     
     # Connect to the database
     try:
-        engine = create_engine(db_url)
-        with engine.connect() as conn:
+        with connections.connect(db_url, **(pool_options or {})) as conn:
             # Store the DataFrame into the SQL database
-            df.to_sql(table_name, conn, if_exists=if_exists, index=False)
-            print(f"Data successfully loaded into '{table_name}' table in the database.")
+            method_used, insert_seconds = bulk_insert.write_dataframe(df, table_name, conn, if_exists, insert_method, batch_size)
+            stats = bulk_insert.record_load(table_name, len(df), time.perf_counter()-started, insert_seconds, method_used)
+            print(f"Data successfully loaded into '{table_name}' table in the database ({stats['rows_per_sec']} rows/sec using {method_used}).")
             return list(column_names),list(attributes),list(measures),unique_elements,df
     except Exception as e:
         print(f"Error connecting to the database or writing to the table: {e}")
 
 
-def create_sample_query(query_type,column_names,attributes,measures,unique_elements,user_dataset):
+def scan_csv_types(csv_path, chunksize=50000):
+    """
+    First pass of the chunked loaders: the type of each column over the whole file (see sketches.value_type),
+    by CSV header. Columns with no values at all are left out. Parsing the file is cheap next to writing it
+    to the database, and every chunk can then be read with the types of the whole file (see csv_dtypes).
+    """
+    types={}
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        for col in chunk.columns:
+            if types.get(col)=='string':
+                continue
+            non_null=chunk[col].dropna()
+            if len(non_null):
+                types[col]=merged_value_type(types.get(col), value_type(non_null, pd.unique(non_null)))
+    return types
+
+
+def csv_dtypes(types):
+    """
+    read_csv dtypes for the types from scan_csv_types: text columns are read as text even in the chunks where
+    they look numeric or are empty, and float columns as floats in the chunks of whole numbers. The table
+    created from the first chunk then has the column types of the whole file.
+    """
+    return {col: (str if kind in ('string','date') else 'float64') for col, kind in types.items() if kind in ('string','date','float')}
+
+
+def appended_csv_dtypes(details):
+    """
+    read_csv dtypes for rows appended to a loaded file, from the column types recorded at load: text and date
+    attributes stay text (a code '007' isn't read as 7) and float measures stay floats, as in csv_dtypes.
+    """
+    types={col: sketch.value_type for col, sketch in details['unique_elements'].items()}
+    types.update((col, 'float') for col in details.get('float_measures', ()))
+    return csv_dtypes(types)
+
+
+def new_chunk_profile(column_names):
+    """Column metadata built up chunk by chunk by profile_chunk, without holding the whole dataset."""
+    return {
+        'column_names': list(column_names),
+        'non_numeric': set(),
+        # ColumnSketch of each attribute column
+        'unique_elements': {col: ColumnSketch(SAMPLE_VALUES_PER_COLUMN) for col in column_names if 'id' == col[-2:]},
+    }
+
+
+def profile_chunk(chunk, profile, rows_loaded=0):
+    """
+    Adds one chunk to the profile. A column becomes non-numeric as soon as one chunk doesn't parse
+    as numbers; its sketch starts from that chunk. Chunks read with csv_dtypes have the column types of
+    the whole file, so a text column is non-numeric from the first chunk on.
+    """
+    non_numeric=profile['non_numeric']
+    unique_elements=profile['unique_elements']
+    for col in profile['column_names']:
+        series=chunk[col]
+        if col not in non_numeric and not (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_datetime64_any_dtype(series)):
+            non_numeric.add(col)
+            if col not in unique_elements:
+                unique_elements[col]=ColumnSketch(SAMPLE_VALUES_PER_COLUMN)
+                if rows_loaded:
+                    print(f"Column '{col}' has non-numeric values after row {rows_loaded}, treating it as an attribute.")
+        sketch=unique_elements.get(col)
+        if sketch is not None:
+            sketch.update(series)
+
+
+def load_csv_to_sql_chunked(csv_path, db_url, table_name, if_exists='replace', pool_options=None, chunksize=50000, batch_size=None, insert_method='auto', sample_rows=5):
+    """
+    Streams a CSV file into an SQL table chunk by chunk. Same result as load_csv_to_sql, but only
+    one chunk is in memory at a time.
+
+    The file is read twice: a first pass finds the type of each column over the whole file (scan_csv_types),
+    and the chunks are then read with those types (csv_dtypes). A column with text anywhere in the file is
+    text in every chunk, so the table is created with a text column for it and is an attribute, as with
+    load_csv_to_sql. Numeric columns are measures unless their name ends in 'id'.
+
+    Returns:
+    - column names, attributes, measures, a ColumnSketch (bounded unique values) per attribute and the first sample_rows rows.
+    """
+    column_names=None
+    profile=None
+    sample_df=pd.DataFrame()
+    rows_loaded=0
+    insert_seconds=0.0
+    method_used=None
+    started=time.perf_counter()
+    try:
+        dtypes=csv_dtypes(scan_csv_types(csv_path, chunksize))
+        with connections.connect(db_url, **(pool_options or {})) as conn:
+            for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtypes):
+                chunk.columns = chunk.columns.str.replace(' ', '_')
+                chunk.columns = chunk.columns.str.lower()
+                if column_names is None:
+                    column_names=list(chunk.columns)
+                    profile=new_chunk_profile(column_names)
+                if len(sample_df)<sample_rows:
+                    sample_df=pd.concat([sample_df,chunk.head(sample_rows-len(sample_df))]) if len(sample_df) else chunk.head(sample_rows)
+                profile_chunk(chunk, profile, rows_loaded)
+
+                method_used, seconds = bulk_insert.write_dataframe(chunk, table_name, conn, if_exists if rows_loaded==0 else 'append', insert_method, batch_size)
+                insert_seconds+=seconds
+                rows_loaded+=len(chunk)
+    except Exception as e:
+        print(f"Error loading CSV file into the table: {e}")
+        return
+
+    if column_names is None:
+        print(f"CSV file {csv_path} has no rows to load.")
+        return [],[],[],{},sample_df
+
+    unique_elements=profile['unique_elements']
+    attributes=[col for col in column_names if col in unique_elements]
+    measures=[col for col in column_names if col not in unique_elements]
+    stats=bulk_insert.record_load(table_name, rows_loaded, time.perf_counter()-started, insert_seconds, method_used)
+    print(f"Data successfully loaded into '{table_name}' table in the database ({rows_loaded} rows in chunks of {chunksize}, {stats['rows_per_sec']} rows/sec using {method_used}).")
+    return column_names,attributes,measures,{col: unique_elements[col] for col in attributes},sample_df
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of a binary file from its current position up to byte end."""
+
+    def __init__(self, f, end):
+        self._f=f
+        self._remaining=end-f.tell()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining<=0:
+            return 0
+        read=self._f.readinto(memoryview(buffer)[:min(len(buffer),self._remaining)])
+        self._remaining-=read
+        return read
+
+
+def iter_appended_chunks(csv_path, details, offset=0, end=None, key_column=None, chunksize=50000):
+    """
+    Yields the rows added to a CSV file since it was loaded, in chunks with the loaded column names.
+
+    With an offset, the rows are read from that byte offset up to byte end, so only the appended
+    part of the file is parsed. With a key_column instead, the whole file is read and only the rows
+    whose key is above the largest key loaded (kept in the column's sketch) are yielded. Both read the
+    columns with the types they were loaded with (appended_csv_dtypes).
+    """
+    column_names=details['column_names']
+    dtypes=appended_csv_dtypes(details)
+    if offset:
+        with open(csv_path, 'rb') as f:
+            f.seek(offset)
+            text=io.TextIOWrapper(io.BufferedReader(_ByteRange(f, end)), encoding='utf-8', newline='')
+            for chunk in pd.read_csv(text, header=None, names=column_names, dtype=dtypes, chunksize=chunksize):
+                yield chunk
+        return
+
+    sketch=details['unique_elements'].get(key_column)
+    if sketch is None or sketch.max is None:
+        raise ValueError(f"No largest loaded value is known for key column '{key_column}'")
+    header=pd.read_csv(csv_path, nrows=0).columns
+    if list(header.str.replace(' ', '_').str.lower())!=column_names:
+        raise ValueError(f"Columns of {csv_path} changed since it was loaded")
+    for chunk in pd.read_csv(csv_path, header=0, names=column_names, dtype=dtypes, chunksize=chunksize):
+        chunk=chunk[chunk[key_column]>sketch.max]
+        if len(chunk):
+            yield chunk
+
+
+def merge_appended_chunk(chunk, details):
+    """
+    Adds appended rows to the column sketches in details. Raises ValueError if a measure column has
+    non-numeric values in them, or a typed attribute column (dates, numbers) values that would make it
+    text: either would change how the column is classified and stored, and the rows already stored keep
+    the old type (e.g. BSON dates in MongoDB, see with_stored_dates). Callers then reload the whole file.
+    """
+    unique_elements=details['unique_elements']
+    for col in details['measures']:
+        series=chunk[col]
+        if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            raise ValueError(f"Measure column '{col}' has non-numeric values in the appended rows")
+    for col in details['attributes']:
+        loaded_type=unique_elements[col].value_type
+        non_null=chunk[col].dropna()
+        if loaded_type not in (None, 'string') and len(non_null) and merged_value_type(loaded_type, value_type(non_null, pd.unique(non_null)))=='string':
+            raise ValueError(f"Attribute column '{col}' of type {loaded_type} has other values in the appended rows")
+    for col in details['attributes']:
+        unique_elements[col].update(chunk[col])
+
+
+def append_csv_to_sql(csv_path, db_url, table_name, details, offset=0, end=None, key_column=None, pool_options=None, chunksize=50000, batch_size=None, insert_method='auto'):
+    """
+    Inserts only the rows added to a CSV file since it was loaded into table_name (see iter_appended_chunks),
+    and merges them into the stored column sketches.
+
+    Parameters:
+    - details (dict): Column details of the loaded file; its sketches are updated in place.
+    - offset (int), end (int): Byte range of the appended rows.
+    - key_column (str): Used instead of a byte range when the file was rewritten with new rows added.
+    - Other parameters as for load_csv_to_sql.
+
+    Returns:
+    - int: Number of rows appended, or None on error. Rows written before an error stay in the table,
+      so callers reload the whole file then.
+    """
+    rows_loaded=0
+    insert_seconds=0.0
+    method_used=None
+    started=time.perf_counter()
+    try:
+        with connections.connect(db_url, **(pool_options or {})) as conn:
+            for chunk in iter_appended_chunks(csv_path, details, offset, end, key_column, chunksize):
+                merge_appended_chunk(chunk, details)
+                method_used, seconds = bulk_insert.write_dataframe(chunk, table_name, conn, 'append', insert_method, batch_size)
+                insert_seconds+=seconds
+                rows_loaded+=len(chunk)
+    except Exception as e:
+        print(f"Error appending new rows of {csv_path} to the table: {e}")
+        return
+
+    if method_used is not None:
+        bulk_insert.record_load(table_name, rows_loaded, time.perf_counter()-started, insert_seconds, method_used)
+    print(f"Appended {rows_loaded} new rows of {csv_path} to '{table_name}'.")
+    return rows_loaded
+
+
+def iter_sample_queries(query_type,column_names,attributes,measures,unique_elements,user_dataset):
+    """
+    Yields sample SQL queries of one type for one table, built one at a time as they are asked for.
+    Stops after 20 rounds of samples, like create_sample_query.
+    """
 
 
     # if query_type=='group by':
@@ -80,7 +344,6 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
 
     if query_type.lower()=='group by':
         agg_functions=['Sum','Avg','Min','Max']
-        group_by_samples=[]
         for i in range (0,20):
             no_of_select_columns=random.randint(1,int(len(attributes)/2)+1)
             select_columns=random.sample(attributes,no_of_select_columns)
@@ -88,10 +351,10 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
             selected_agg_function=random.sample(agg_functions,1)[0]
             selected_agg_column=random.sample(measures,1)[0]
             group_by_sample_1=f'Select {select_columns_text},{selected_agg_function}({selected_agg_column}) as {selected_agg_column}_{selected_agg_function} from {user_dataset} group by {select_columns_text}'
-            group_by_samples.append(group_by_sample_1)
+            yield group_by_sample_1
             group_by_sample_2=f'Select {select_columns_text} from {user_dataset} group by {select_columns_text}'
-            group_by_samples.append(group_by_sample_2)
-        return group_by_samples
+            yield group_by_sample_2
+        return
 
     # if query_type=='Sum':
     #     sum_samples=[]
@@ -103,17 +366,16 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
     #         sum_samples.append(sum_sample_query_2)
 
     if query_type.lower()=='sum':
-        sum_samples=[]
         for i in range (0,20):
             no_of_select_columns=random.randint(1,int(len(attributes)/2)+1)
             select_columns=random.sample(attributes,no_of_select_columns)
             select_columns_text=','.join(select_columns)
             selected_agg_column=random.sample(measures,1)[0]
             sum_sample_1=f'Select {select_columns_text},Sum({selected_agg_column}) as Sum_{selected_agg_column} from {user_dataset} group by {select_columns_text}'
-            sum_samples.append(sum_sample_1)
+            yield sum_sample_1
             sum_sample_2=f'Select Sum({selected_agg_column}) as Sum_{selected_agg_column} from {user_dataset}'
-            sum_samples.append(sum_sample_2)
-        return sum_samples
+            yield sum_sample_2
+        return
 
 
 
@@ -127,17 +389,16 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
     #         avg_samples.append(avg_sample_query_2)
 
     if query_type.lower()=='avg':
-        Avg_samples=[]
         for i in range (0,20):
             no_of_select_columns=random.randint(1,int(len(attributes)/2)+1)
             select_columns=random.sample(attributes,no_of_select_columns)
             select_columns_text=','.join(select_columns)
             selected_agg_column=random.sample(measures,1)[0]
             Avg_sample_1=f'Select {select_columns_text},Avg({selected_agg_column}) as Avg_{selected_agg_column} from {user_dataset} group by {select_columns_text}'
-            Avg_samples.append(Avg_sample_1)
+            yield Avg_sample_1
             Avg_sample_2=f'Select Avg({selected_agg_column}) as Avg_{selected_agg_column} from {user_dataset}'
-            Avg_samples.append(Avg_sample_2)
-        return Avg_samples
+            yield Avg_sample_2
+        return
 
 
     # if query_type=='Min':
@@ -150,17 +411,16 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
     #         min_samples.append(min_sample_query_2)
 
     if query_type.lower()=='min':
-        Min_samples=[]
         for i in range (0,20):
             no_of_select_columns=random.randint(1,int(len(attributes)/2)+1)
             select_columns=random.sample(attributes,no_of_select_columns)
             select_columns_text=','.join(select_columns)
             selected_agg_column=random.sample(measures,1)[0]
             Min_sample_1=f'Select {select_columns_text},Min({selected_agg_column}) as Min_{selected_agg_column} from {user_dataset} group by {select_columns_text}'
-            Min_samples.append(Min_sample_1)
+            yield Min_sample_1
             Min_sample_2=f'Select Min({selected_agg_column}) as Min_{selected_agg_column} from {user_dataset}'
-            Min_samples.append(Min_sample_2)
-        return Min_samples
+            yield Min_sample_2
+        return
 
 
     # if query_type=='Max':
@@ -173,17 +433,16 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
     #         max_samples.append(max_sample_query_2)
 
     if query_type.lower()=='max':
-        Max_samples=[]
         for i in range (0,20):
             no_of_select_columns=random.randint(1,int(len(attributes)/2)+1)
             select_columns=random.sample(attributes,no_of_select_columns)
             select_columns_text=','.join(select_columns)
             selected_agg_column=random.sample(measures,1)[0]
             Max_sample_1=f'Select {select_columns_text},Max({selected_agg_column}) as Max_{selected_agg_column} from {user_dataset} group by {select_columns_text}'
-            Max_samples.append(Max_sample_1)
+            yield Max_sample_1
             Max_sample_2=f'Select Max({selected_agg_column}) as Max_{selected_agg_column} from {user_dataset}'
-            Max_samples.append(Max_sample_2)
-        return Max_samples
+            yield Max_sample_2
+        return
 
     # if query_type=='Where':
     #     where_samples=[]
@@ -199,7 +458,6 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
     #             where_samples.append(where_sample_query_2)
 
     if query_type.lower()=='where':
-        where_samples=[]
         for i in range(0,20):
             where_attr=random.sample(attributes,1)[0]
             where_value=random.sample(unique_elements[where_attr],1)[0]
@@ -211,15 +469,14 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
             select_columns_text=','.join(select_columns)
             where_sample_2=f"Select {select_columns_text} from {user_dataset} where {where_attr}='{where_value}'"
             where_sample_3=f"Select {select_columns_text} from {user_dataset} where {where_attr}='{where_value}' and {where_attr_2}='{where_value_2}'"
-            where_samples.append(where_sample_1)
-            where_samples.append(where_sample_2)
-            where_samples.append(where_sample_3)
-        return where_samples
+            yield where_sample_1
+            yield where_sample_2
+            yield where_sample_3
+        return
             
 
 
     if query_type.lower()=='order by':
-        order_by_samples=[]
         for i in range(0,20):
             no_of_select_columns=random.randint(1,int(len(column_names)/2)+1)
             select_columns=random.sample(column_names,no_of_select_columns)
@@ -235,20 +492,19 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
             selected_agg_function=random.sample(agg_functions,1)[0]
             selected_agg_column=random.sample(measures,1)[0]
             order_by_sample_2=f'Select {select_cat_columns_text},{selected_agg_function}({selected_agg_column}) as {selected_agg_column}_{selected_agg_function} from {user_dataset} group by {select_cat_columns_text} order by {selected_agg_column}_{selected_agg_function} {aesc_desc_selection}'
-            order_by_samples.append(order_by_sample_1)
-            order_by_samples.append(order_by_sample_2)
-        return order_by_samples
+            yield order_by_sample_1
+            yield order_by_sample_2
+        return
 
 
     if query_type.lower()=='limit':
-        limit_samples=[]
         for i in range(0,20):
             no_of_select_columns=random.randint(1,int(len(column_names)/2)+1)
             select_columns=random.sample(column_names,no_of_select_columns)
             select_columns_text=','.join(select_columns)
             limit_number=random.randint(1,50)
             limit_sample_1=f'Select  {select_columns_text} from {user_dataset} limit {limit_number}'
-            limit_samples.append(limit_sample_1)
+            yield limit_sample_1
             agg_functions=['Sum','Avg','Min','Max']
             no_of_select_cat_columns=random.randint(1,int(len(attributes)/2)+1)
             select_cat_columns=random.sample(attributes,no_of_select_cat_columns)
@@ -258,14 +514,13 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
             aesc_desc_list=['aesc','desc']
             aesc_desc_selection=random.sample(aesc_desc_list,1)[0]
             limit_sample_2=f'Select {select_cat_columns_text},{selected_agg_function}({selected_agg_column}) as {selected_agg_column}_{selected_agg_function} from {user_dataset} group by {select_cat_columns_text} order by {selected_agg_column}_{selected_agg_function} {aesc_desc_selection} limit {limit_number}'
-            limit_samples.append(limit_sample_2)
+            yield limit_sample_2
             offset_number=random.randint(1,50)
             limit_sample_3=f'Select {select_cat_columns_text},{selected_agg_function}({selected_agg_column}) as {selected_agg_column}_{selected_agg_function} from {user_dataset} group by {select_cat_columns_text} order by {selected_agg_column}_{selected_agg_function} {aesc_desc_selection} limit {offset_number},{limit_number}'
-            limit_samples.append(limit_sample_3)
-        return limit_samples
+            yield limit_sample_3
+        return
 
     if query_type.lower()=='offset':
-        offset_samples=[]
         for i in range (0,20):
             no_of_select_columns=random.randint(1,int(len(column_names)/2)+1)
             select_columns=random.sample(column_names,no_of_select_columns)
@@ -274,8 +529,8 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
             offset_number=random.randint(1,50)
             offset_sample_1=f'Select {select_columns_text} from {user_dataset} offset {offset_number}'
             offset_sample_2=f'Select {select_columns_text} from {user_dataset} limit {limit_number} offset {offset_number}'
-            offset_samples.append(offset_sample_1)
-            offset_samples.append(offset_sample_2)   
+            yield offset_sample_1
+            yield offset_sample_2
             agg_functions=['Sum','Avg','Min','Max']
             no_of_select_cat_columns=random.randint(1,int(len(attributes)/2)+1)
             select_cat_columns=random.sample(attributes,no_of_select_cat_columns)
@@ -285,11 +540,10 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
             aesc_desc_list=['aesc','desc']
             aesc_desc_selection=random.sample(aesc_desc_list,1)[0]          
             offset_sample_3=f'Select {select_cat_columns_text},{selected_agg_function}({selected_agg_column}) as {selected_agg_column}_{selected_agg_function} from {user_dataset} group by {select_cat_columns_text} order by {selected_agg_column}_{selected_agg_function} {aesc_desc_selection} offset {offset_number} limit {limit_number}'
-            offset_samples.append(offset_sample_3)
-        return offset_samples
+            yield offset_sample_3
+        return
 
     if query_type.lower()=='having':
-        having_samples=[]
         for i in range (0,20):
             agg_functions=['Sum','Avg','Min','Max']
             no_of_select_cat_columns=random.randint(1,int(len(attributes)/2)+1)
@@ -301,12 +555,15 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
             random_op=random.sample(random_op_list,1)[0]
             random_number=random.randint(1,1000)
             having_sample_1=f'Select  {select_cat_columns_text},{selected_agg_function}({selected_agg_column}) as {selected_agg_column}_{selected_agg_function} from {user_dataset} group by {select_cat_columns_text} having {selected_agg_column}_{selected_agg_function} {random_op} {random_number}'
-            having_samples.append(having_sample_1)
+            yield having_sample_1
             having_sample_2=f'Select  {select_cat_columns_text},count(*) as cnt from {user_dataset} group by {select_cat_columns_text} having Cnt {random_op} {random_number}'
-            having_samples.append(having_sample_2)
-        return having_samples
-            
-    
+            yield having_sample_2
+        return
+
+
+def create_sample_query(query_type,column_names,attributes,measures,unique_elements,user_dataset):
+    """All the sample SQL queries of one type for one table (see iter_sample_queries)."""
+    return list(iter_sample_queries(query_type,column_names,attributes,measures,unique_elements,user_dataset))
 
 
 # def detect_base_pattern(nl_query):
@@ -337,331 +594,200 @@ def create_sample_query(query_type,column_names,attributes,measures,unique_eleme
 #             return pattern_name, match.groups()
 #     return None, None
 
-def detect_base_pattern(nl_query):
-    """Detects the pattern of a natural language query."""
-    patterns = {
- 
-        "total_group_by": r"(?:total|sum of|sum|sum of all|total of all) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)", # e.g., "total sales by category"
-        "average_group_by": r"(?:average of|avg of|mean of|average|avg|mean) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",        # e.g., "average price by region"
-        "min_group_by": r"(?:min of|minimum of|min|minimum|lowest|smallest) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",  
-        "max_group_by": r"(?:max of|maximum of|max|maximum|largest|biggest) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "count_group_by": r"(?:count|number) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)" ,
-        "Top_n_by":r"(?:Select|List|Give|Show|Find|Provide).*?(?:top|first) (.+?)(?:ordered by|based on|by) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "Bottom_n_by":r"(?:Select|List|Give|Show|Find|Provide).*?(?:bottom|last) (.+?) (?:ordered by|based on|by) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "total": r"(?:Select|List|Give|Show|Find|Provide).*?(?:total|sum of|sum|sum of all|total of all) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "average": r"(?:Select|List|Give|Show|Find|Provide).*?(?:average of|avg of|mean of|average|avg|mean) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "min" :r"(?:Select|List|Give|Show|Find|Provide).*?(?:min of|minimum of|min|minimum|lowest|smallest) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "max" :r"(?:Select|List|Give|Show|Find|Provide).*?(?:max of|maximum of|max|maximum|largest|biggest) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "count" : r"(?:Select|List|Give|Show|Find|Provide).*?(?:count|number) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
-        "Select": r"(?:Select|List|Give|Show|Find|Provide)(.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)"        
-    }
-
-    recogonized_patterns={}
-    for pattern_name, pattern_regex in patterns.items():
-        match = re.search(pattern_regex, nl_query, re.IGNORECASE)
-        if match:
-            recogonized_patterns['pattern_name']=pattern_name
-            recogonized_patterns['groups']=match.groups()
-            return pattern_name, match.groups()
-    return None, None
-
-def generate_base_sql(nl_query,attributes,measures,column_names):
-    """Translates a natural language query to an SQL query based on recognized patterns."""
-    pattern, elements = detect_base_pattern(nl_query)
-
-    if pattern=='total_group_by':
-        measure_found,attr_found=0,0
-        
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Sum({measure}) as sum_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        group_by_column=[]
-        for attr in attributes:
-            if attr in elements[1].lower() or attr.replace('_',' ') in elements[1].lower():
-                group_by_column.append(attr)
-                attr_found=1
-        group_by_text=','.join(group_by_column)
-
-        if measure_found==1 and attr_found==1:
-            sql_query=f'Select {group_by_text},{selected_measures_text} from user_dataset group by {group_by_text}'
-
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
-
-
-    if pattern=='average_group_by':
-
-        measure_found,attr_found=0,0
-        
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Avg({measure}) as avg_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        group_by_column=[]
-        for attr in attributes:
-            if attr in elements[1].lower() or attr.replace('_',' ') in elements[1].lower():
-                group_by_column.append(attr)
-                attr_found=1
-        group_by_text=','.join(group_by_column)
-
-        if measure_found==1 and attr_found==1:
-            sql_query=f'Select {group_by_text},{selected_measures_text} from user_dataset group by {group_by_text}'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
-
-
-    if pattern=='min_group_by':
-
-        measure_found,attr_found=0,0
-        
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Min({measure}) as min_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        group_by_column=[]
-        for attr in attributes:
-            if attr in elements[1].lower() or attr.replace('_',' ') in elements[1].lower():
-                group_by_column.append(attr)
-                attr_found=1
-        group_by_text=','.join(group_by_column)
-
-        if measure_found==1 and attr_found==1:
-            sql_query=f'Select {group_by_text},{selected_measures_text} from user_dataset group by {group_by_text}'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
-
-
-    if pattern=='max_group_by':
-
-        measure_found,attr_found=0,0
-        
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Max({measure}) as max_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        group_by_column=[]
-        for attr in attributes:
-            if attr in elements[1].lower() or attr.replace('_',' ') in elements[1].lower():
-                group_by_column.append(attr)
-                attr_found=1
-        group_by_text=','.join(group_by_column)
-
-        if measure_found==1 and attr_found==1:
-            sql_query=f'Select {group_by_text},{selected_measures_text} from user_dataset group by {group_by_text}'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
-
-    if pattern=='count_group_by':
-
-        measure_found,attr_found=0,0
-        
-        selected_measures=[]
-        for measure in column_names: # count can be of both categorical and continious variables 
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Count({measure}) as cnt_{measure}')
-                measure_found=1
-        if measure_found==0:
-            selected_measures_text='*'
-            measure_found=1
-        else:
-            selected_measures_text=','.join(selected_measures)
-
-        group_by_column=[]
-        for attr in attributes:
-            if attr in elements[1].lower() or attr.replace('_',' ') in elements[1].lower():
-                group_by_column.append(attr)
-                attr_found=1
-        group_by_text=','.join(group_by_column)
-
-        if measure_found==1 and attr_found==1:
-            sql_query=f'Select {group_by_text},{selected_measures_text} from user_dataset group by {group_by_text}'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
+# Compiled pattern registry. Everything below is compiled once at import instead
+# of being rebuilt and looked up on every call.
+
+# Base query patterns, checked in this order. The first one that matches wins.
+BASE_PATTERN_SOURCES = {
+    "total_group_by": r"(?:total|sum of|sum|sum of all|total of all) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)", # e.g., "total sales by category"
+    "average_group_by": r"(?:average of|avg of|mean of|average|avg|mean) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",    # e.g., "average price by region"
+    "min_group_by": r"(?:min of|minimum of|min|minimum|lowest|smallest) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",  
+    "max_group_by": r"(?:max of|maximum of|max|maximum|largest|biggest) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "count_group_by": r"(?:count|number) (.+?)(?:grouped by|group by|by|for each|for every|of each|per) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)" ,
+    "Top_n_by":r"(?:Select|List|Give|Show|Find|Provide).*?(?:top|first) (.+?)(?:ordered by|based on|by) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "Bottom_n_by":r"(?:Select|List|Give|Show|Find|Provide).*?(?:bottom|last) (.+?) (?:ordered by|based on|by) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "total": r"(?:Select|List|Give|Show|Find|Provide).*?(?:total|sum of|sum|sum of all|total of all) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "average": r"(?:Select|List|Give|Show|Find|Provide).*?(?:average of|avg of|mean of|average|avg|mean) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "min" :r"(?:Select|List|Give|Show|Find|Provide).*?(?:min of|minimum of|min|minimum|lowest|smallest) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "max" :r"(?:Select|List|Give|Show|Find|Provide).*?(?:max of|maximum of|max|maximum|largest|biggest) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "count" : r"(?:Select|List|Give|Show|Find|Provide).*?(?:count|number) (.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)",
+    "Select": r"(?:Select|List|Give|Show|Find|Provide)(.+?)(?:$|where|when|with|whose|limit|limited|limit to|sort|sorted|when|whose|ordered|order|arranged)"
+}
+BASE_PATTERNS = {name: re.compile(source, re.IGNORECASE) for name, source in BASE_PATTERN_SOURCES.items()}
+
+# Keywords the base patterns are built from. A pattern can only match when every
+# keyword class it needs appears in the query, so one scan for these keywords
+# rules out most patterns before any of the large regexes is run.
+BASE_PATTERN_KEYWORDS = {
+    'total': r"(?:total|sum) ",
+    'average': r"(?:average|avg|mean) ",
+    'min': r"(?:min|minimum|lowest|smallest) ",
+    'max': r"(?:max|maximum|largest|biggest) ",
+    'count': r"(?:count|number) ",
+    'by': r"by|for each|for every|of each|per|based on",
+    'verb': r"select|list|give|show|find|provide",
+    'top': r"(?:top|first) ",
+    'bottom': r"(?:bottom|last) "
+}
+BASE_PATTERN_REQUIRED_KEYWORDS = {
+    "total_group_by": ('total', 'by'),
+    "average_group_by": ('average', 'by'),
+    "min_group_by": ('min', 'by'),
+    "max_group_by": ('max', 'by'),
+    "count_group_by": ('count', 'by'),
+    "Top_n_by": ('verb', 'top', 'by'),
+    "Bottom_n_by": ('verb', 'bottom', 'by'),
+    "total": ('verb', 'total'),
+    "average": ('verb', 'average'),
+    "min": ('verb', 'min'),
+    "max": ('verb', 'max'),
+    "count": ('verb', 'count'),
+    "Select": ('verb',)
+}
+BASE_PATTERN_KEYWORD_SCANNER = re.compile('|'.join(f'(?P<{name}>{keyword})' for name, keyword in BASE_PATTERN_KEYWORDS.items()), re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _base_pattern_dispatcher(pattern_names):
+    """
+    Combines the given base patterns into one regex with a named group per pattern.
 
+    Every alternative is anchored at the start of the query and may skip any prefix,
+    so the regex engine tries the patterns in priority order and returns the same
+    match re.search would have found for the first matching pattern.
+    Returns the compiled regex and, per pattern, the range of its own capture groups.
+    """
+    alternatives = [f'(?s:.*?)(?P<{name}>{BASE_PATTERN_SOURCES[name]})' for name in pattern_names]
+    dispatcher = re.compile('|'.join(alternatives), re.IGNORECASE)
+    group_slices = {}
+    for name in pattern_names:
+        first_group = dispatcher.groupindex[name] + 1
+        group_slices[name] = (first_group, first_group + BASE_PATTERNS[name].groups)
+    return dispatcher, group_slices
+
+
+WHERE_PATTERN = re.compile(r"(?:where|when|whose|with|having) (.+?)(?:$|limit|limited|limit to|sort|sorted|arranged|ordered|order)", re.IGNORECASE)
+
+LIMIT_SORT_ORDER_PATTERNS = {
+    'order_by_pattern': re.compile(r"(?:order by|ordered by|arranged|arrange|sorted|sort) (.+?)(?:$|limit|limited|limit to|skip|offset)", re.IGNORECASE),
+    'limit_to_pattern': re.compile(r"(?:limit to|limited to|limit) (.+?)(?:$|order by|ordered by|arranged|arrange|sorted|sort|skip|offset)", re.IGNORECASE),
+    'offset_by_pattern': re.compile(r"(?:skip|offset) (.+?)(?:$|order by|ordered by|arranged|arrange|sorted|sort|skip|offset|limit to|limited to|limit)", re.IGNORECASE)
+}
+
+# Natural language comparison phrases and the operator they are replaced with, applied in this order
+OPERATOR_PATTERNS = {
+    '<=' : re.compile(r"\b(?:is\s+)?(?:less|lesser|below|lower|smaller)\s+than\s+or\s+equal\s+to\b|\b(?:is\s+)?at\s+most\b", re.IGNORECASE),
+    '>=' : re.compile(r"\b(?:is\s+)?(?:greater|more|above|higher|larger|bigger)\s+than\s+or\s+equal\s+to\b|\b(?:is\s+)?at\s+least\b", re.IGNORECASE),
+    '<' : re.compile(r"\b(?:is\s+)?(?:less|lesser|below|lower|smaller)\s+than\b", re.IGNORECASE),
+    '>' : re.compile(r"\b(?:is\s+)?(?:greater|more|above|higher|larger|bigger)\s+than\b", re.IGNORECASE),
+    '!=' : re.compile(r"\b(?:is\s+)?(?:not\s+equal\s+to|not\s+equals|different\s+from|not\s+the\s+same\s+as)\b", re.IGNORECASE),
+    '=': re.compile(r"\b(?:is\s+)?(?:equal\s+to|equals|same\s+as|exactly)\b|\bis\s+\b", re.IGNORECASE)
+}
+
+AGGREGATE_FC_WORDS = ['average','avg','mean','sum','total','min','minimum','max','maximum','lowest','smallest','biggest','largest']
+AGGREGATE_WORD_PATTERNS = [(word, re.compile(rf'\b{word}\b', re.IGNORECASE)) for word in AGGREGATE_FC_WORDS]
+
+NUMBER_PATTERN = re.compile(r'\d+')
+DATE_PATTERN = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+CONDITION_PATTERN = re.compile(r'\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$', re.DOTALL)
+BETWEEN_VALUES_PATTERN = re.compile(r'between\s+(.+?)\s+and\s+(.+)', re.IGNORECASE | re.DOTALL)
+IN_VALUES_PATTERN = re.compile(r'\s*in\s*\(([^()]+)\)\s*$', re.IGNORECASE)
+LIKE_VALUE_PATTERN = re.compile(r'\s*like\s+(\'[^\']*\'|"[^"]*"|\S+)\s*$', re.IGNORECASE)
+NUMERIC_VALUE_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SQL_TABLE_PATTERN = re.compile(r'\b(?:from|join)\s+(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=32)
+def _column_split_pattern(column_names):
+    """Regex splitting where-clause text on column names and conjunctions, cached per schema."""
+    words=[' '+ word  for word in column_names]
+    words.append(' and')
+    words.append(' but')
+    return re.compile('|'.join(f'({re.escape(word)})' for word in words))
 
-    if pattern=='total':
-        measure_found=0
 
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Sum({measure}) as sum_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        if measure_found==1:
-            sql_query=f'Select {selected_measures_text} from user_dataset'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
+def detect_base_pattern(nl_query):
+    """Detects the pattern of a natural language query."""
+    keywords_found = {match.lastgroup for match in BASE_PATTERN_KEYWORD_SCANNER.finditer(nl_query)}
+    candidate_patterns = tuple(name for name, required in BASE_PATTERN_REQUIRED_KEYWORDS.items() if keywords_found.issuperset(required))
+    if not candidate_patterns:
+        return None, None
 
-    if pattern=='average':
-        measure_found=0
+    dispatcher, group_slices = _base_pattern_dispatcher(candidate_patterns)
+    match = dispatcher.match(nl_query)
+    if match:
+        pattern_name = match.lastgroup
+        first_group, last_group = group_slices[pattern_name]
+        return pattern_name, tuple(match.group(i) for i in range(first_group, last_group))
+    return None, None
 
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Avg({measure}) as avg_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        if measure_found==1:
-            sql_query=f'Select {selected_measures_text} from user_dataset'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
+AGG_FUNCTIONS = {'total': 'Sum', 'average': 'Avg', 'min': 'Min', 'max': 'Max', 'count': 'Count'}
 
-    
-    if pattern=='min':
-        measure_found=0
 
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Min({measure}) as min_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        if measure_found==1:
-            sql_query=f'Select {selected_measures_text} from user_dataset'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
+@lru_cache(maxsize=32)
+def column_index_for(column_names):
+    """ColumnIndex over a tuple of column names, cached per schema for callers that don't hold one."""
+    return ColumnIndex(column_names)
 
-    
-    if pattern=='max':
-        measure_found=0
 
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Max({measure}) as max_{measure}')
-                measure_found=1
-        selected_measures_text=','.join(selected_measures)
-
-        if measure_found==1:
-            sql_query=f'Select {selected_measures_text} from user_dataset'
-            return pattern,sql_query
-        else:
-            print('Please check your dimension and measure names')
+def columns_mentioned(column_names, text, column_index=None):
+    """Returns, in schema order, the columns whose name (or name with '_' as spaces) appears in text."""
+    text=text.lower()
+    if column_index is not None:
+        return column_index.mentioned(text,column_names)
+    return [col for col in column_names if col in text or col.replace('_',' ') in text]
 
 
-    if pattern=='count':
+def parse_base_pattern(nl_query,attributes,measures,column_names,column_index=None):
+    """Parses the select part of a natural language query (aggregates, group keys, columns) into a ParsedQuery."""
+    pattern, elements = detect_base_pattern(nl_query)
+    parsed_query=ParsedQuery(base_op=pattern)
+
+    if pattern is None:
+        parsed_query.error='corresponding base query pattern not found'
+        return parsed_query
+
+    if pattern in ['Top_n_by','Bottom_n_by']:
+        selected_columns=columns_mentioned(column_names,elements[0],column_index)
+        order_by_columns=columns_mentioned(column_names,elements[1],column_index)
+        numbers = NUMBER_PATTERN.findall(elements[0])
+        if selected_columns:
+            parsed_query.select_columns=selected_columns+order_by_columns
+        parsed_query.order_by=order_by_columns
+        parsed_query.order_direction='DESC' if pattern=='Top_n_by' else 'ASC'
+        if numbers:
+            parsed_query.limit=int(numbers[0])
+        if not order_by_columns:
+            parsed_query.error='Please check the column to order by'
+        return parsed_query
 
-        measure_found=0
-        selected_measures=[]
-        for measure in column_names: # count can be of both categorical and continious variables 
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(f'Count({measure}) as cnt_{measure}')
-                measure_found=1
-        if measure_found==0:
-            selected_measures_text='*'
-            measure_found=1
-        else:
-            selected_measures_text=','.join(selected_measures)
-        sql_query=f'Select {selected_measures_text} from user_dataset'
-        return pattern,sql_query
-    
     if pattern=='Select':
+        parsed_query.select_columns=columns_mentioned(column_names,elements[0],column_index)
+        return parsed_query
 
-        columns_found=0
-        selected_columns=[]
-        for col in column_names:
-            if col in elements[0].lower() or col.replace('_',' ') in elements[0].lower():
-                selected_columns.append(col)
-                columns_found=1
-        if columns_found==1:
-            selected_columns_text=','.join(selected_columns)
-        else:
-            selected_columns_text=' * '
-        sql_query=f'Select {selected_columns_text} from user_dataset'
-        return pattern,sql_query
-
-    if pattern=='Top_n_by':
-
-        columns_found=0
-        numbers = re.findall(r'\d+', elements[0])
-        selected_columns=[]
-        order_by_column=[]
-        order_found=0
-        for col in column_names:
-            if col in elements[0].lower() or col.replace('_',' ') in elements[0].lower():
-                selected_columns.append(col)
-                columns_found=1
-            if col in elements[1].lower() or col.replace('_',' ') in elements[1].lower():
-                order_by_column.append(col)
-                order_found=1
-                order_by_text=','.join(order_by_column)
-        if columns_found==0:
-            selected_columns_text='*'
-        else:
-            selected_columns_text=','.join(selected_columns)
-        if order_found==1:
-            sql_query=f'Select {selected_columns_text},{order_by_text} from user_dataset order by {order_by_text} desc limit {numbers[0]}'
-            return pattern,sql_query
-
-    if pattern=='Bottom_n_by':
-
-        columns_found=0
-        numbers = re.findall(r'\d+', elements[0])
-        selected_columns=[]
-        order_by_column=[]
-        order_found=0
-        for col in column_names:
-            if col in elements[0].lower() or col.replace('_',' ') in elements[0].lower():
-                selected_columns.append(col)
-                columns_found=1
-            if col in elements[1].lower() or col.replace('_',' ') in elements[1].lower():
-                order_by_column.append(col)
-                order_found=1
-                order_by_text=','.join(order_by_column)
-        if columns_found==0:
-            selected_columns_text='*'
-        else:
-            selected_columns_text=','.join(selected_columns)
-        if order_found==1:
-            sql_query=f'Select {selected_columns_text},{order_by_text} from user_dataset order by {order_by_text} aesc limit {numbers[0]}'
-            return pattern,sql_query
+    agg_fn=AGG_FUNCTIONS[pattern.replace('_group_by','')]
+    if agg_fn=='Count':
+        # count can be of both categorical and continious variables
+        parsed_query.measures=[Measure(agg_fn,col) for col in columns_mentioned(column_names,elements[0],column_index)] or [Measure(agg_fn,'*')]
+    else:
+        parsed_query.measures=[Measure(agg_fn,measure) for measure in columns_mentioned(measures,elements[0],column_index)]
+
+    if pattern.endswith('_group_by'):
+        parsed_query.group_keys=columns_mentioned(attributes,elements[1],column_index)
+        if not parsed_query.group_keys:
+            parsed_query.error='Please check your dimension and measure names'
+    if not parsed_query.measures:
+        parsed_query.error='Please check your dimension and measure names'
+    return parsed_query
 
 def detect_where_pattern(nl_query):
     """Detects the where condition in the query and formats it accordingly"""
-    where_pattern=r"(?:where|when|whose|with|having) (.+?)(?:$|limit|limited|limit to|sort|sorted|arranged|ordered|order)"
-    match = re.search(where_pattern, nl_query, re.IGNORECASE)
+    match = WHERE_PATTERN.search(nl_query)
     if match:
         return match.groups()
 
 
-def wrap_non_numbers_in_quotes(expression):
-    # Regular expression to match comparison operator and the right side value
-    # This will match the operator followed by an optional space and then any non-numeric value
-    return re.sub(r'([=\!<>]=?)\s*([^\d\s]+)', r'\1 \'\2\'', expression)
-
-def enclose_dates_in_quotes(s):
-    # Regular expression to detect dates in the format YYYY-MM-DD
-    date_pattern = r'\b(\d{4})-(\d{2})-(\d{2})\b'
-    
-    # Function to enclose detected dates in single quotes
-    return re.sub(date_pattern, r"'\g<0>'", s)
-
-
 def concat_between(lst):
     i = 0
     while i < len(lst):
@@ -678,36 +804,45 @@ def concat_between(lst):
     return lst
 
 
-def generate_where_part (nl_query,column_names):
+def parse_condition(column,agg_fn,part):
+    """Turns the text following a column in the where clause (e.g. 'is greater than 500') into a Predicate."""
+    if 'between' in part.lower():
+        match=BETWEEN_VALUES_PATTERN.search(part)
+        if match:
+            return Predicate(column,'between',(match.group(1).strip("'\""),match.group(2).strip("'\"")),agg_fn)
+        return Predicate(column,None,agg=agg_fn,raw=part)
+
+    match=IN_VALUES_PATTERN.match(part)
+    if match:
+        return Predicate(column,'in',tuple(value.strip().strip("'\"") for value in match.group(1).split(',')),agg_fn)
+    match=LIKE_VALUE_PATTERN.match(part)
+    if match:
+        return Predicate(column,'like',match.group(1).strip("'\""),agg_fn)
+
+    condition_text=part
+    for operator, pattern in OPERATOR_PATTERNS.items():
+        condition_text = pattern.sub(operator, condition_text)
+    match=CONDITION_PATTERN.match(condition_text)
+    if match:
+        return Predicate(column,match.group(1),match.group(2).strip("'\""),agg_fn)
+    return Predicate(column,None,agg=agg_fn,raw=condition_text)
+
+
+def parse_where_part (nl_query,column_names,column_index=None):
+    """Parses the where / having conditions of a natural language query into two lists of Predicates."""
     detected_where_part=detect_where_pattern(nl_query)
     detected_where_text=''
     if detected_where_part:
         detected_where_text=detected_where_part[0].lower()
     text=' '+detected_where_text
-    words=copy.deepcopy(column_names)
-    words=[' '+ word  for word in words]
-    words.append(' and')
-    words.append(' but')
-    pattern = '|'.join(f'({re.escape(word)})' for word in words)
-    split_text = re.split(pattern, text)
+    split_text = _column_split_pattern(tuple(column_names)).split(text)
     split_text=[part.strip() for part in split_text if part]
     concat_between(split_text)
 
     current_condn_col=None
+    current_agg_fn=None
     where_conditions=[]
     having_conditions=[]
-    operator_patterns={ 
-
-        '<=' : r"\b(?:is\s+)?(?:less|lesser|below|lower|smaller)\s+than\s+or\s+equal\s+to\b|\b(?:is\s+)?at\s+most\b",
-        '>=' : r"\b(?:is\s+)?(?:greater|more|above|higher|larger|bigger)\s+than\s+or\s+equal\s+to\b|\b(?:is\s+)?at\s+least\b",
-        '<' : r"\b(?:is\s+)?(?:less|lesser|below|lower|smaller)\s+than\b",
-        '>' : r"\b(?:is\s+)?(?:greater|more|above|higher|larger|bigger)\s+than\b",
-        '!=' : r"\b(?:is\s+)?(?:not\s+equal\s+to|not\s+equals|different\s+from|not\s+the\s+same\s+as)\b",
-        '=': r"\b(?:is\s+)?(?:equal\s+to|equals|same\s+as|exactly)\b|\bis\s+\b"
-
-    }
-    
-    aggregate_fc_words=['average','avg','mean','sum','total','min','minimum','max','maximum','lowest','smallest','biggest','largest']
     agg_fn_map={ 'Avg' : ['average','avg','mean'],
                 'Sum' : ['sum','total'],
                 'Min' : ['min','minimum','lowest','smallest'],
@@ -715,12 +850,13 @@ def generate_where_part (nl_query,column_names):
     }
     condition_on_agg=0
     agg_fn=None
+    known_columns=column_index.columns if column_index is not None else column_names
  
     for i,part in enumerate(split_text):
         if part.lower()=='and' or part.lower()=='' or part.lower()=='but':
             continue
 
-        agg_match=next((word for word in aggregate_fc_words if re.search(rf'\b{word}\b', part, re.IGNORECASE)), None)
+        agg_match=next((word for word, word_pattern in AGGREGATE_WORD_PATTERNS if word_pattern.search(part)), None)
         if agg_match:
             condition_on_agg=1
             agg_word=agg_match
@@ -729,86 +865,71 @@ def generate_where_part (nl_query,column_names):
                     agg_fn=func_name
             continue
 
-        if part.lower() in column_names:
-            if condition_on_agg==0:
-                current_condn_col=part.lower()
-            else:
-                current_condn_col=f'{agg_fn}({part.lower()})'
-                condition_on_agg=0
+        if part.lower() in known_columns:
+            current_condn_col=part.lower()
+            current_agg_fn=agg_fn if condition_on_agg==1 else None
+            condition_on_agg=0
             continue
         
-        if current_condn_col!=None and current_condn_col!=part.lower():
-            if 'between' not in part.lower():
-                condition_text=part
-                for operator, pattern in operator_patterns.items():
-                    condition_text = re.sub(pattern, operator, condition_text, flags=re.IGNORECASE)
-                condition_text=current_condn_col+' '+condition_text
-                condition_text=wrap_non_numbers_in_quotes(condition_text).replace('\\','')
-                condition_text=enclose_dates_in_quotes(condition_text)
+        if current_condn_col!=None:
+            predicate=parse_condition(current_condn_col,current_agg_fn,part)
+            if current_agg_fn is None:
+                where_conditions.append(predicate)
             else:
-                condition_text=part
-                condition_text=current_condn_col+' '+condition_text   
-                condition_text=enclose_dates_in_quotes(condition_text)
-            if current_condn_col in column_names:
-                where_conditions.append(condition_text)
-            else:
-                having_conditions.append(condition_text)
+                having_conditions.append(predicate)
 
     return where_conditions,having_conditions
 
-
 def detect_limit_sort_order_pattern(nl_query):
     """Detects the where condition in the query and formats it accordingly"""
-    pattern_list={}
-    pattern_list['order_by_pattern']=r"(?:order by|ordered by|arranged|arrange|sorted|sort) (.+?)(?:$|limit|limited|limit to|skip|offset)"
-    pattern_list['limit_to_pattern']=r"(?:limit to|limited to|limit) (.+?)(?:$|order by|ordered by|arranged|arrange|sorted|sort|skip|offset)"
-    pattern_list['offset_by_pattern']=r"(?:skip|offset) (.+?)(?:$|order by|ordered by|arranged|arrange|sorted|sort|skip|offset|limit to|limited to|limit)"
     result_dict={}
-    for pattern_name,pattern in pattern_list.items():
-        match = re.search(pattern, nl_query, re.IGNORECASE)
+    for pattern_name,pattern in LIMIT_SORT_ORDER_PATTERNS.items():
+        match = pattern.search(nl_query)
         if match:
             result_dict[pattern_name]=match.groups()
     return result_dict
 
 
-def generate_limit_sort_order_parts(nl_query,column_names):
-
+def parse_limit_sort_order(nl_query,column_names,column_index=None):
+    """Parses the order by, limit and offset parts of a natural language query."""
     detected_parts=detect_limit_sort_order_pattern(nl_query)
-    limit_part=''
-    order_part=''
-    offset_part=''
+    order_by_columns=[]
+    order_direction=''
+    limit=None
+    offset=None
 
     for query_part,text in detected_parts.items():
         if query_part=='order_by_pattern':
-            order_by_columns=[]
-            for col in column_names:
-                if col in text[0].lower() or col.replace('_',' ') in text[0].lower():
-                    order_by_columns.append(col)
+            order_by_columns=columns_mentioned(column_names,text[0],column_index)
             if 'descending' in text[0].lower():
-                order_by_type='DESC'
-            else:
-                order_by_type=''
-
-            order_part= ' order by '+','.join(order_by_columns) +' '+order_by_type
-
+                order_direction='DESC'
 
         if query_part=='limit_to_pattern':
-            numbers = re.findall(r'\d+', text[0])
-            limit_part=' limit '+ numbers[0]
+            numbers = NUMBER_PATTERN.findall(text[0])
+            if numbers:
+                limit=int(numbers[0])
 
         if query_part=='offset_by_pattern':
-            numbers = re.findall(r'\d+', text[0])
-            offset_part=' offset '+ numbers[0]
+            numbers = NUMBER_PATTERN.findall(text[0])
+            if numbers:
+                offset=int(numbers[0])
     
-    return order_part+limit_part+offset_part
+    return order_by_columns,order_direction,limit,offset
      
 
-def generate_join_part(input_user_query,input_dataset_paths,all_columns,column_details):
+def tables_named_in_query(input_user_query,input_dataset_paths):
+    """Datasets whose table name appears in the query, used when no column of any table is mentioned."""
+    return [path.replace('.csv','') for path in input_dataset_paths if path.replace('.csv','').lower() in input_user_query.lower()]
+
+
+def plan_join(input_user_query,input_dataset_paths,all_columns,column_details,column_index=None):
+    """Works out which tables the query needs and how to join them. Returns a list of JoinSteps."""
     table_already_exists_in_join={}
-    Columns_in_query=[]
-    for col in all_columns:
-        if col in input_user_query.lower():
-            Columns_in_query.append(col)
+    lower_query=input_user_query.lower()
+    if column_index is not None:
+        Columns_in_query=column_index.mentioned(lower_query,all_columns,spaced=False)
+    else:
+        Columns_in_query=[col for col in all_columns if col in lower_query]
 
     cols_selected={}
     cols_gone_through=[]
@@ -822,7 +943,7 @@ def generate_join_part(input_user_query,input_dataset_paths,all_columns,column_d
 
     tables_in_selection = [key for key, value in cols_selected.items() if value == 1]
 
-    join_conditions=[]
+    join_steps=[]
     if len(tables_in_selection)>1:
         from_exists=0
         from_table=''
@@ -833,22 +954,39 @@ def generate_join_part(input_user_query,input_dataset_paths,all_columns,column_d
                     if join_columns: # code works only when one column is common between tables
                         col=join_columns[0]
                         if table_already_exists_in_join[table1]==0 and table_already_exists_in_join[table2]==0 and from_exists==0:
-                            join_conditions.append(f' from {table1.replace('.csv','')} join {table2.replace('.csv','')} on {table1.replace('.csv','')}.{col} = {table2.replace('.csv','')}.{col}')
+                            join_steps.append(JoinStep(table1.replace('.csv','')))
+                            join_steps.append(JoinStep(table2.replace('.csv',''),table1.replace('.csv',''),col))
                             table_already_exists_in_join[table1]=1
                             table_already_exists_in_join[table2]=1
                             from_exists=1
                             from_table=table1
                         if from_exists==1 and from_table==table1 and table_already_exists_in_join[table2]==0:
-                            join_conditions.append(f' join {table2.replace('.csv','')} on {table1.replace('.csv','')}.{col} = {table2.replace('.csv','')}.{col}')
+                            join_steps.append(JoinStep(table2.replace('.csv',''),table1.replace('.csv',''),col))
                             table_already_exists_in_join[table2]=1
                         if from_exists==1 and from_table==table2 and table_already_exists_in_join[table1]==0:
-                            join_conditions.append(f' join {table1.replace('.csv','')} on {table1.replace('.csv','')}.{col} = {table2.replace('.csv','')}.{col}')
+                            join_steps.append(JoinStep(table1.replace('.csv',''),table2.replace('.csv',''),col))
                             table_already_exists_in_join[table1]=1
+    elif tables_in_selection:
+        join_steps.append(JoinStep(tables_in_selection[0].replace('.csv','')))
     else:
-        join_conditions.append(f' from {tables_in_selection[0].replace('.csv','')}')
+        join_steps=[JoinStep(table) for table in tables_named_in_query(input_user_query,input_dataset_paths)[:1]]
+
+    return join_steps
 
+
+def render_join_steps(join_steps):
+    join_conditions=[]
+    for step in join_steps:
+        if step.left_table is None:
+            join_conditions.append(f' from {step.table}')
+        else:
+            join_conditions.append(f' join {step.table} on {step.left_table}.{step.column} = {step.table}.{step.column}')
     return join_conditions
 
+
+def generate_join_part(input_user_query,input_dataset_paths,all_columns,column_details):
+    return render_join_steps(plan_join(input_user_query,input_dataset_paths,all_columns,column_details))
+
 # def generate_join_part(input_user_query,input_dataset_paths,all_columns,column_details):
 #     table_already_exists_in_join={}
 
@@ -896,89 +1034,304 @@ def generate_join_part(input_user_query,input_dataset_paths,all_columns,column_d
 
     
 
-def output_sample_queries(input_user_query,input_dataset_paths,all_columns,column_details):
+def interleave_samples(sources,count=None):
+    """
+    Takes samples from several generators in turn, one from each per round, until count distinct samples
+    are found or every generator is exhausted. Only the samples returned (and duplicates skipped) are ever
+    built, however many generators there are. count=None takes them all.
+    """
+    sources=list(sources)
+    samples={}
+    while sources and (count is None or len(samples)<count):
+        for source in list(sources):
+            sample=next(source,None)
+            if sample is None:
+                sources.remove(source)
+                continue
+            samples[sample]=None
+            if count is not None and len(samples)>=count:
+                break
+    return list(samples)
+
+
+SAMPLE_QUERY_TYPES=('order by','min','max','avg','sum','where','having','limit','offset','group by')
+MONGO_SAMPLE_QUERY_TYPES=('sort','min','max','avg','sum','where','having','limit','skip','group','project','match')
+
+def requested_sample_types(input_user_query,sample_query_types):
+    """The sample type a "sample queries" request names (the first one found in it), or every type."""
+    lower_query=input_user_query.lower()
+    return [sample_type for sample_type in sample_query_types if sample_type in lower_query][:1] or list(sample_query_types)
+
+
+def iter_join_samples(input_dataset_paths,column_details,rounds=20):
+    """
+    Yields sample join queries from the pairs of tables that share a column, in random order: random columns
+    of both tables and the join generate_join_part plans for them. Pairs are tried only as samples are asked
+    for; later rounds reuse the pairs found joinable.
+    """
+    pairs=list(itertools.combinations(input_dataset_paths,2))
+    random.shuffle(pairs)
+    joinable=[]
+    for round_no in range(rounds):
+        for left,right in (pairs if round_no==0 else joinable):
+            left_columns=column_details[left]['column_names']
+            right_columns=[col for col in column_details[right]['column_names'] if col not in left_columns]
+            if not right_columns or len(right_columns)==len(column_details[right]['column_names']):
+                continue  # nothing to select from the right table, or no column to join on
+            if round_no==0:
+                joinable.append((left,right))
+            random_columns=random.sample(left_columns,random.randint(1,int(len(left_columns)/2)+1))
+            random_columns+=random.sample(right_columns,random.randint(1,int(len(right_columns)/2)+1))
+            sql_query_base_join=f' Select {",".join(random_columns)}'
+            join_conditions=generate_join_part(sql_query_base_join,[left,right],list(left_columns)+right_columns,column_details)
+            if join_conditions:
+                yield sql_query_base_join+' '+' '.join(join_conditions)
+
+
+def output_sample_queries(input_user_query,input_dataset_paths,all_columns,column_details,count=None):
+    """
+    Sample SQL queries for a "sample queries" request: join samples if it mentions join, else samples of the
+    type it names (e.g. "sample having queries"), else of every type. Tables (and types) take turns in random
+    order and generation stops at count distinct samples, so the cost doesn't grow with the datasets loaded.
+    """
+    lower_query=input_user_query.lower()
+    if 'example' not in lower_query and 'sample' not in lower_query:
+        return []
 
-    sample_query_types=['order by','min','max','avg','sum','where','having','limit','offset','group by']
-    specific_sample_found=0
+    if 'join' in lower_query:
+        return interleave_samples([iter_join_samples(input_dataset_paths,column_details)],count)
 
     # samples are generated only for tables with atleast 1 measure and 1 attribute for all cases other than join
-    sample_tables=[]
-    for table in column_details:
-        if column_details[table]['attributes'] and column_details[table]['measures']:
-            sample_tables.append(table)
-
-
-    if 'example' in input_user_query.lower() or 'sample' in input_user_query.lower():
-        if 'join' in input_user_query.lower():
-            specific_sample_found=1
-            i=0
-            output_sample=[]
-            while i<5:
-                random_no_of_columns=random.randint(1,int(len(all_columns)/2)+1)
-                random_columns=random.sample(all_columns,random_no_of_columns)
-                random_columns_text=','.join(random_columns)
-                sql_query_base_join=f' Select {random_columns_text}'
-                join_conditions=generate_join_part(sql_query_base_join,input_dataset_paths,all_columns,column_details)
-                if join_conditions:
-                    i+=1
-                    join_text=' '.join(join_conditions)
-                    output_sample.append(sql_query_base_join+' '+join_text)
-        else:
-            for sample_type in sample_query_types:
-                if sample_type in input_user_query.lower():
-                    samples_list=[]
-                    for path in sample_tables:
-                        table_name=path.replace('.csv','')
-                        samples_list.extend(create_sample_query(sample_type,column_details[path]['column_names'],column_details[path]['attributes'],column_details[path]['measures'],column_details[path]['unique_elements'],table_name))
-                        # print description on what sample type
-                    output_sample=samples_list #random.sample(samples_list,5) #output_sample
-                    specific_sample_found=1
-                    break
-
-        if specific_sample_found==0:
-            all_samples=[]
-            for sample_type in sample_query_types:
-                for path in sample_tables:
-                    table_name=path.replace('.csv','')
-                    generic_samples_list=create_sample_query(sample_type,column_details[path]['column_names'],column_details[path]['attributes'],column_details[path]['measures'],column_details[path]['unique_elements'],table_name)
-                    all_samples.extend(generic_samples_list)
-            output_sample=all_samples #random.sample(all_samples,5)
-    return output_sample
-
-def translate_to_sql(input_user_query,input_dataset_paths,attributes,measures,column_names,column_details):
-        final_query=''
-        base_query_output=generate_base_sql(input_user_query,attributes,measures,column_names)
-        base_query_format=base_query_output[0]
-        base_query_part=base_query_output[1]
-        where_having_output=generate_where_part(input_user_query,column_names)
-        where_part=''
-        having_part=''
-        join_text=''
-        if where_having_output[0]:
-            where_part=' where ' + ' and '.join(where_having_output[0])
-        if where_having_output[1]:
-            having_part=' having ' +' and '.join(where_having_output[1])
-        limit_sort_order_part=generate_limit_sort_order_parts(input_user_query,column_names)
-        join_conditions=generate_join_part(input_user_query,input_dataset_paths,column_names,column_details)
-        join_text=' '.join(join_conditions)
-        base_query_part=base_query_part.replace('from user_dataset',join_text)
-        if base_query_format not in ['Top_n_by','Bottom_n_by']:
-            final_query=base_query_part
-            if 'group by' in final_query:
-                final_query=final_query.replace('group by',where_part+' '+'group by')
+    sample_tables=[table for table in column_details if column_details[table]['attributes'] and column_details[table]['measures']]
+    requested_types=requested_sample_types(input_user_query,SAMPLE_QUERY_TYPES)
+    sources=[iter_sample_queries(sample_type,column_details[path]['column_names'],column_details[path]['attributes'],column_details[path]['measures'],column_details[path]['unique_elements'],path.replace('.csv',''))
+             for sample_type in requested_types for path in sample_tables]
+    random.shuffle(sources)
+    return interleave_samples(sources,count)
+
+def resolve_collection(input_user_query,input_dataset_paths,column_names,column_details,column_index=None):
+    """Picks the single collection holding every column mentioned in the query (MongoDB has no joins here)."""
+    columns_in_query=set(columns_mentioned(column_names,input_user_query,column_index))
+    if not columns_in_query:
+        named_tables=tables_named_in_query(input_user_query,input_dataset_paths)
+        if named_tables:
+            return named_tables[0]
+
+    collection_name='No collection Found'
+    for path in input_dataset_paths:
+        columns_counter=len(columns_in_query.intersection(column_details[path]['column_names']))
+        if columns_counter==len(columns_in_query):
+                collection_name=path.replace('.csv','')
+    return collection_name
+
+
+def normalize_query(input_user_query):
+    """
+    Lower-cases the query and collapses whitespace. Translation does not depend on case, so the
+    normalized text translates the same and can be used as a cache key.
+    """
+    return WHITESPACE_PATTERN.sub(' ',input_user_query).strip().lower()
+
+
+def schema_fingerprint(input_dataset_paths,column_details):
+    """
+    Hash of the loaded datasets, their column classification and the value types of their attributes (which
+    parse_query binds condition values as). Changes whenever a reload changes the schema.
+    """
+    schema={'dataset_paths':list(input_dataset_paths),
+            'tables':[[path,
+                       list(column_details[path]['column_names']),
+                       list(column_details[path]['attributes']),
+                       list(column_details[path]['measures']),
+                       {col: sketch.value_type for col, sketch in column_details[path].get('unique_elements',{}).items()}] for path in column_details]}
+    return hashlib.sha1(json.dumps(schema).encode('utf-8')).hexdigest()
+
+
+def table_fingerprint(path,details):
+    """
+    Hash of one table's column classification and the values its sketches keep: everything its sample queries
+    are built from. Changes when a reload or an append changes the table's samples.
+    """
+    table=[path,
+           list(details['column_names']),
+           list(details['attributes']),
+           list(details['measures']),
+           {col: list(sketch) for col, sketch in details['unique_elements'].items()}]
+    return hashlib.sha1(json.dumps(table,default=str).encode('utf-8')).hexdigest()
+
+
+def parse_query(input_user_query,input_dataset_paths,attributes,measures,column_names,column_details,column_index=None):
+    """
+    Parses a natural language query once into a ParsedQuery (see query_ir.py).
+    The SQL and MongoDB generators below both work from this, so the query text is only scanned once.
+    column_index is the ColumnIndex built at load time; one is built (and cached) from column_names if not given.
+    """
+    if column_index is None:
+        column_index=column_index_for(tuple(column_names))
+    parsed_query=parse_base_pattern(input_user_query,attributes,measures,column_names,column_index)
+    parsed_query.predicates,parsed_query.having=parse_where_part(input_user_query,column_names,column_index)
+    if parsed_query.base_op in ['Top_n_by','Bottom_n_by']:
+        parsed_query.having=[]
+    else:
+        parsed_query.order_by,parsed_query.order_direction,parsed_query.limit,parsed_query.offset=parse_limit_sort_order(input_user_query,column_names,column_index)
+    parsed_query.joins=plan_join(input_user_query,input_dataset_paths,column_names,column_details,column_index)
+    parsed_query.collection=resolve_collection(input_user_query,input_dataset_paths,column_names,column_details,column_index)
+    # Condition values are bound as the type their column was loaded with
+    for predicate in parsed_query.predicates+parsed_query.having:
+        predicate.column_type=column_type(predicate.column,column_details,parsed_query.tables)
+    return parsed_query
+
+
+def column_type(column,column_details,tables=()):
+    """
+    Type of a column's values as recorded at load (ColumnSketch.value_type): 'number' for measures, else
+    'integer', 'float', 'boolean', 'date' or 'string'. The tables named in tables are looked at first.
+    None if it isn't known, e.g. for datasets catalogued before types were recorded.
+    """
+    for path in sorted(column_details,key=lambda path: path.replace('.csv','') not in tables):
+        details=column_details[path]
+        if column in details['measures']:
+            return 'number'
+        sketch=details.get('unique_elements',{}).get(column)
+        if sketch is not None:
+            return sketch.value_type
+    return None
+
+
+def typed_value(value,value_type=None):
+    """
+    A literal from the query text as a value of the type its column was loaded with: int / float for numbers,
+    True / False for booleans (and true / false against numbers), a datetime for ISO 8601 dates, the text for
+    strings. Text that doesn't parse as the type stays text; with no known type, numbers are still numbers.
+    """
+    if not isinstance(value,str) or value_type=='string':
+        return value
+    if value_type=='date':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if value_type is not None and value.lower() in ('true','false'):
+        return value.lower()=='true'
+    if value_type!='boolean' and NUMERIC_VALUE_PATTERN.fullmatch(value):
+        return float(value) if '.' in value else int(value)
+    return value
+
+
+def sql_value(value,value_type=None):
+    """The value bound for a literal (see typed_value). Dates stay ISO 8601 text, as they are stored in the SQL tables."""
+    typed=typed_value(value,value_type)
+    return value if isinstance(typed,datetime) else typed
+
+
+def sql_literal(value,value_type=None):
+    """The literal inlined in SQL text: numbers as typed, booleans as TRUE / FALSE, everything else (text, dates) quoted."""
+    typed=sql_value(value,value_type)
+    if isinstance(typed,bool):
+        return 'TRUE' if typed else 'FALSE'
+    if isinstance(typed,(int,float)):
+        return value
+    return "'"+value.replace("'","''")+"'"
+
+
+def sql_param(value,params,value_type=None):
+    """A bind parameter (:p0, :p1, ...) for value, added to params. Without params the literal is inlined."""
+    if params is None:
+        return sql_literal(value,value_type)
+    name=f'p{len(params)}'
+    params[name]=sql_value(value,value_type)
+    return ':'+name
+
+
+def generate_sql_condition(predicate,params=None):
+    column=f'{predicate.agg}({predicate.column})' if predicate.agg else predicate.column
+    if predicate.op is None:
+        # Never inlined: the text is the user's, and would run as SQL
+        raise ValueError(f"Could not understand the condition '{predicate.column} {predicate.raw.strip()}'")
+    if predicate.op=='in':
+        return f"{column} in ({', '.join(sql_param(value,params,predicate.value_type) for value in predicate.value)})"
+    if predicate.op=='like':
+        return f'{column} like {sql_param(predicate.value,params,"string")}'
+    if predicate.op=='between':
+        low,high=predicate.value
+        return f'{column} between {sql_param(low,params,predicate.value_type)} and {sql_param(high,params,predicate.value_type)}'
+    return f'{column} {predicate.op} {sql_param(predicate.value,params,predicate.value_type)}'
+
+
+def generate_sql(parsed_query,params=None):
+    """
+    SQL backend: renders a ParsedQuery as a SQL statement. With params (a dict) the where / having values
+    become bind parameters, whose values are added to params; otherwise they are inlined.
+    """
+    if parsed_query.error:
+        raise ValueError(parsed_query.error)
+    if not parsed_query.joins:
+        raise ValueError('No table found for the columns in the query')
+
+    if parsed_query.measures:
+        select_items=list(parsed_query.group_keys)
+        for measure in parsed_query.measures:
+            if measure.column=='*':
+                select_items.append(f'{measure.func}(*) as cnt')
             else:
-                final_query=final_query+' '+where_part
-            final_query=final_query+' '+having_part+' '+limit_sort_order_part
-        else:
-            if 'order by' in base_query_format:
-                final_query=base_query_part
-                final_query=final_query.replace('order by',where_part+' '+'order by')
-        return final_query
+                alias_prefix='cnt' if measure.func=='Count' else measure.func.lower()
+                select_items.append(f'{measure.func}({measure.column}) as {alias_prefix}_{measure.column}')
+    else:
+        select_items=parsed_query.select_columns or ['*']
+
+    sql_query='Select '+','.join(select_items)
+    sql_query+=''.join(render_join_steps(parsed_query.joins))
+    if parsed_query.predicates:
+        sql_query+=' where '+' and '.join(generate_sql_condition(predicate,params) for predicate in parsed_query.predicates)
+    if parsed_query.group_keys:
+        sql_query+=' group by '+','.join(parsed_query.group_keys)
+    if parsed_query.having:
+        sql_query+=' having '+' and '.join(generate_sql_condition(predicate,params) for predicate in parsed_query.having)
+    if parsed_query.order_by:
+        sql_query+=' order by '+','.join(parsed_query.order_by)
+        if parsed_query.order_direction:
+            sql_query+=' '+parsed_query.order_direction
+    if parsed_query.limit is not None:
+        sql_query+=f' limit {parsed_query.limit}'
+    if parsed_query.offset is not None:
+        sql_query+=f' offset {parsed_query.offset}'
+    return sql_query
+
+
+def cap_row_limit(parsed_query, max_rows):
+    """
+    Safety limit: a copy of parsed_query returning at most max_rows rows. Queries that return a single
+    row (aggregates without group by) are left alone.
+    """
+    if not max_rows or (parsed_query.measures and not parsed_query.group_keys):
+        return parsed_query
+    if parsed_query.limit is not None and parsed_query.limit<=max_rows:
+        return parsed_query
+    return replace(parsed_query, limit=max_rows)
+
+
+def translate_to_sql(input_user_query,input_dataset_paths,attributes,measures,column_names,column_details,parsed_query=None,column_index=None,max_rows=None):
+    """
+    Translates a natural language query to SQL. Pass parsed_query to reuse a parse already done for MongoDB.
+    With max_rows a LIMIT of at most max_rows is added (see cap_row_limit).
+    Returns a SQLStatement: the query with its values inlined, carrying the parameterized template to execute.
+    """
+    if parsed_query is None:
+        parsed_query=parse_query(input_user_query,input_dataset_paths,attributes,measures,column_names,column_details,column_index)
+    parsed_query=cap_row_limit(parsed_query, max_rows)
+    params={}
+    template=generate_sql(parsed_query,params)
+    return SQLStatement(generate_sql(parsed_query),template,params)
+
+
+def tables_in_sql(sql_query):
+    """Returns the names of the tables a generated SQL query reads from."""
+    return {table.lower() for table in SQL_TABLE_PATTERN.findall(sql_query)}
 
 
 # mongo parts
 
-def load_csv_to_mongo(csv_path, mongo_uri, db_name, collection_name):
+def load_csv_to_mongo(csv_path, mongo_uri, db_name, collection_name, pool_options=None, chunksize=None, batch_size=1000, workers=1):
     """
     Loads a CSV file into a MongoDB collection.
 
@@ -987,41 +1340,179 @@ def load_csv_to_mongo(csv_path, mongo_uri, db_name, collection_name):
     - mongo_uri (str): MongoDB connection URI.
     - db_name (str): Name of the database.
     - collection_name (str): Name of the collection where data should be stored.
+    - pool_options (dict): Optional max_pool_size / min_pool_size passed to connections.get_mongo_client.
+    - chunksize (int): If set, stream the file in chunks of this many rows (see load_csv_to_mongo_chunked).
+    - batch_size (int): Documents per insert_many call.
+    - workers (int): Number of insert_many batches sent in parallel when streaming.
 
     Returns:
     - dict: Metadata about the columns and a sample of the data.
     """
+    if chunksize:
+        return load_csv_to_mongo_chunked(csv_path, mongo_uri, db_name, collection_name, pool_options, chunksize, batch_size, workers)
+
     try:
         # Load CSV into a DataFrame
         df = pd.read_csv(csv_path)
         df.columns = df.columns.str.replace(' ', '_')
         df.columns = df.columns.str.lower()
-        client = MongoClient(mongo_uri)
+        client = connections.get_mongo_client(mongo_uri, **(pool_options or {}))
         db = client[db_name]
         collection = db[collection_name]
 
-        # Insert data into MongoDB
-        collection.delete_many({})  # Clear existing data
-        data = df.to_dict(orient='records')
-        collection.insert_many(data)
-
         # Extract column metadata
         attributes = df.select_dtypes(include=['object']).columns.tolist()
         attributes.extend([col for col in df.columns if col.lower().endswith('id') and col not in attributes])
         measures = [col for col in df.columns if col not in attributes]
-        unique_elements = {col: df[col].unique().tolist() for col in attributes}
+        unique_elements = {col: column_sketch(df[col]) for col in attributes}
         sample_data = df.head(5).to_dict(orient='records')
+
+        # Insert data into MongoDB
+        collection.delete_many({})  # Clear existing data
+        for batch in iter_document_batches(with_stored_dates(df, stored_date_columns(unique_elements)), batch_size):
+            collection.insert_many(batch, ordered=False)
         
 
         return list(df.columns), attributes, measures, unique_elements, sample_data
     except Exception as e:
         print(f"Error loading CSV into MongoDB: {e}")
         return [], [], [], {}, []
+
+
+def stored_date_columns(unique_elements):
+    """The columns whose sketch has value_type 'date' (all valid ISO 8601 dates), stored as dates in MongoDB."""
+    return [col for col, sketch in unique_elements.items() if sketch.value_type=='date']
+
+
+def with_stored_dates(chunk, date_columns):
+    """
+    The chunk with its ISO 8601 date columns as datetimes, so MongoDB stores them as dates: queries then
+    compare them as dates (see typed_value) and can use range bounds on them. date_columns must be the date
+    columns of the whole collection (the whole file, or the loaded one for appends), never of one chunk,
+    so that a column is stored either as dates or as text in every document.
+    """
+    date_columns=[col for col in date_columns if col in chunk]
+    if not date_columns:
+        return chunk
+    chunk=chunk.copy()
+    for col in date_columns:
+        dates=pd.to_datetime(chunk[col], format='ISO8601')
+        chunk[col]=dates.astype(object).where(dates.notna(), None)
+    return chunk
+
+
+def stored_mongo_value(value, sketch):
+    """A value from an attribute's sketch as it is stored in MongoDB (dates as datetimes, see with_stored_dates)."""
+    return typed_value(value, 'date') if sketch.value_type=='date' else value
+
+
+def iter_document_batches(df, batch_size):
+    """Converts a DataFrame to documents lazily, batch_size rows at a time."""
+    batch_size = batch_size or len(df) or 1
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size].to_dict(orient='records')
+
+
+def load_csv_to_mongo_chunked(csv_path, mongo_uri, db_name, collection_name, pool_options=None, chunksize=50000, batch_size=1000, workers=1, sample_rows=5):
+    """
+    Streams a CSV file into a MongoDB collection chunk by chunk. Same result as load_csv_to_mongo,
+    but only one chunk (plus the batches in flight) is in memory at a time.
+
+    Documents are written with insert_many(ordered=False) in batches of batch_size. With workers > 1
+    up to that many batches are written in parallel. Column metadata is built up with profile_chunk, and
+    the chunks are read with the column types of the whole file, as in load_csv_to_sql_chunked.
+
+    Returns:
+    - column names, attributes, measures, a ColumnSketch (bounded unique values) per attribute and the first sample_rows documents.
+    """
+    column_names=None
+    profile=None
+    sample_data=[]
+    rows_loaded=0
+    started=time.perf_counter()
+    executor=ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending=[]
+    try:
+        client = connections.get_mongo_client(mongo_uri, **(pool_options or {}))
+        collection = client[db_name][collection_name]
+        collection.delete_many({})  # Clear existing data
+
+        types=scan_csv_types(csv_path, chunksize)
+        dtypes=csv_dtypes(types)
+        # Dates of the whole file: a column that is all dates in the first chunks but not later stays text throughout
+        date_columns=[col.replace(' ', '_').lower() for col, kind in types.items() if kind=='date']
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtypes):
+            chunk.columns = chunk.columns.str.replace(' ', '_')
+            chunk.columns = chunk.columns.str.lower()
+            if column_names is None:
+                column_names=list(chunk.columns)
+                profile=new_chunk_profile(column_names)
+            if len(sample_data)<sample_rows:
+                sample_data.extend(chunk.head(sample_rows-len(sample_data)).to_dict(orient='records'))
+            profile_chunk(chunk, profile, rows_loaded)
+
+            for batch in iter_document_batches(with_stored_dates(chunk, date_columns), batch_size):
+                if executor is None:
+                    collection.insert_many(batch, ordered=False)
+                    continue
+                pending.append(executor.submit(collection.insert_many, batch, ordered=False))
+                # Keep at most two batches per worker in memory
+                if len(pending) >= 2 * workers:
+                    pending.pop(0).result()
+            rows_loaded+=len(chunk)
+
+        for future in pending:
+            future.result()
+    except Exception as e:
+        print(f"Error loading CSV into MongoDB: {e}")
+        return [], [], [], {}, []
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    if column_names is None:
+        return [], [], [], {}, []
+
+    # Text columns first, then the remaining id columns, as load_csv_to_mongo orders them
+    non_numeric=profile['non_numeric']
+    attributes=[col for col in column_names if col in non_numeric]
+    attributes.extend([col for col in column_names if col.endswith('id') and col not in non_numeric])
+    measures=[col for col in column_names if col not in attributes]
+    unique_elements={col: profile['unique_elements'][col] for col in attributes}
+    seconds=time.perf_counter()-started
+    print(f"Loaded {rows_loaded} documents into '{collection_name}' in chunks of {chunksize} ({round(rows_loaded / seconds) if seconds else rows_loaded} docs/sec).")
+    return column_names, attributes, measures, unique_elements, sample_data
     
 
-def create_sample_mongo_query(query_type, attributes, measures, unique_elements, collection_name):
+def append_csv_to_mongo(csv_path, mongo_uri, db_name, collection_name, details, offset=0, end=None, key_column=None, pool_options=None, chunksize=50000, batch_size=1000):
+    """
+    Inserts only the documents added to a CSV file since it was loaded into collection_name, without
+    clearing the collection first, and merges them into the stored column sketches. Parameters as for
+    append_csv_to_sql.
+
+    Returns:
+    - int: Number of documents appended, or None on error.
+    """
+    rows_loaded=0
+    try:
+        client = connections.get_mongo_client(mongo_uri, **(pool_options or {}))
+        collection = client[db_name][collection_name]
+        for chunk in iter_appended_chunks(csv_path, details, offset, end, key_column, chunksize):
+            merge_appended_chunk(chunk, details)
+            for batch in iter_document_batches(with_stored_dates(chunk, stored_date_columns(details['unique_elements'])), batch_size):
+                collection.insert_many(batch, ordered=False)
+            rows_loaded+=len(chunk)
+    except Exception as e:
+        print(f"Error appending new rows of {csv_path} to MongoDB: {e}")
+        return
+
+    print(f"Appended {rows_loaded} new documents of {csv_path} to '{collection_name}'.")
+    return rows_loaded
+
+
+def iter_sample_mongo_queries(query_type, attributes, measures, unique_elements, collection_name):
     """
-    Creates sample MongoDB queries based on the query type.
+    Yields sample MongoDB queries based on the query type, built one at a time as they are asked for.
 
     Parameters:
     - query_type: Type of query (e.g., group by, sum, where).
@@ -1030,10 +1521,9 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
     - unique_elements: Unique elements for attributes.
     - collection_name: The target MongoDB collection.
 
-    Returns:
-    - list: List of MongoDB queries or pipelines.
+    Yields:
+    - dict: {"collection", "pipeline"}, or {"collection", "query"} for find() filters.
     """
-    sample_queries = []
 
     if query_type.lower()=='project':
         for i in range (0,10):
@@ -1049,8 +1539,7 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
                 temp={f"{measure}_new":f"${measure}"}
                 pipeline[0]['$project'].update(temp)
             if select_attrs!=0 or select_measures!=0:
-                sample_queries.append({"collection": collection_name , "pipeline":pipeline})
-
+                yield {"collection": collection_name , "pipeline":pipeline}
     elif query_type.lower()== 'match':
         for i in range (0,10):
             select_attrs=random.randint(0,len(attributes))
@@ -1058,13 +1547,11 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
             pipeline = [{"$match":{}}]
             for attr in select_attr_columns:
                 values_list=unique_elements[attr]
-                random_value=random.sample(values_list,1)[0]
+                random_value=stored_mongo_value(random.sample(values_list,1)[0],values_list)
                 temp={f"{attr}":random_value}
                 pipeline[0]['$match'].update(temp)
             if select_attrs!=0:
-                sample_queries.append({"collection":collection_name, "pipeline":pipeline})
-
-
+                yield {"collection":collection_name, "pipeline":pipeline}
     elif query_type.lower() == 'group':
         for attr in attributes:
             for measure in measures:
@@ -1075,9 +1562,7 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
                     }},
                     {"$sort": {"_id": 1}}
                 ]
-                sample_queries.append({"collection": collection_name, "pipeline": pipeline})
-
-
+                yield {"collection": collection_name, "pipeline": pipeline}
     elif query_type.lower() in  ['sum','avg','min','max']:
         agg_fn=query_type.lower()
         for measure in measures:
@@ -1087,22 +1572,19 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
                     "_id": f"${attr}",
                     f"{agg_fn}_{measure}": {f"${agg_fn}": f"${measure}"}
                 }}]
-                sample_queries.append({"collection": collection_name, "pipeline": pipeline})
+                yield {"collection": collection_name, "pipeline": pipeline}
             pipeline = [
                 {"$group": {
                     "_id": None,
                     f"{agg_fn}_{measure}": {f"${agg_fn}": f"${measure}"}
                 }}
             ]
-            sample_queries.append({"collection": collection_name, "pipeline": pipeline})
-
-
+            yield {"collection": collection_name, "pipeline": pipeline}
     elif query_type.lower() == 'where':
         for attr in attributes:
             for value in unique_elements[attr][:5]:  # Limit the number of unique values sampled
-                query = {attr: value}
-                sample_queries.append({"collection": collection_name, "query": query})
-
+                query = {attr: stored_mongo_value(value, unique_elements[attr])}
+                yield {"collection": collection_name, "query": query}
     elif query_type.lower() == 'sort':
         cols=attributes+measures
         for col in cols:
@@ -1114,11 +1596,10 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
                     {"$sort": {col: sort_type}},  # Ascending
                     {"$limit": random_number}
                 ]
-                sample_queries.append({"collection": collection_name, "pipeline": pipeline})
+                yield {"collection": collection_name, "pipeline": pipeline}
                 pipeline = [
                     {"$sort": {col: sort_type}}]
-                sample_queries.append({"collection": collection_name, "pipeline": pipeline})
-
+                yield {"collection": collection_name, "pipeline": pipeline}
     elif query_type.lower() == 'limit':
         cols=attributes+measures
         for i in range (0,10):
@@ -1129,13 +1610,12 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
             pipeline = [
                 {"$limit": limit_number}
             ]
-            sample_queries.append({"collection": collection_name, "pipeline": pipeline})
+            yield {"collection": collection_name, "pipeline": pipeline}
             pipeline = [
                     {"$sort": {col: sort_type}},  # Ascending
                     {"$limit": limit_number}
                 ]
-            sample_queries.append({"collection": collection_name, "pipeline": pipeline})
-
+            yield {"collection": collection_name, "pipeline": pipeline}
     elif query_type.lower() == 'skip':
 
         for offset in range(1, 10):  # Generate sample offsets
@@ -1144,8 +1624,7 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
                 {"$skip": offset},
                 {"$limit": limit_number}
             ]
-            sample_queries.append({"collection": collection_name, "pipeline": pipeline})
-
+            yield {"collection": collection_name, "pipeline": pipeline}
     elif query_type.lower() == 'having':
         for attr in attributes:
             for measure in measures:
@@ -1158,399 +1637,128 @@ def create_sample_mongo_query(query_type, attributes, measures, unique_elements,
                         f"sum_{measure}": {"$gt": 100}  # Example condition
                     }}
                 ]
-                sample_queries.append({"collection": collection_name, "pipeline": pipeline})
-
-    return sample_queries
-
-def generate_base_mongo(nl_query,attributes,measures,column_names):
-    pattern, elements = detect_base_pattern(nl_query)
-    pipeline= [{"error": "corresponding base query pattern not found"}]
-    if 'group_by' in pattern and 'count' not in pattern:
-
-
-        agg_fn_map={ 'total' : 'sum',
-                'average' : 'avg',
-                'min' : 'min',
-                'max' : 'max'}
-
-        for func_word,func_name in agg_fn_map.items():
-            if func_word in pattern:
-                agg_fn=func_name
-                break
-
+                yield {"collection": collection_name, "pipeline": pipeline}
 
-        measure_found,attr_found=0,0
-        pipeline=[{"$group":{}}]
 
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(measure)
-                measure_found=1
-
-            
-
-        group_by_column=[]
-        for attr in attributes:
-            if attr in elements[1].lower() or attr.replace('_',' ') in elements[1].lower():
-                group_by_column.append(attr)
-                attr_found=1
-
-        if measure_found==1 and attr_found==1:
-            if len(group_by_column)>1:
-                temp={"_id":{}}
-                for attr in group_by_column:
-                    temp2={f"{attr}":f"${attr}"}
-                    temp['_id'].update(temp2)
-            else:
-                temp={"_id":f"${group_by_column[0]}"}
-            
-            pipeline[0]['$group'].update(temp)
-
-            for measure in selected_measures:
-                temp={f"{agg_fn}_{measure}":{f"${agg_fn}":f"${measure}"}}
-                pipeline[0]['$group'].update(temp)
-
-    elif 'total' in pattern or 'average' in pattern or 'min' in pattern or 'max' in pattern:
+def create_sample_mongo_query(query_type, attributes, measures, unique_elements, collection_name):
+    """All the sample MongoDB queries of one type for one collection (see iter_sample_mongo_queries)."""
+    return list(iter_sample_mongo_queries(query_type, attributes, measures, unique_elements, collection_name))
 
-        agg_fn_map={ 'total' : 'sum',
-                'average' : 'avg',
-                'min' : 'min',
-                'max' : 'max'}
+def render_sample_mongo_query(sample):
+    """Shell syntax for a sample from iter_sample_mongo_queries."""
+    if 'pipeline' in sample:
+        return f"db.{sample['collection']}.aggregate({sample['pipeline']})"
+    return f"db.{sample['collection']}.find({sample['query']})"
 
-        for func_word,func_name in agg_fn_map.items():
-            if func_word in pattern:
-                agg_fn=func_name
-                break
 
-        pipeline=[{"$group":{"_id": "null"}}]
-        
-        measure_found=0
-        selected_measures=[]
-        for measure in measures:
-            if measure in elements[0].lower() or measure.replace('_',' ') in elements[0].lower():
-                selected_measures.append(measure)
-                measure_found=1
-        
-        if measure_found==1:
-            for measure in selected_measures:
-                temp={f"{agg_fn}_{measure}":f"${measure}"}
-                pipeline[0]['$group'].update(temp)
-
-    elif 'count' in pattern:
-        if 'group_by' in pattern:
-            pipeline=[{"$group":{}}]
-            group_by_column=[]
-            for attr in attributes:
-                if attr in elements[1].lower() or attr.replace('_',' ') in elements[1].lower():
-                    group_by_column.append(attr)
-                    attr_found=1
-            if attr_found==1:
-                if len(group_by_column)>1:
-                    temp={"_id":{}}
-                    for attr in group_by_column:
-                        temp2={f"{attr}":f"${attr}"}
-                        temp['_id'].update(temp2)
-                else:
-                    temp={"_id":f"${group_by_column[0]}"}
-            
-                pipeline[0]['$group'].update(temp)
-            temp={"Count":{"$sum":1}}
-            pipeline[0]['$group'].update(temp)
-        
-        else:
-            pipeline=[{"$group":{"_id":"null","Count":{"$sum":1}}}]
-
-    elif 'Select' in pattern:
-        pipeline=[{"$project":{"_id":0}}]
-        col_found=0
-        selected_columns=[]
-        for col in column_names:
-            if col in elements[0].lower() or col.replace('_',' ') in elements[0].lower():
-                selected_columns.append(col)
-                col_found=1
-        if col_found==1:
-            for col in selected_columns:
-                temp={f"{col}":1}
-                pipeline[0]['$project'].update(temp)
+def output_sample_queries_mongo(input_user_query,input_dataset_paths,all_columns,column_details,count=None):
+    """
+    Sample MongoDB queries for a "sample queries" request: find() filters if it mentions find, else samples of
+    the type it names, else of every type. Built lazily like output_sample_queries, up to count distinct samples.
+    """
+    lower_query=input_user_query.lower()
+    if 'example' not in lower_query and 'sample' not in lower_query:
+        return []
 
-    elif 'Top' in pattern or 'Bottom' in pattern:
-        if 'Top' in pattern:
-            order_number=-1
+    # samples are generated only for tables with atleast 1 measure and 1 attribute to prevent errors
+    sample_tables=[collection for collection in column_details if column_details[collection]['attributes'] and column_details[collection]['measures']]
+    if 'find' in lower_query:
+        sources=[(f"db.{sample['collection']}.find({sample['pipeline'][0]['$match']})"
+                  for sample in iter_sample_mongo_queries('match', column_details[path]['attributes'], column_details[path]['measures'], column_details[path]['unique_elements'], path.replace('.csv','')))
+                 for path in sample_tables]
+    else:
+        requested_types=requested_sample_types(input_user_query,MONGO_SAMPLE_QUERY_TYPES)
+        sources=[map(render_sample_mongo_query, iter_sample_mongo_queries(sample_type, column_details[path]['attributes'], column_details[path]['measures'], column_details[path]['unique_elements'], path.replace('.csv','')))
+                 for sample_type in requested_types for path in sample_tables]
+    random.shuffle(sources)
+    return interleave_samples(sources,count)
+
+MONGO_OPERATORS={'>=':'$gte', '<=' : '$lte', '!=' :'$ne', '>' : '$gt' , '<' :'$lt' }
+
+
+def generate_match_mongo(predicates):
+    """Builds the body of a $match stage from where (or having) Predicates."""
+    match={}
+    for predicate in predicates:
+        if predicate.op is None:
+            raise ValueError(f"Could not understand the condition '{predicate.column} {predicate.raw.strip()}'")
+        condn_column=f'{predicate.agg.lower()}_{predicate.column}' if predicate.agg else predicate.column
+
+        if predicate.op=='between':
+            low,high=predicate.value
+            condition={"$gte":typed_value(low,predicate.value_type),"$lte":typed_value(high,predicate.value_type)}
+        elif predicate.op=='in':
+            condition={"$in":[typed_value(value,predicate.value_type) for value in predicate.value]}
+        elif predicate.op=='like':
+            # SQL LIKE wildcards as a case-insensitive anchored regex, the rest matched literally
+            pattern=''.join('.*' if char=='%' else '.' if char=='_' else re.escape(char) for char in predicate.value)
+            condition={"$regex":f'^{pattern}$',"$options":"i"}
         else:
-            order_number=1
-        columns_found=0
-        numbers = re.findall(r'\d+', elements[0])
-        selected_columns=[]
-        order_by_column=[]
-        order_found=0
-        pipeline=[]
-        for col in column_names:
-            if col in elements[0].lower() or col.replace('_',' ') in elements[0].lower():
-                selected_columns.append(col)
-                columns_found=1
-            if col in elements[1].lower() or col.replace('_',' ') in elements[1].lower():
-                order_by_column.append(col)
-                order_found=1
-
-        all_select_columns= selected_columns + order_by_column
-
-        if columns_found==1:
-            dummy_dict={"$project":{"_id":0}}
-            pipeline.append(dummy_dict)
-            for col in selected_columns:
-                temp2={f"{col}":1}
-                pipeline[0]['$project'].update(temp2)
-
-        if order_found==1:
-            sort_temp={"$sort":{}}
-            for col in order_by_column:
-                temp={f"col": order_number}
-                sort_temp['$sort'].update(temp)
-            pipeline.append(sort_temp)
-
-        limit_temp={"$limit":f"{numbers[0]}"}
-        pipeline.append(limit_temp) 
-    return pipeline, pattern
-
-
-def generate_match_mongo (nl_query,column_names):
-    # using generate_where_part function used for SQL and working from that
-    where_conditions,having_conditions = generate_where_part (nl_query,column_names)
-    where_pipeline=[]
-    if where_conditions:
-        where_pipeline=[{"$match":{}}]
-        for condn in [part.replace("'",'') for part in where_conditions]:
-            condn_column='No_Col_Found'
-
-            for col in column_names:
-                if col in condn.lower() or col.replace('_',' ') in condn.lower():
-                    condn_column=col
-
-            if 'between' in condn:
-                words=['and','between']
-                pattern = '|'.join(f'({re.escape(word)})' for word in words)
-                split_text = re.split(pattern, condn)
-                split_text=[part.strip() for part in split_text if part]
-                and_pos=split_text.index('and')
-
-                greater_than_value=split_text[and_pos-1]
-                if greater_than_value.isdigit():
-                    greater_than_value=int(greater_than_value)
-                less_than_value=split_text[and_pos+1]
-                if less_than_value.isdigit():
-                    less_than_value=int(less_than_value)
-
-                temp = {f"{condn_column}":{"$gte":greater_than_value,"$lte":less_than_value}}
-
-            else:
-                pattern = r'(\s*(?:>=|<=|!=|=|>|<)\s*)'
-                split_text = re.split(pattern, condn)
-                split_text = [part.strip() for part in split_text if part]
-                operators = {'>=', '<=', '=', '>', '<'}
-                operator_positions = [i for i, item in enumerate(split_text) if item in operators]
-                condn_operator=split_text[operator_positions[0]]
-                condn_value=split_text[operator_positions[0]+1].replace("'",'')
-
-                if condn_operator=='=':
-                    temp={f"{condn_column}":condn_value}
-                else:
-                    operator_map={'>=':'$gte', '<=' : '$lte', '!=' :'$ne', '>' : '$gt' , '<' :'$lt' }
-                    mongo_operator=operator_map[condn_operator]
-                    temp={f"{condn_column}":{f'{mongo_operator}':condn_value}}
-            if condn_column in where_pipeline[0]['$match']:
-                where_pipeline[0]['$match'][condn_column].update(temp[condn_column])
-            else:
-                where_pipeline[0]['$match'].update(temp)
-
-    having_pipeline=[]
-    if having_conditions:
-        having_pipeline=[{"$match":{}}]
-        for condn in [part.replace("'",'') for part in having_conditions]:
-            condn_column='No_Col_Found'
-
-            for col in column_names:
-                if col in condn.lower() or col.replace('_',' ') in condn.lower():
-                    condn_column=col
-
-            agg_functions=['avg','min','max','sum']
-            agg_func='No Agg Function'
-
-            for func in agg_functions:
-                if func in condn.lower() or func.replace('_',' ') in condn.lower():
-                    agg_func=func
-
-            condn_col=agg_func+'_'+condn_column
-
-            if 'between' in condn:
-                words=['and','between']
-                pattern = '|'.join(f'({re.escape(word)})' for word in words)
-                split_text = re.split(pattern, condn)
-                split_text=[part.strip() for part in split_text if part]
-                and_pos=split_text.index('and')
-
-                greater_than_value=split_text[and_pos-1]
-                if greater_than_value.isdigit():
-                    greater_than_value=int(greater_than_value)
-                less_than_value=split_text[and_pos+1]
-                if less_than_value.isdigit():
-                    less_than_value=int(less_than_value)
-
-                temp = {f"{condn_col}":{"$gte":greater_than_value,"$lte":less_than_value}}
-
+            condn_value=typed_value(predicate.value,predicate.value_type)
+            if predicate.op=='=':
+                condition=condn_value
             else:
-                pattern = r'(\s*(?:>=|<=|!=|=|>|<)\s*)'
-                split_text = re.split(pattern, condn)
-                split_text = [part.strip() for part in split_text if part]
-                operators = {'>=', '<=', '=', '>', '<'}
-                operator_positions = [i for i, item in enumerate(split_text) if item in operators]
-                condn_operator=split_text[operator_positions[0]]
-                condn_value=split_text[operator_positions[0]+1].replace("'",'')
-                if condn_value.isdigit():
-                    condn_value=int(condn_value)
-
-                if condn_operator=='=':
-                    temp={f"{condn_col}":condn_value}
-                else:
-                    operator_map={'>=':'$gte', '<=' : '$lte', '!=' :'$ne', '>' : '$gt' , '<' :'$lt' }
-                    mongo_operator=operator_map[condn_operator]
-                    temp={f"{condn_col}":{f'{mongo_operator}':condn_value}}
-            if condn_col in having_pipeline[0]['$match']:
-                having_pipeline[0]['$match'][condn_col].update(temp[condn_col])
-            else:
-                having_pipeline[0]['$match'].update(temp)
-
-    return where_pipeline,having_pipeline
-
-#create_sample_mongo_query(query_type, attributes, measures, unique_elements, collection_name)
-def output_sample_queries_mongo(input_user_query,input_dataset_paths,all_columns,column_details):
-
-    sample_query_types=['sort','min','max','avg','sum','where','having','limit','skip','group','project','match']
-    specific_sample_found=0
-    pymongo_samples=[]
-    mongo_query_samples=[]
-
-    # samples are generated only for tables with atleast 1 measure and 1 attribute to prevent errors
-    sample_tables=[]
-    for collection in column_details:
-        if column_details[collection]['attributes'] and column_details[collection]['measures']:
-            sample_tables.append(collection)
-    
-    if 'example' in input_user_query.lower() or 'sample' in input_user_query.lower():
-        if 'find' in input_user_query.lower():
-            sample_type='match'
-            samples_list=[]
-            for path in sample_tables:
-                collection_name=path.replace('.csv','')
-                samples_list.extend(create_sample_mongo_query(sample_type, column_details[path]['attributes'], column_details[path]['measures'], column_details[path]['unique_elements'], collection_name))
-            pymongo_samples=samples_list
-            specific_sample_found=1
-            for sample in pymongo_samples:
-                mongo_query=f'db.{collection_name}.find({sample['pipeline'][0]['$match']})'
-                mongo_query_samples.append(mongo_query)
-        for sample_type in sample_query_types:
-            if sample_type in input_user_query.lower():
-                samples_list=[]
-                for path in sample_tables:
-                    collection_name=path.replace('.csv','')
-                    samples_list.extend(create_sample_mongo_query(sample_type, column_details[path]['attributes'], column_details[path]['measures'], column_details[path]['unique_elements'], collection_name))
-                    # print description on what sample type
-                pymongo_samples=samples_list #random.sample(samples_list,5) #output_sample
-                specific_sample_found=1
-                for query in pymongo_samples:
-                    mongo_query=f"db.{query['collection']}.aggregate({query['pipeline']})"
-                    mongo_query_samples.append(mongo_query)
-                break
-        if specific_sample_found==0:
-            all_samples=[]
-            for sample_type in sample_query_types:
-                for path in sample_tables:
-                    collection_name=path.replace('.csv','')
-                    generic_samples_list=create_sample_mongo_query(sample_type, column_details[path]['attributes'], column_details[path]['measures'], column_details[path]['unique_elements'], collection_name)
-                    all_samples.extend(generic_samples_list)
-            pymongo_samples=all_samples
-            for query in pymongo_samples:
-                    mongo_query=f"db.{query['collection']}.aggregate({query['pipeline']})"
-                    mongo_query_samples.append(mongo_query)
-
-
-    return mongo_query_samples
-
-def generate_limit_sort_skip_mongo(nl_query,column_names):
-    detected_parts=detect_limit_sort_order_pattern(nl_query)
-    limit_pipeline=[]
-    sort_pipeline=[]
-    skip_pipeline=[]
-    order_type=1
-    
+                condition={MONGO_OPERATORS[predicate.op]:condn_value}
 
-    for query_part,text in detected_parts.items():
-
-        if query_part=='order_by_pattern':
-            
-            order_by_columns=[]
-            for col in column_names:
-                if col in text[0].lower() or col.replace('_',' ') in text[0].lower():
-                    order_by_columns.append(col)
-        
-            if 'descending' in text[0].lower():
-                order_type=-1
-            
-            sort_pipeline=[{"$sort":{}}]
-
-            for col in order_by_columns:
-                temp={f'{col}':order_type}
-                sort_pipeline[0]['$sort'].update(temp)
+        if isinstance(match.get(condn_column),dict) and isinstance(condition,dict):
+            match[condn_column].update(condition)
+        else:
+            match[condn_column]=condition
+    return match
 
-        elif query_part=='limit_to_pattern':
-            numbers = re.findall(r'\d+', text[0])
-            limit_pipeline=[{'$limit':int(numbers[0])}]
-        
-        elif query_part=='offset_by_pattern':
-            numbers = re.findall(r'\d+', text[0])
-            skip_pipeline=[{'$skip':int(numbers[0])}]
 
-    return sort_pipeline,skip_pipeline,limit_pipeline
-    
-                
+def generate_mongo_pipeline(parsed_query):
+    """MongoDB backend: renders a ParsedQuery as an aggregation pipeline."""
+    if parsed_query.error:
+        raise ValueError(parsed_query.error)
 
-def translate_to_mongo(input_user_query,input_dataset_paths,attributes,measures,column_names,column_details):
     final_pipeline=[]
-    base_pipeline,base_pattern=generate_base_mongo(input_user_query,attributes,measures,column_names)
-    where_pipeline,having_pipeline=generate_match_mongo (input_user_query,column_names)
-    sort_pipeline,skip_pipeline,limit_pipeline= generate_limit_sort_skip_mongo (input_user_query,column_names)
-    if where_pipeline:
-        final_pipeline.append(where_pipeline[0])
-    if base_pipeline:
-        final_pipeline.extend(base_pipeline)
-    if 'Top' not in base_pattern and 'Bottom' not in base_pattern:
-        if having_pipeline:
-            final_pipeline.append(having_pipeline[0])
-        if sort_pipeline:
-            final_pipeline.append(sort_pipeline[0])
-        if skip_pipeline:
-            final_pipeline.append(skip_pipeline[0])
-        if limit_pipeline:
-            final_pipeline.append(limit_pipeline[0])
-
-    columns_in_query=[]
-    for col in column_names:
-        if col in input_user_query.lower() or col.replace('_',' ') in input_user_query.lower():
-            columns_in_query.append(col)
-
-    collection_name='No collection Found'
-    for path in input_dataset_paths:
-        columns=column_details[path]['column_names']
-        columns_counter=0
-        for col in columns:
-            
-            if col in input_user_query.lower() or col.replace('_',' ') in input_user_query.lower():
-                columns_counter+=1
-        if columns_counter==len(columns_in_query):
-                collection_name=path.replace('.csv','')
-                
-            
+    where_match=generate_match_mongo(parsed_query.predicates)
+    if where_match:
+        final_pipeline.append({"$match":where_match})
+
+    is_top_bottom=parsed_query.base_op in ['Top_n_by','Bottom_n_by']
+    if parsed_query.measures:
+        if len(parsed_query.group_keys)>1:
+            group_stage={"_id":{attr:f"${attr}" for attr in parsed_query.group_keys}}
+        elif parsed_query.group_keys:
+            group_stage={"_id":f"${parsed_query.group_keys[0]}"}
+        else:
+            group_stage={"_id":None}
+        for measure in parsed_query.measures:
+            if measure.func=='Count':
+                group_stage["Count"]={"$sum":1}
+            else:
+                agg_fn=measure.func.lower()
+                group_stage[f"{agg_fn}_{measure.column}"]={f"${agg_fn}":f"${measure.column}"}
+        final_pipeline.append({"$group":group_stage})
+    elif parsed_query.select_columns or not is_top_bottom:
+        project_stage={"_id":0}
+        for col in parsed_query.select_columns:
+            project_stage[col]=1
+        final_pipeline.append({"$project":project_stage})
+
+    having_match=generate_match_mongo(parsed_query.having)
+    if having_match:
+        final_pipeline.append({"$match":having_match})
+    if parsed_query.order_by:
+        order_type=-1 if parsed_query.order_direction=='DESC' else 1
+        final_pipeline.append({"$sort":{col:order_type for col in parsed_query.order_by}})
+    if parsed_query.offset is not None:
+        final_pipeline.append({"$skip":parsed_query.offset})
+    if parsed_query.limit is not None:
+        final_pipeline.append({"$limit":parsed_query.limit})
+    return final_pipeline
+
+
+def translate_to_mongo(input_user_query,input_dataset_paths,attributes,measures,column_names,column_details,parsed_query=None,column_index=None,max_rows=None):
+    """
+    Translates a natural language query to a MongoDB pipeline. Pass parsed_query to reuse a parse already done for SQL.
+    With max_rows a $limit of at most max_rows is added (see cap_row_limit).
+    """
+    if parsed_query is None:
+        parsed_query=parse_query(input_user_query,input_dataset_paths,attributes,measures,column_names,column_details,column_index)
+    final_pipeline=generate_mongo_pipeline(cap_row_limit(parsed_query, max_rows))
+    collection_name=parsed_query.collection
     mongo_query=f"db.{collection_name}.aggregate({final_pipeline})"
     return mongo_query , collection_name, final_pipeline
-
-    
\ No newline at end of file
@@ -0,0 +1,138 @@
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Mapping
+
+import utils as ut
+from column_index import ColumnIndex
+
+
+# Per-workspace dataset metadata with copy-on-write snapshots. Requests read the current
+# Snapshot of their workspace without taking a lock; /load_datasets builds a new one and
+# swaps it in with a single assignment, so a request never sees a half-merged schema.
+
+DEFAULT_WORKSPACE = 'default'
+# Names clients can give a workspace; they also end up in catalog state keys (see app.catalog_state_key)
+WORKSPACE_NAME_PATTERN = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+
+_EMPTY = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Read-only view of the datasets loaded into a workspace. Take one per request and use it
+    throughout; the lists are tuples and the mappings read-only, and nothing reachable from a
+    published snapshot (column details, sketches, samples) is changed afterwards.
+    """
+    database_type: str = ''
+    dataset_paths: tuple = ()
+    column_details: Mapping = _EMPTY
+    all_columns: tuple = ()
+    all_attributes: tuple = ()
+    all_measures: tuple = ()
+    unique_elements: Mapping = _EMPTY
+    samples: Mapping = _EMPTY
+    column_index: ColumnIndex = field(default_factory=lambda: ColumnIndex([]))
+    schema_fingerprint: str = ''
+    # Per table: changes when the table's sample queries would (see sample_pool.py)
+    table_fingerprints: Mapping = _EMPTY
+
+    def merged(self, database_type, datasets):
+        """
+        Returns a new snapshot with datasets, a list of (path, column details, sample rows) in
+        request order, merged into this one. The dataset paths are replaced by the ones given;
+        column details, samples and column lists keep what was loaded before.
+        """
+        column_details = dict(self.column_details)
+        samples = dict(self.samples)
+        table_fingerprints = dict(self.table_fingerprints)
+        unique_elements = dict(self.unique_elements)
+        all_columns = list(self.all_columns)
+        all_attributes = list(self.all_attributes)
+        all_measures = list(self.all_measures)
+        for path, details, sample in datasets:
+            column_details[path] = details
+            samples[path.replace('.csv', '')] = sample
+            table_fingerprints[path] = ut.table_fingerprint(path, details)
+            all_columns.extend(details['column_names'])
+            all_attributes.extend(details['attributes'])
+            all_measures.extend(details['measures'])
+            unique_elements.update(details['unique_elements'])
+        dataset_paths = tuple(path for path, details, sample in datasets)
+
+        # Order-preserving de-duplication, so the merged lists don't depend on set ordering
+        all_columns = tuple(dict.fromkeys(all_columns))
+        return replace(
+            self,
+            database_type=database_type,
+            dataset_paths=dataset_paths,
+            column_details=MappingProxyType(column_details),
+            all_columns=all_columns,
+            all_attributes=tuple(dict.fromkeys(all_attributes)),
+            all_measures=tuple(dict.fromkeys(all_measures)),
+            unique_elements=MappingProxyType(unique_elements),
+            samples=MappingProxyType(samples),
+            column_index=ColumnIndex(all_columns),
+            schema_fingerprint=ut.schema_fingerprint(dataset_paths, column_details),
+            table_fingerprints=MappingProxyType(table_fingerprints),
+        )
+
+
+class Workspace:
+    """
+    One tenant's datasets. snapshot() is a plain attribute read; publish() serializes writers
+    with a lock so two loads into the same workspace don't drop each other's datasets.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.restored = False
+        self.lock = threading.RLock()
+        self._snapshot = Snapshot()
+
+    def snapshot(self):
+        return self._snapshot
+
+    def publish(self, database_type, datasets):
+        """Merges datasets into the current snapshot and makes the result current. Returns it."""
+        with self.lock:
+            snapshot = self._snapshot.merged(database_type, datasets)
+            self._snapshot = snapshot
+        return snapshot
+
+
+class WorkspaceNameError(ValueError):
+    """A request named a workspace that doesn't match WORKSPACE_NAME_PATTERN."""
+
+
+class WorkspaceRegistry:
+    """
+    Workspaces by name, created on first use and kept for the max_workspaces most recently used ones.
+    An evicted workspace only loses its in-memory snapshot: its next request restores its datasets from
+    the catalog, as after a restart. The default workspace is never evicted.
+    """
+
+    def __init__(self, max_workspaces=256):
+        self.max_workspaces = max_workspaces
+        self._workspaces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name=DEFAULT_WORKSPACE):
+        """The workspace called name. Raises WorkspaceNameError if name doesn't match WORKSPACE_NAME_PATTERN."""
+        if not isinstance(name, str) or not WORKSPACE_NAME_PATTERN.fullmatch(name):
+            raise WorkspaceNameError(f"Workspace names are 1 to 64 letters, digits, '_', '.' or '-', got {name!r}")
+        with self._lock:
+            workspace = self._workspaces.get(name)
+            if workspace is None:
+                workspace = self._workspaces[name] = Workspace(name)
+            self._workspaces.move_to_end(name)
+            while len(self._workspaces) > self.max_workspaces:
+                del self._workspaces[next(other for other in self._workspaces if other != DEFAULT_WORKSPACE)]
+        return workspace
+
+    def names(self):
+        with self._lock:
+            return list(self._workspaces)